@@ -15,7 +15,95 @@ class Config:
     MANUAL_PURCHASES_ARCHIVE_CHANNEL = int(os.getenv("MANUAL_PURCHASES_ARCHIVE_CHANNEL"))
 
     G2BULK_API_KEY = os.getenv("G2BULK_API_KEY")
+    G2BULK_BASE_URL = os.getenv("G2BULK_BASE_URL", "https://api.g2bulk.com/v1")
+    G2BULK_MAX_RETRIES = 2  # extra attempts for idempotent requests
+    # Seconds before a duplicate read request is sent, 0 disables hedging
+    G2BULK_HEDGE_DELAY = float(os.getenv("G2BULK_HEDGE_DELAY", "0"))
+    G2BULK_BREAKER_THRESHOLD = 5  # consecutive failures that open the breaker
+    G2BULK_BREAKER_RESET_TIMEOUT = 30  # seconds before a probe request is let through
+    G2BULK_UNCONFIRMED_ORDER_TIMEOUT = 30 * 60  # seconds an unconfirmed order is looked for before it's refunded
 
     DB_PATH = os.getenv("DB_PATH")
     DB_POOL_SIZE = 20
     DB_MAX_OVERFLOW = 10
+
+    PERSISTENCE_PATH = os.getenv("PERSISTENCE_PATH", "data/persistence.sqlite3")
+    PERSISTENCE_IDLE_TIMEOUT = 30 * 60  # seconds before idle user data is evicted
+
+    CATALOGUE_CACHE_TTL = 5 * 60  # seconds before G2Bulk games/catalogues are refetched
+    CATALOGUE_CACHE_MAX_SEARCHES = 256
+
+    UPSTREAM_BALANCE_REFRESH_INTERVAL = 60  # seconds between background getMe calls
+    UPSTREAM_BALANCE_MAX_AGE = 5 * 60  # seconds before the tracked balance is fetched inline
+
+    PLAYER_ID_CACHE_TTL = 6 * 60 * 60  # seconds a valid player ID check is reused
+    PLAYER_ID_CACHE_NEGATIVE_TTL = 60  # seconds an invalid player ID check is reused
+    PLAYER_ID_CACHE_MAX_SIZE = 10000
+
+    OUTBOX_WORKERS = 4
+    OUTBOX_RATE_LIMIT = 25  # messages per second for all outbox workers together
+    OUTBOX_CHAT_INTERVAL = 1  # seconds between two outbox messages to the same chat
+    OUTBOX_POLL_INTERVAL = 1  # seconds between checks for pending outbox messages
+    OUTBOX_MAX_ATTEMPTS = 8
+
+    # Archive channel posts are coalesced into digest messages
+    ARCHIVE_DIGEST_WINDOW = 60  # seconds the oldest pending post may wait for others
+    ARCHIVE_DIGEST_MAX_ITEMS = 20  # posts per digest message
+
+    BULK_ORDERS_CONCURRENCY = 10  # concurrent admin message deletions of a bulk order action
+
+    MAINTENANCE_INTERVAL = 24 * 60 * 60  # seconds between pruning/compaction runs
+    ORDER_ADMIN_MESSAGES_RETENTION_DAYS = 7  # days admin messages of final orders are kept
+    OUTBOX_RETENTION_DAYS = 7  # days sent/failed outbox messages are kept
+    ERRORS_FILE_MAX_BYTES = 5 * 1024 * 1024  # errors.txt size that triggers a rotation
+    ERRORS_FILE_BACKUPS = 5  # compressed errors.txt rotations kept
+
+    RENDER_CACHE_SIZE = 10000  # messages whose last rendered content is remembered
+    CARD_CACHE_SIZE = 5000  # rendered order/user cards kept while their rows are unchanged
+
+    BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+    BOT_HTTP2 = os.getenv("BOT_HTTP2", "1") == "1"  # used only if the h2 package is installed
+    BOT_CONNECTION_POOL_SIZE = 512  # connections shared by all bot calls except getUpdates
+    BOT_CONNECT_TIMEOUT = 5
+    BOT_READ_TIMEOUT = 10
+    BOT_WRITE_TIMEOUT = 10
+    BOT_MEDIA_WRITE_TIMEOUT = 60  # seconds to upload a file
+    BOT_POOL_TIMEOUT = 10  # seconds a call waits for a free connection before failing
+    GET_UPDATES_CONNECTION_POOL_SIZE = 2
+    GET_UPDATES_READ_TIMEOUT = 15  # added to the long polling timeout by PTB
+
+    BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook"
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # public HTTPS base URL, TLS ends at the reverse proxy
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+    WEBHOOK_MAX_CONNECTIONS = 100  # concurrent update requests Telegram may open (1-100)
+    # Set to receive G2Bulk order callbacks on the webhook server
+    G2BULK_CALLBACK_SECRET = os.getenv("G2BULK_CALLBACK_SECRET")
+
+    # Worker processes updates are sharded to by user ID, 1 runs everything in one process
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", "8600"))  # worker i listens on base + i
+    WORKER_DRAIN_TIMEOUT = 10  # seconds to forward the queued updates on shutdown
+    # Set by the front process on the workers it starts
+    WORKER_INDEX = int(os.getenv("WORKER_INDEX")) if os.getenv("WORKER_INDEX") else None
+    WORKER_SECRET = os.getenv("WORKER_SECRET")
+    IS_LEADER = WORKER_INDEX in (None, 0)  # runs the jobs and the outbox dispatcher
+
+    METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Prometheus endpoint, 0 disables, worker i on port + i
+    STATS_TOP_ROWS = 10  # rows per table of the /stats command
+
+    LOOP_MONITOR_INTERVAL = 0.1  # seconds between event loop heartbeats
+    LOOP_BLOCK_THRESHOLD = 0.1  # seconds the loop may be blocked before its stack is captured
+    LOOP_DEBUG = os.getenv("LOOP_DEBUG", "0") == "1"  # asyncio debug mode, logs slow callbacks too
+
+    PROFILER_INTERVAL = 0.005  # seconds between stack samples of the handlers /profile profiles
+    PROFILER_DEFAULT_UPDATES = 20  # updates /profile profiles when not given a number
+
+    SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "0.05"))  # seconds a statement takes to be logged and explained
+    SLOW_QUERY_MAX_SHAPES = 200  # distinct slow statements kept, later ones are only counted
+
+    UPDATE_LOG_PATH = os.getenv("UPDATE_LOG_PATH")  # opt-in log of anonymized incoming updates for test/replay_updates.py
+    UPDATE_LOG_KEEP_TEXT = os.getenv("UPDATE_LOG_KEEP_TEXT", "0") == "1"  # log message texts verbatim, test accounts only
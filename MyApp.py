@@ -1,12 +1,14 @@
 from telegram.ext import (
     ApplicationBuilder,
     Defaults,
-    PicklePersistence,
 )
 from telegram.constants import ParseMode
 from ptbcontrib.ptb_jobstores.sqlalchemy import PTBSQLAlchemyJobStore
 
-from start import inits
+from common.persistence import SQLitePersistence
+from common.rendering import RenderingBot
+from common.transport import build_get_updates_request, build_request
+from start import inits, shutdown
 from Config import Config
 
 
@@ -14,22 +16,33 @@ class MyApp:
     @classmethod
     def build_app(cls):
         defaults = Defaults(parse_mode=ParseMode.HTML)
-        my_persistence = PicklePersistence(
-            filepath="data/persistence", single_file=False
+        my_persistence = SQLitePersistence(
+            filepath=Config.PERSISTENCE_PATH,
+            idle_timeout=Config.PERSISTENCE_IDLE_TIMEOUT,
         )
         app = (
             ApplicationBuilder()
-            .token(Config.BOT_TOKEN)
+            .bot(
+                RenderingBot(
+                    token=Config.BOT_TOKEN,
+                    base_url=Config.BOT_API_BASE_URL,
+                    defaults=defaults,
+                    request=build_request(),
+                    get_updates_request=build_get_updates_request(),
+                )
+            )
             .post_init(inits)
+            .post_shutdown(shutdown)
             .persistence(persistence=my_persistence)
-            .defaults(defaults)
             .concurrent_updates(True)
             .build()
         )
-        app.job_queue.scheduler.add_jobstore(
-            PTBSQLAlchemyJobStore(
-                application=app,
-                url="sqlite:///data/jobs.sqlite3",
+        # Other workers keep their jobs in memory, the stored jobs are the leader's
+        if Config.IS_LEADER:
+            app.job_queue.scheduler.add_jobstore(
+                PTBSQLAlchemyJobStore(
+                    application=app,
+                    url="sqlite:///data/jobs.sqlite3",
+                )
             )
-        )
         return app
@@ -1,4 +1,7 @@
 from admin.admin_calls.handlers import (
     hide_ids_keyboard_handler,
     find_id_handler,
+    stats_command,
+    profile_command,
+    slow_queries_command,
 )
\ No newline at end of file
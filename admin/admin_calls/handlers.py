@@ -1,9 +1,26 @@
 from telegram import Update, ReplyKeyboardRemove, ReplyKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters
+from telegram.ext import (
+    ContextTypes,
+    CallbackQueryHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+)
 from common.keyboards import build_admin_keyboard, build_request_buttons
-from custom_filters import PrivateChatAndAdmin, PermissionFilter
+from common.common import escape_html
+from common.instrumentation import Histogram, handler_names, metrics
+from common.profiler import profiler
+from common.slow_queries import slow_queries
+from common.media import media_fallbacks
+from common.rendering import render_report
+from services.loop_monitor import loop_monitor
+from custom_filters import PrivateChatAndAdmin, PrivateChatAndOwner, PermissionFilter
 from models import Permission
 from common.lang_dicts import TEXTS, get_lang
+from Config import Config
+from collections import Counter, defaultdict
+import os
+import time
 
 
 async def find_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -62,3 +79,176 @@ async def hide_ids_keyboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
 hide_ids_keyboard_handler = CallbackQueryHandler(
     callback=hide_ids_keyboard, pattern="^hide_ids_keyboard$"
 )
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms"
+
+
+def stats_section(lang, title_key: str, rows: list) -> str:
+    body = "\n".join(rows) or TEXTS[lang]["stats_no_data"]
+    return f"<b>{TEXTS[lang][title_key]}</b>\n<pre>{escape_html(body)}</pre>"
+
+
+def build_stats_text(lang) -> str:
+    top = Config.STATS_TOP_ROWS
+    sections = [
+        TEXTS[lang]["stats_title"].format(
+            uptime=int((time.time() - metrics.started) // 60),
+            worker=Config.WORKER_INDEX or 0,
+        )
+    ]
+
+    handlers = sorted(
+        list(metrics.handler_latency.items()),
+        key=lambda kv: kv[1].quantile(0.95),
+        reverse=True,
+    )
+    rows = [
+        f"{name}: {hist.count}x mean {ms(hist.mean)} p95 {ms(hist.quantile(0.95))} "
+        f"queries {metrics.handler_queries[name].mean:.1f} "
+        f"errors {metrics.handler_errors[name]}"
+        for name, hist in handlers[:top]
+    ]
+    sections.append(stats_section(lang, "stats_handlers", rows))
+
+    queries = sorted(
+        list(metrics.query_latency.items()), key=lambda kv: kv[1].sum, reverse=True
+    )
+    rows = [
+        f"{name}: {hist.count} queries, total {ms(hist.sum)}, p95 {ms(hist.quantile(0.95))}"
+        for name, hist in queries[:top]
+    ]
+    slow = slow_queries.worst()
+    if slow:
+        rows.append(
+            f"slow (/slow_queries): {sum(q.count for q in slow)} statements "
+            f"of {len(slow)} shapes over {slow_queries.threshold * 1000:g}ms"
+        )
+    sections.append(stats_section(lang, "stats_database", rows))
+
+    # Calls of all handlers together, by service and endpoint
+    upstream = defaultdict(Histogram)
+    errors = Counter()
+    for (service, endpoint, _), hist in list(metrics.upstream_latency.items()):
+        upstream[f"{service} {endpoint}"].merge(hist)
+    for (service, endpoint, _), n in list(metrics.upstream_errors.items()):
+        errors[f"{service} {endpoint}"] += n
+    rows = [
+        f"{key}: {hist.count}x mean {ms(hist.mean)} p95 {ms(hist.quantile(0.95))} "
+        f"errors {errors[key]}"
+        for key, hist in sorted(upstream.items(), key=lambda kv: kv[1].sum, reverse=True)[:top]
+    ]
+    sections.append(stats_section(lang, "stats_upstream", rows))
+
+    lag = metrics.loop_lag
+    rows = [f"lag: p95 {ms(lag.quantile(0.95))} max {ms(lag.max)}"] + [
+        f"{call.location}: {call.count} blocks, total {ms(call.total)}, max {ms(call.max)}"
+        for call in loop_monitor.worst_offenders(top)
+    ]
+    sections.append(stats_section(lang, "stats_event_loop", rows))
+
+    fallbacks = ", ".join(f"{kind} {n}" for kind, n in media_fallbacks.items())
+    sections.append(
+        f"<b>{TEXTS[lang]['stats_rendering']}</b>\n"
+        f"{render_report()}\n"
+        f"media fallbacks: {fallbacks or 0}"
+    )
+    return "\n\n".join(sections)
+
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndOwner().filter(update):
+        lang = get_lang(update.effective_user.id)
+        await update.message.reply_text(text=build_stats_text(lang))
+
+
+stats_command = CommandHandler(command="stats", callback=stats)
+
+
+async def slow_queries_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndOwner().filter(update):
+        lang = get_lang(update.effective_user.id)
+        threshold = f"{slow_queries.threshold * 1000:g}ms"
+        if not slow_queries.queries:
+            await update.message.reply_text(
+                text=TEXTS[lang]["slow_queries_none"].format(threshold=threshold)
+            )
+            return
+        await update.message.reply_document(
+            document=slow_queries.report().encode(),
+            filename=f"slow_queries_{time.strftime('%Y%m%d_%H%M%S')}.txt",
+            caption=TEXTS[lang]["slow_queries_caption"].format(
+                count=len(slow_queries.queries), threshold=threshold
+            ),
+        )
+
+
+slow_queries_command = CommandHandler(command="slow_queries", callback=slow_queries_report)
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndOwner().filter(update):
+        lang = get_lang(update.effective_user.id)
+        if context.args == ["stop"]:
+            if not profiler.active:
+                await update.message.reply_text(text=TEXTS[lang]["profile_not_running"])
+                return
+            await profiler.finish()
+            return
+        if profiler.active:
+            await update.message.reply_text(
+                text=TEXTS[lang]["profile_running"].format(remaining=profiler.remaining)
+            )
+            return
+
+        handler = None
+        updates = Config.PROFILER_DEFAULT_UPDATES
+        for arg in context.args:
+            if arg.isdigit():
+                updates = int(arg)
+            else:
+                handler = arg
+        if not updates:
+            await update.message.reply_text(text=TEXTS[lang]["profile_usage"])
+            return
+        if handler:
+            names = {
+                name
+                for handlers in context.application.handlers.values()
+                for app_handler in handlers
+                for name in handler_names(app_handler)
+            }
+            if handler not in names:
+                await update.message.reply_text(
+                    text=TEXTS[lang]["profile_unknown_handler"].format(
+                        handler=escape_html(handler)
+                    )
+                )
+                return
+
+        chat_id = update.effective_chat.id
+
+        async def send_profile(summary_path: str, folded_path: str):
+            with open(summary_path, "rb") as summary:
+                await context.bot.send_document(
+                    chat_id=chat_id,
+                    document=summary,
+                    filename=os.path.basename(summary_path),
+                    caption=TEXTS[lang]["profile_done"].format(path=folded_path),
+                )
+
+        profiler.start(updates, handler, on_done=send_profile)
+        await update.message.reply_text(
+            text=TEXTS[lang]["profile_started"].format(
+                handler=(
+                    f"<code>{escape_html(handler)}</code>"
+                    if handler
+                    else TEXTS[lang]["profile_all_handlers"]
+                ),
+                updates=updates,
+            )
+        )
+
+
+profile_command = CommandHandler(command="profile", callback=profile)
@@ -22,7 +22,7 @@ from common.lang_dicts import TEXTS, get_lang
 from common.common import escape_html
 from custom_filters import PrivateChatAndAdmin, PermissionFilter
 from start import admin_command, start_command
-from services.g2bulk_api import G2BulkAPI
+from services.catalogue_cache import catalogue_cache
 import models
 
 # Conversation states
@@ -62,9 +62,8 @@ async def filter_api_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
         lang = get_lang(update.effective_user.id)
 
         try:
-            # Fetch games from API
-            api = G2BulkAPI()
-            api_games = await api.get_games()
+            # Fetch games from API, an explicit refresh skips the cache ttl
+            api_games = (await catalogue_cache.get_games(force=True)).games
 
             if not api_games:
                 await update.callback_query.answer(
@@ -81,8 +80,7 @@ async def filter_api_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     game.api_game_code: game for game in s.query(models.ApiGame).all()
                 }
 
-            # Store games in context for pagination
-            context.user_data["api_all_games"] = api_games
+            context.user_data.pop("api_all_games", None)
             context.user_data["api_games_page"] = 0
 
             # Build and show keyboard
@@ -127,13 +125,7 @@ async def handle_api_games_pagination(
 
         try:
             page = int(page_str)
-            api_games = context.user_data.get("api_all_games", [])
-
-            if not api_games:
-                # Reload games if not in context
-                api = G2BulkAPI()
-                api_games = await api.get_games()
-                context.user_data["api_all_games"] = api_games
+            api_games = (await catalogue_cache.get_games()).games
 
             # Get existing games from database
             with models.session_scope() as s:
@@ -178,7 +170,10 @@ async def show_api_game_details(update: Update, context: ContextTypes.DEFAULT_TY
         game_code = update.callback_query.data.replace("api_game_filter_", "")
 
         # Get game info from API games list
-        api_games = context.user_data.get("api_all_games", [])
+        try:
+            api_games = (await catalogue_cache.get_games()).games
+        except Exception:
+            api_games = []
         game_info = None
         for game in api_games:
             if game.get("code") == game_code:
@@ -366,15 +361,10 @@ async def back_to_api_games_list(update: Update, context: ContextTypes.DEFAULT_T
     ).filter(update):
         lang = get_lang(update.effective_user.id)
 
-        api_games = context.user_data.get("api_all_games", [])
-        if not api_games:
-            # Reload games if not in context
-            try:
-                api = G2BulkAPI()
-                api_games = await api.get_games()
-                context.user_data["api_all_games"] = api_games
-            except Exception:
-                return await filter_api_games_settings(update, context)
+        try:
+            api_games = (await catalogue_cache.get_games()).games
+        except Exception:
+            return await filter_api_games_settings(update, context)
 
         # Get existing games from database
         with models.session_scope() as s:
@@ -22,6 +22,12 @@ from admin.orders_settings.handlers import (
     view_api_purchase_order_admin_handler,
     api_purchase_orders_pagination_handler,
     back_to_api_purchase_orders_admin_handler,
+    bulk_orders_handler,
+    show_bulk_orders_handler,
+    toggle_bulk_order_handler,
+    select_bulk_orders_handler,
+    apply_bulk_order_status_handler,
+    confirm_bulk_order_status_handler,
 )
 
 __all__ = [
@@ -48,4 +54,10 @@ __all__ = [
     "view_api_purchase_order_admin_handler",
     "api_purchase_orders_pagination_handler",
     "back_to_api_purchase_orders_admin_handler",
+    "bulk_orders_handler",
+    "show_bulk_orders_handler",
+    "toggle_bulk_order_handler",
+    "select_bulk_orders_handler",
+    "apply_bulk_order_status_handler",
+    "confirm_bulk_order_status_handler",
 ]
@@ -10,6 +10,9 @@ from admin.orders_settings.keyboards import (
     build_order_status_keyboard,
     build_order_actions_keyboard,
     build_orders_list_keyboard,
+    build_bulk_orders_type_keyboard,
+    build_bulk_orders_keyboard,
+    build_bulk_confirm_keyboard,
     ORDERS_PER_PAGE,
 )
 from common.keyboards import (
@@ -17,7 +20,8 @@ from common.keyboards import (
     build_back_button,
 )
 from common.lang_dicts import TEXTS, get_lang
-from common.common import escape_html, format_float
+from common.common import escape_html, format_float, get_status_emoji
+from common.media import send_media_message, show_media_message
 from custom_filters import (
     PrivateChatAndAdmin,
     PermissionFilter,
@@ -27,7 +31,10 @@ from custom_filters import (
 from sqlalchemy.orm import Session
 import models
 from Config import Config
+from services.outbox import enqueue, outbox_dispatcher
+from user.user_calls.store_catalogue import release_item, reserve_item
 from sqlalchemy.orm import joinedload
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -86,6 +93,146 @@ async def check_and_assign_order(
     return True
 
 
+CHARGING_TERMINAL_STATUSES = [
+    models.ChargingOrderStatus.COMPLETED,
+    models.ChargingOrderStatus.FAILED,
+    models.ChargingOrderStatus.CANCELLED,
+]
+PURCHASE_TERMINAL_STATUSES = [
+    models.PurchaseOrderStatus.COMPLETED,
+    models.PurchaseOrderStatus.FAILED,
+    models.PurchaseOrderStatus.CANCELLED,
+    models.PurchaseOrderStatus.REFUNDED,
+]
+
+
+def apply_order_status(
+    s: Session,
+    order_type: str,
+    order_obj,
+    user_obj: models.User,
+    new_status,
+    lang: models.Language,
+) -> bool:
+    """
+    Change the status of a charging or purchase order in the caller's transaction:
+    adjust the user's balance and the item's stock, then enqueue the archive post (terminal statuses)
+    and the user notification.
+    Returns: whether the status changed
+    """
+    # Save old status before changing
+    old_status = order_obj.status
+    if old_status == new_status:
+        return False
+
+    if order_type == "charging":
+        # If changing TO completed: add balance
+        if new_status == models.ChargingOrderStatus.COMPLETED:
+            user_obj.balance += order_obj.amount
+        # If changing FROM completed to any other status: deduct balance
+        elif old_status == models.ChargingOrderStatus.COMPLETED:
+            user_obj.balance -= order_obj.amount
+        is_terminal = new_status in CHARGING_TERMINAL_STATUSES
+    else:
+        # Note: Balance is deducted when order is created (PENDING status)
+        # So we need to refund when changing to REFUNDED, CANCELLED, or FAILED
+        # And deduct again when changing from these states back to active states
+        if order_obj.item:
+            # States that require refund (balance was already deducted at creation)
+            refund_states = [
+                models.PurchaseOrderStatus.REFUNDED,
+                models.PurchaseOrderStatus.CANCELLED,
+                models.PurchaseOrderStatus.FAILED,
+            ]
+
+            # States that are active (balance was deducted at creation)
+            active_states = [
+                models.PurchaseOrderStatus.PENDING,
+                models.PurchaseOrderStatus.PROCESSING,
+                models.PurchaseOrderStatus.COMPLETED,
+            ]
+
+            # If changing FROM active state TO refund state: refund balance
+            # and give the reserved unit back to the item's stock. Orders
+            # placed before stock was reserved never took one.
+            if old_status in active_states and new_status in refund_states:
+                user_obj.balance += order_obj.item.price
+                if order_obj.stock_reserved:
+                    release_item(s, order_obj.item_id)
+                    order_obj.stock_reserved = False
+            # If changing FROM refund state TO active state: deduct balance again
+            elif old_status in refund_states and new_status in active_states:
+                user_obj.balance -= order_obj.item.price
+                order_obj.stock_reserved = reserve_item(s, order_obj.item_id)
+                if not order_obj.stock_reserved:
+                    logger.warning(
+                        f"Purchase order {order_obj.id} reactivated with item {order_obj.item_id} out of stock"
+                    )
+        is_terminal = new_status in PURCHASE_TERMINAL_STATUSES
+
+    # Update status
+    order_obj.status = new_status
+
+    # If terminal, archive the order
+    if is_terminal:
+        try:
+            archive_lang = lang  # Use admin's language for archive
+            archive_text = order_obj.stringify(archive_lang)
+            archive_text += f"\n\n<b>{TEXTS[archive_lang].get('user', 'User')}:</b>"
+            archive_text += f"\n{user_obj.stringify(archive_lang)}"
+
+            if order_type == "charging":
+                archive_channel = Config.CHARGING_BALANCE_ORDERS_ARCHIVE_CHANNEL
+                # Send with payment proof if exists
+                enqueue(
+                    s,
+                    archive_channel,
+                    archive_text,
+                    media=order_obj.payment_proof,
+                    media_kind=order_obj.payment_proof_kind,
+                )
+            else:
+                archive_channel = Config.MANUAL_PURCHASES_ARCHIVE_CHANNEL
+                enqueue(s, archive_channel, archive_text)
+
+            logger.info(
+                f"Queued archiving of {order_type} order {order_obj.id} to channel {archive_channel}"
+            )
+        except Exception as e:
+            logger.error(
+                f"Error archiving {order_type} order {order_obj.id}: {str(e)}",
+                exc_info=True,
+            )
+
+    # sending notification to user
+    user_lang = user_obj.lang
+    status_text = TEXTS[user_lang].get(
+        f"order_status_{new_status.value}", new_status.value
+    )
+    status_emoji = get_status_emoji(new_status)
+
+    if order_type == "charging":
+        notification_text = TEXTS[user_lang].get(
+            "charging_order_status_changed",
+            "🔔 <b>Charging Balance Order Status Updated</b>\n\n",
+        )
+        notification_text += f"<b>{TEXTS[user_lang].get('order_id', 'Order ID')}:</b> <code>{order_obj.id}</code>\n"
+        notification_text += f"<b>{TEXTS[user_lang].get('order_status', 'Order Status')}:</b> {status_text} {status_emoji}\n"
+        notification_text += f"<b>{TEXTS[user_lang].get('order_amount', 'Amount')}:</b> <code>{format_float(order_obj.amount)}</code>"
+    else:
+        notification_text = TEXTS[user_lang].get(
+            "purchase_order_status_changed",
+            "🔔 <b>Purchase Order Status Updated</b>\n\n",
+        )
+        notification_text += f"<b>{TEXTS[user_lang].get('order_id', 'Order ID')}:</b> <code>{order_obj.id}</code>\n"
+        notification_text += f"<b>{TEXTS[user_lang].get('order_status', 'Order Status')}:</b> {status_text} {status_emoji}"
+        if order_obj.item:
+            notification_text += f"\n<b>{TEXTS[user_lang].get('item_name', 'Item Name')}:</b> {escape_html(order_obj.item.name)}"
+
+    enqueue(s, user_obj.user_id, notification_text)
+    return True
+
+
 async def orders_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if PrivateChatAndAdmin().filter(update) and PermissionFilter(
         models.Permission.MANAGE_ORDERS
@@ -93,18 +240,12 @@ async def orders_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         lang = get_lang(update.effective_user.id)
         keyboard = build_orders_settings_keyboard(lang)
         keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=True)[0])
-        try:
-            await update.callback_query.edit_message_text(
-                text=TEXTS[lang].get("orders_settings_title", "Orders Management"),
-                reply_markup=InlineKeyboardMarkup(keyboard),
-            )
-        except:
-            await update.callback_query.delete_message()
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=TEXTS[lang].get("orders_settings_title", "Orders Management"),
-                reply_markup=InlineKeyboardMarkup(keyboard),
-            )
+        # Edited in place unless it comes back from an order's payment proof
+        await show_media_message(
+            update.callback_query,
+            TEXTS[lang].get("orders_settings_title", "Orders Management"),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        )
 
 
 orders_settings_handler = CallbackQueryHandler(
@@ -122,6 +263,7 @@ async def request_charging_order(update: Update, context: ContextTypes.DEFAULT_T
             # Find oldest pending or processing charging order
             order = (
                 s.query(models.ChargingBalanceOrder)
+                .options(*models.CHARGING_ORDER_RENDER)
                 .filter(
                     models.ChargingBalanceOrder.status.in_(
                         [
@@ -159,101 +301,15 @@ async def request_charging_order(update: Update, context: ContextTypes.DEFAULT_T
             )
             keyboard = InlineKeyboardMarkup(actions_keyboard)
 
-            # If payment proof exists, use photo-caption style
-            if order.payment_proof:
-                # Check if current message has a photo
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Message already has photo, edit caption
-                    try:
-                        await update.callback_query.edit_message_caption(
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If edit fails, delete and send new photo with caption
-                        try:
-                            await update.callback_query.message.delete()
-                            await context.bot.send_photo(
-                                chat_id=update.effective_chat.id,
-                                photo=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If photo fails, try document
-                            try:
-                                await context.bot.send_document(
-                                    chat_id=update.effective_chat.id,
-                                    document=order.payment_proof,
-                                    caption=text,
-                                    reply_markup=keyboard,
-                                )
-                            except:
-                                # Fallback to text message
-                                await context.bot.send_message(
-                                    chat_id=update.effective_chat.id,
-                                    text=text,
-                                    reply_markup=keyboard,
-                                )
-                else:
-                    # Message doesn't have photo, need to replace with photo
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_photo(
-                            chat_id=update.effective_chat.id,
-                            photo=order.payment_proof,
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If photo fails, try document
-                        try:
-                            await context.bot.send_document(
-                                chat_id=update.effective_chat.id,
-                                document=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # Fallback to text message
-                            await update.callback_query.edit_message_text(
-                                text=text,
-                                reply_markup=keyboard,
-                            )
-            else:
-                # No payment proof, use text message
-                # Check if current message has photo (need to replace with text)
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Current message has photo but order doesn't have proof, replace with text
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_message(
-                            chat_id=update.effective_chat.id,
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If delete fails, try editing caption (will fail but we try)
-                        await update.callback_query.edit_message_text(
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                else:
-                    # No photo, just edit text
-                    await update.callback_query.edit_message_text(
-                        text=text,
-                        reply_markup=keyboard,
-                    )
+            # Payment proof is shown with the send/edit method of its kind
+            await show_media_message(
+                update.callback_query,
+                text,
+                media=order.payment_proof,
+                media_kind=order.payment_proof_kind,
+                media_unique_id=order.payment_proof_unique_id,
+                reply_markup=keyboard,
+            )
 
 
 request_charging_order_handler = CallbackQueryHandler(
@@ -271,6 +327,7 @@ async def request_purchase_order(update: Update, context: ContextTypes.DEFAULT_T
             # Find oldest pending or processing purchase order
             order = (
                 s.query(models.PurchaseOrder)
+                .options(*models.PURCHASE_ORDER_RENDER)
                 .filter(
                     models.PurchaseOrder.status.in_(
                         [
@@ -362,21 +419,7 @@ async def show_charging_balance_orders_admin(
 
             text = f"<b>{TEXTS[lang]['charging_balance_orders']}</b>\n\n{TEXTS[lang].get('select_order', 'Select an order to view:')}"
 
-            try:
-                await update.callback_query.edit_message_text(
-                    text=text,
-                    reply_markup=keyboard,
-                )
-            except:
-                try:
-                    await update.callback_query.delete_message()
-                except:
-                    pass
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=text,
-                    reply_markup=keyboard,
-                )
+            await show_media_message(update.callback_query, text, reply_markup=keyboard)
 
 
 async def handle_charging_balance_orders_pagination(
@@ -430,6 +473,7 @@ async def show_purchase_orders_admin(
 
             orders = (
                 s.query(models.PurchaseOrder)
+                .options(joinedload(models.PurchaseOrder.item))
                 .order_by(models.PurchaseOrder.created_at.desc())
                 .offset(offset)
                 .limit(ORDERS_PER_PAGE)
@@ -505,6 +549,7 @@ async def show_api_purchase_orders_admin(
 
             orders = (
                 s.query(models.ApiPurchaseOrder)
+                .options(joinedload(models.ApiPurchaseOrder.api_game))
                 .order_by(models.ApiPurchaseOrder.created_at.desc())
                 .offset(offset)
                 .limit(ORDERS_PER_PAGE)
@@ -541,7 +586,9 @@ async def view_api_purchase_order_admin(
         )
 
         with models.session_scope() as s:
-            order = s.get(models.ApiPurchaseOrder, order_id)
+            order = s.get(
+                models.ApiPurchaseOrder, order_id, options=models.API_PURCHASE_ORDER_RENDER
+            )
             if not order:
                 await update.callback_query.answer(
                     text=TEXTS[lang]["order_not_found"],
@@ -618,7 +665,9 @@ async def view_charging_balance_order_admin(
             order_id = int(order_id)
 
         with models.session_scope() as s:
-            order = s.get(models.ChargingBalanceOrder, order_id)
+            order = s.get(
+                models.ChargingBalanceOrder, order_id, options=models.CHARGING_ORDER_RENDER
+            )
             # Use stringify method and add user info
             text = order.stringify(lang)
             text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -633,101 +682,15 @@ async def view_charging_balance_order_admin(
             )
             keyboard = InlineKeyboardMarkup(actions_keyboard)
 
-            # If payment proof exists, use photo-caption style
-            if order.payment_proof:
-                # Check if current message has a photo
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Message already has photo, edit caption
-                    try:
-                        await update.callback_query.edit_message_caption(
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If edit fails, delete and send new photo with caption
-                        try:
-                            await update.callback_query.message.delete()
-                            await context.bot.send_photo(
-                                chat_id=update.effective_chat.id,
-                                photo=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If photo fails, try document
-                            try:
-                                await context.bot.send_document(
-                                    chat_id=update.effective_chat.id,
-                                    document=order.payment_proof,
-                                    caption=text,
-                                    reply_markup=keyboard,
-                                )
-                            except:
-                                # Fallback to text message
-                                await context.bot.send_message(
-                                    chat_id=update.effective_chat.id,
-                                    text=text,
-                                    reply_markup=keyboard,
-                                )
-                else:
-                    # Message doesn't have photo, need to replace with photo
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_photo(
-                            chat_id=update.effective_chat.id,
-                            photo=order.payment_proof,
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If photo fails, try document
-                        try:
-                            await context.bot.send_document(
-                                chat_id=update.effective_chat.id,
-                                document=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # Fallback to text message
-                            await update.callback_query.edit_message_text(
-                                text=text,
-                                reply_markup=keyboard,
-                            )
-            else:
-                # No payment proof, use text message
-                # Check if current message has photo (need to replace with text)
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Current message has photo but order doesn't have proof, replace with text
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_message(
-                            chat_id=update.effective_chat.id,
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If delete fails, try editing caption (will fail but we try)
-                        await update.callback_query.edit_message_text(
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                else:
-                    # No photo, just edit text
-                    await update.callback_query.edit_message_text(
-                        text=text,
-                        reply_markup=keyboard,
-                    )
+            # Payment proof is shown with the send/edit method of its kind
+            await show_media_message(
+                update.callback_query,
+                text,
+                media=order.payment_proof,
+                media_kind=order.payment_proof_kind,
+                media_unique_id=order.payment_proof_unique_id,
+                reply_markup=keyboard,
+            )
 
 
 view_charging_balance_order_admin_handler = CallbackQueryHandler(
@@ -751,7 +714,9 @@ async def view_purchase_order_admin(update: Update, context: ContextTypes.DEFAUL
             order_id = int(order_id)
 
         with models.session_scope() as s:
-            order = s.get(models.PurchaseOrder, order_id)
+            order = s.get(
+                models.PurchaseOrder, order_id, options=models.PURCHASE_ORDER_RENDER
+            )
             # Use stringify method and add user info
             text = order.stringify(lang)
             text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -872,148 +837,16 @@ async def set_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         current_admin_id = update.effective_user.id
 
         with models.session_scope() as s:
-            user_obj = None
             if order_type == "charging":
-                order_obj = s.get(models.ChargingBalanceOrder, order_id)
-                if order_obj:
-                    # Check if order status is terminal (cannot be changed)
-                    terminal_statuses = [
-                        models.ChargingOrderStatus.COMPLETED,
-                        models.ChargingOrderStatus.FAILED,
-                        models.ChargingOrderStatus.CANCELLED,
-                    ]
-                    if order_obj.status in terminal_statuses:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get(
-                                "order_status_terminal",
-                                "⚠️ لا يمكن تغيير حالة الطلب لأنه في حالة نهائية",
-                            ),
-                            show_alert=True,
-                        )
-                        await update.callback_query.delete_message()
-                        return
-                    
-                    # Check if order is assigned to another admin
-                    is_allowed = await check_and_assign_order(
-                        context, order_obj, order_type, current_admin_id, s
-                    )
-                    if not is_allowed:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get(
-                                "order_already_assigned", "Order already assigned ❌"
-                            ),
-                            show_alert=True,
-                        )
-                        await update.callback_query.delete_message()
-                        return
-                if order_obj:
-                    # Get user first
-                    user_obj = s.get(models.User, order_obj.user_id)
-                    if not user_obj:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get("user_not_found", "User not found ❌"),
-                            show_alert=True,
-                        )
-                        return
-
-                    # Save old status before changing
-                    old_status = order_obj.status
-                    new_status = models.ChargingOrderStatus(status_value)
-
-                    # Only process balance changes if status actually changed
-                    if old_status != new_status:
-                        # If changing TO completed: add balance
-                        if (
-                            old_status != models.ChargingOrderStatus.COMPLETED
-                            and new_status == models.ChargingOrderStatus.COMPLETED
-                        ):
-                            user_obj.balance += order_obj.amount
-                        # If changing FROM completed to any other status: deduct balance
-                        elif (
-                            old_status == models.ChargingOrderStatus.COMPLETED
-                            and new_status != models.ChargingOrderStatus.COMPLETED
-                        ):
-                            user_obj.balance -= order_obj.amount
-
-                    # Update status
-                    order_obj.status = new_status
+                order_obj = s.get(
+                    models.ChargingBalanceOrder, order_id, options=models.CHARGING_ORDER_RENDER
+                )
+                terminal_statuses = CHARGING_TERMINAL_STATUSES
             else:
-                order_obj = s.get(models.PurchaseOrder, order_id)
-                if order_obj:
-                    # Check if order status is terminal (cannot be changed)
-                    terminal_statuses = [
-                        models.PurchaseOrderStatus.COMPLETED,
-                        models.PurchaseOrderStatus.FAILED,
-                        models.PurchaseOrderStatus.CANCELLED,
-                        models.PurchaseOrderStatus.REFUNDED,
-                    ]
-                    if order_obj.status in terminal_statuses:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get(
-                                "order_status_terminal",
-                                "⚠️ لا يمكن تغيير حالة الطلب لأنه في حالة نهائية",
-                            ),
-                            show_alert=True,
-                        )
-                        return
-                    
-                    # Check if order is assigned to another admin
-                    is_allowed = await check_and_assign_order(
-                        context, order_obj, order_type, current_admin_id, s
-                    )
-                    if not is_allowed:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get(
-                                "order_already_assigned", "Order already assigned ❌"
-                            ),
-                            show_alert=True,
-                        )
-                        await update.callback_query.delete_message()
-                        return
-                    
-                    # Get user first
-                    user_obj = s.get(models.User, order_obj.user_id)
-                    if not user_obj:
-                        await update.callback_query.answer(
-                            text=TEXTS[lang].get("user_not_found", "User not found ❌"),
-                            show_alert=True,
-                        )
-                        return
-
-                    # Save old status before changing
-                    old_status = order_obj.status
-                    new_status = models.PurchaseOrderStatus(status_value)
-
-                    # Only process balance changes if status actually changed and item exists
-                    # Note: Balance is deducted when order is created (PENDING status)
-                    # So we need to refund when changing to REFUNDED, CANCELLED, or FAILED
-                    # And deduct again when changing from these states back to active states
-                    if old_status != new_status and order_obj.item:
-                        # States that require refund (balance was already deducted at creation)
-                        refund_states = [
-                            models.PurchaseOrderStatus.REFUNDED,
-                            models.PurchaseOrderStatus.CANCELLED,
-                            models.PurchaseOrderStatus.FAILED,
-                        ]
-
-                        # States that are active (balance was deducted at creation)
-                        active_states = [
-                            models.PurchaseOrderStatus.PENDING,
-                            models.PurchaseOrderStatus.PROCESSING,
-                            models.PurchaseOrderStatus.COMPLETED,
-                        ]
-
-                        # If changing FROM active state TO refund state: refund balance
-                        if old_status in active_states and new_status in refund_states:
-                            user_obj.balance += order_obj.item.price
-                        # If changing FROM refund state TO active state: deduct balance again
-                        elif (
-                            old_status in refund_states and new_status in active_states
-                        ):
-                            user_obj.balance -= order_obj.item.price
-
-                    # Update status
-                    order_obj.status = new_status
+                order_obj = s.get(
+                    models.PurchaseOrder, order_id, options=models.PURCHASE_ORDER_RENDER
+                )
+                terminal_statuses = PURCHASE_TERMINAL_STATUSES
 
             if not order_obj:
                 await update.callback_query.answer(
@@ -1022,6 +855,35 @@ async def set_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
+            # Check if order status is terminal (cannot be changed)
+            if order_obj.status in terminal_statuses:
+                await update.callback_query.answer(
+                    text=TEXTS[lang].get(
+                        "order_status_terminal",
+                        "⚠️ لا يمكن تغيير حالة الطلب لأنه في حالة نهائية",
+                    ),
+                    show_alert=True,
+                )
+                if order_type == "charging":
+                    await update.callback_query.delete_message()
+                return
+
+            # Check if order is assigned to another admin
+            is_allowed = await check_and_assign_order(
+                context, order_obj, order_type, current_admin_id, s
+            )
+            if not is_allowed:
+                await update.callback_query.answer(
+                    text=TEXTS[lang].get(
+                        "order_already_assigned", "Order already assigned ❌"
+                    ),
+                    show_alert=True,
+                )
+                await update.callback_query.delete_message()
+                return
+
+            # Get user first
+            user_obj = s.get(models.User, order_obj.user_id)
             if not user_obj:
                 await update.callback_query.answer(
                     text=TEXTS[lang].get("user_not_found", "User not found ❌"),
@@ -1029,148 +891,25 @@ async def set_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
 
-            # Check if new status is terminal (COMPLETED or FAILED) and status actually changed
-            is_terminal = False
-            status_changed = old_status != new_status
             if order_type == "charging":
-                is_terminal = new_status in [
-                    models.ChargingOrderStatus.COMPLETED,
-                    models.ChargingOrderStatus.FAILED,
-                    models.ChargingOrderStatus.CANCELLED,
-                ]
-
+                new_status = models.ChargingOrderStatus(status_value)
             else:
-                is_terminal = new_status in [
-                    models.PurchaseOrderStatus.COMPLETED,
-                    models.PurchaseOrderStatus.FAILED,
-                    models.PurchaseOrderStatus.CANCELLED,
-                    models.PurchaseOrderStatus.REFUNDED,
-                ]
+                new_status = models.PurchaseOrderStatus(status_value)
 
-            # If terminal and status changed, archive the order and delete the bot message
-            if is_terminal and status_changed:
-                # Eager load relationships for archiving
-                if order_type == "charging":
-                    order_for_archive = (
-                        s.query(models.ChargingBalanceOrder)
-                        .options(
-                            joinedload(
-                                models.ChargingBalanceOrder.payment_method_address
-                            ).joinedload(models.PaymentMethodAddress.payment_method),
-                            joinedload(models.ChargingBalanceOrder.user),
-                        )
-                        .filter(models.ChargingBalanceOrder.id == order_id)
-                        .first()
-                    )
-                else:
-                    order_for_archive = (
-                        s.query(models.PurchaseOrder)
-                        .options(
-                            joinedload(models.PurchaseOrder.item).joinedload(
-                                models.Item.game
-                            ),
-                            joinedload(models.PurchaseOrder.user),
-                        )
-                        .filter(models.PurchaseOrder.id == order_id)
-                        .first()
-                    )
-
-                if order_for_archive:
-                    # Archive the order
-                    try:
-                        archive_lang = lang  # Use admin's language for archive
-                        archive_text = order_for_archive.stringify(archive_lang)
-                        archive_text += (
-                            f"\n\n<b>{TEXTS[archive_lang].get('user', 'User')}:</b>"
-                        )
-                        archive_text += (
-                            f"\n{order_for_archive.user.stringify(archive_lang)}"
-                        )
+            apply_order_status(s, order_type, order_obj, user_obj, new_status, lang)
+            # Terminal orders are archived, so the bot message is deleted below
+            is_terminal = new_status in terminal_statuses
 
-                        if order_type == "charging":
-                            archive_channel = (
-                                Config.CHARGING_BALANCE_ORDERS_ARCHIVE_CHANNEL
-                            )
-                            # Send with payment proof if exists
-                            if order_for_archive.payment_proof:
-                                try:
-                                    await context.bot.send_photo(
-                                        chat_id=archive_channel,
-                                        photo=order_for_archive.payment_proof,
-                                        caption=archive_text,
-                                    )
-                                except:
-                                    try:
-                                        await context.bot.send_document(
-                                            chat_id=archive_channel,
-                                            document=order_for_archive.payment_proof,
-                                            caption=archive_text,
-                                        )
-                                    except:
-                                        await context.bot.send_message(
-                                            chat_id=archive_channel,
-                                            text=archive_text,
-                                        )
-                            else:
-                                await context.bot.send_message(
-                                    chat_id=archive_channel,
-                                    text=archive_text,
-                                )
-                        else:
-                            archive_channel = Config.MANUAL_PURCHASES_ARCHIVE_CHANNEL
-                            await context.bot.send_message(
-                                chat_id=archive_channel,
-                                text=archive_text,
-                            )
-
-                        logger.info(
-                            f"Archived {order_type} order {order_id} to channel {archive_channel}"
-                        )
-                    except Exception as e:
-                        logger.error(
-                            f"Error archiving {order_type} order {order_id}: {str(e)}",
-                            exc_info=True,
-                        )
+            # Status change and notifications are committed together,
+            # the outbox dispatcher sends them without holding the transaction
+            s.commit()
+            outbox_dispatcher.wake()
 
             await update.callback_query.answer(
                 text=TEXTS[lang].get("order_status_updated", "Order status updated ✅"),
                 show_alert=True,
             )
 
-            # sending notification to user
-            if status_changed:
-                user_lang = user_obj.lang
-                status_text = TEXTS[user_lang].get(
-                    f"order_status_{status_value}", status_value
-                )
-
-                from common.common import get_status_emoji
-
-                status_emoji = get_status_emoji(new_status)
-
-                if order_type == "charging":
-                    notification_text = TEXTS[user_lang].get(
-                        "charging_order_status_changed",
-                        "🔔 <b>Charging Balance Order Status Updated</b>\n\n",
-                    )
-                    notification_text += f"<b>{TEXTS[user_lang].get('order_id', 'Order ID')}:</b> <code>{order_id}</code>\n"
-                    notification_text += f"<b>{TEXTS[user_lang].get('order_status', 'Order Status')}:</b> {status_text} {status_emoji}\n"
-                    notification_text += f"<b>{TEXTS[user_lang].get('order_amount', 'Amount')}:</b> <code>{format_float(order_obj.amount)}</code>"
-                else:
-                    notification_text = TEXTS[user_lang].get(
-                        "purchase_order_status_changed",
-                        "🔔 <b>Purchase Order Status Updated</b>\n\n",
-                    )
-                    notification_text += f"<b>{TEXTS[user_lang].get('order_id', 'Order ID')}:</b> <code>{order_id}</code>\n"
-                    notification_text += f"<b>{TEXTS[user_lang].get('order_status', 'Order Status')}:</b> {status_text} {status_emoji}"
-                    if order_obj.item:
-                        notification_text += f"\n<b>{TEXTS[user_lang].get('item_name', 'Item Name')}:</b> {escape_html(order_obj.item.name)}"
-
-                await context.bot.send_message(
-                    chat_id=user_obj.user_id,
-                    text=notification_text,
-                )
-
         # If order message was deleted (terminal status), redirect to orders list
         if is_terminal:
             # Delete the bot message (not the order from database)
@@ -1190,7 +929,9 @@ async def set_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Return to order view with photo-caption handling
             lang = get_lang(update.effective_user.id)
             with models.session_scope() as s:
-                order = s.get(models.ChargingBalanceOrder, order_id)
+                order = s.get(
+                    models.ChargingBalanceOrder, order_id, options=models.CHARGING_ORDER_RENDER
+                )
                 # Use stringify method and add user info
                 text = order.stringify(lang)
                 text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -1209,109 +950,23 @@ async def set_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 keyboard = InlineKeyboardMarkup(actions_keyboard)
 
-                # If payment proof exists, use photo-caption style
-                if order.payment_proof:
-                    # Check if current message has a photo
-                    current_message = update.callback_query.message
-                    has_photo = (
-                        current_message.photo is not None
-                        and len(current_message.photo) > 0
-                    )
-
-                    if has_photo:
-                        # Message already has photo, edit caption
-                        try:
-                            await update.callback_query.edit_message_caption(
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If edit fails, delete and send new photo with caption
-                            try:
-                                await update.callback_query.message.delete()
-                                await context.bot.send_photo(
-                                    chat_id=update.effective_chat.id,
-                                    photo=order.payment_proof,
-                                    caption=text,
-                                    reply_markup=keyboard,
-                                )
-                            except:
-                                # If photo fails, try document
-                                try:
-                                    await context.bot.send_document(
-                                        chat_id=update.effective_chat.id,
-                                        document=order.payment_proof,
-                                        caption=text,
-                                        reply_markup=keyboard,
-                                    )
-                                except:
-                                    # Fallback to text message
-                                    await context.bot.send_message(
-                                        chat_id=update.effective_chat.id,
-                                        text=text,
-                                        reply_markup=keyboard,
-                                    )
-                    else:
-                        # Message doesn't have photo, need to replace with photo
-                        try:
-                            await update.callback_query.message.delete()
-                            await context.bot.send_photo(
-                                chat_id=update.effective_chat.id,
-                                photo=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If photo fails, try document
-                            try:
-                                await context.bot.send_document(
-                                    chat_id=update.effective_chat.id,
-                                    document=order.payment_proof,
-                                    caption=text,
-                                    reply_markup=keyboard,
-                                )
-                            except:
-                                # Fallback to text message
-                                await update.callback_query.edit_message_text(
-                                    text=text,
-                                    reply_markup=keyboard,
-                                )
-                else:
-                    # No payment proof, use text message
-                    # Check if current message has photo (need to replace with text)
-                    current_message = update.callback_query.message
-                    has_photo = (
-                        current_message.photo is not None
-                        and len(current_message.photo) > 0
-                    )
-
-                    if has_photo:
-                        # Current message has photo but order doesn't have proof, replace with text
-                        try:
-                            await update.callback_query.message.delete()
-                            await context.bot.send_message(
-                                chat_id=update.effective_chat.id,
-                                text=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If delete fails, try editing caption (will fail but we try)
-                            await update.callback_query.edit_message_text(
-                                text=text,
-                                reply_markup=keyboard,
-                            )
-                    else:
-                        # No photo, just edit text
-                        await update.callback_query.edit_message_text(
-                            text=text,
-                            reply_markup=keyboard,
-                        )
+                # Payment proof is shown with the send/edit method of its kind
+                await show_media_message(
+                    update.callback_query,
+                    text,
+                    media=order.payment_proof,
+                    media_kind=order.payment_proof_kind,
+                    media_unique_id=order.payment_proof_unique_id,
+                    reply_markup=keyboard,
+                )
 
         else:
             # Purchase order view
             lang = get_lang(update.effective_user.id)
             with models.session_scope() as s:
-                order = s.get(models.PurchaseOrder, order_id)
+                order = s.get(
+                    models.PurchaseOrder, order_id, options=models.PURCHASE_ORDER_RENDER
+                )
                 # Use stringify method and add user info
                 text = order.stringify(lang)
                 text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -1347,6 +1002,303 @@ set_order_status_handler = CallbackQueryHandler(
     r"^set_order_status_(charging|purchase)_(pending|processing|completed|failed|cancelled|refunded)$",
 )
 
+
+def bulk_orders_query(s: Session, order_type: str, admin_id: int):
+    """Open (pending or processing) orders of order_type an admin may act on"""
+    if order_type == "charging":
+        model = models.ChargingBalanceOrder
+        open_statuses = [
+            models.ChargingOrderStatus.PENDING,
+            models.ChargingOrderStatus.PROCESSING,
+        ]
+    else:
+        model = models.PurchaseOrder
+        open_statuses = [
+            models.PurchaseOrderStatus.PENDING,
+            models.PurchaseOrderStatus.PROCESSING,
+        ]
+    return s.query(model).filter(
+        model.status.in_(open_statuses),
+        (model.assigned_admin_id.is_(None)) | (model.assigned_admin_id == admin_id),
+    )
+
+
+async def bulk_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        lang = get_lang(update.effective_user.id)
+        keyboard = build_bulk_orders_type_keyboard(lang)
+        keyboard.append(build_back_button("back_to_orders_settings", lang=lang))
+        keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=True)[0])
+        await update.callback_query.edit_message_text(
+            text=TEXTS[lang].get("bulk_actions_title", "Bulk order actions 📦"),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        )
+
+
+async def show_bulk_orders(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    order_type: str = None,
+    page: int = 0,
+):
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        lang = get_lang(update.effective_user.id)
+        if order_type is None:
+            data = update.callback_query.data.replace("bulk_orders_", "")
+            order_type, page = data.split("_")
+            page = int(page)
+
+        # Selection is kept per orders type
+        if context.user_data.get("bulk_order_type") != order_type:
+            context.user_data["bulk_order_type"] = order_type
+            context.user_data["bulk_order_ids"] = []
+        selected = set(context.user_data["bulk_order_ids"])
+
+        with models.session_scope() as s:
+            query = bulk_orders_query(s, order_type, update.effective_user.id)
+            total_count = query.count()
+            if total_count == 0:
+                await update.callback_query.answer(
+                    text=TEXTS[lang].get("bulk_no_open_orders", "There are no open orders"),
+                    show_alert=True,
+                )
+                return
+
+            total_pages = (total_count + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE
+            page = max(0, min(page, total_pages - 1))
+            if order_type == "charging":
+                query = query.order_by(models.ChargingBalanceOrder.created_at)
+            else:
+                query = query.options(
+                    joinedload(models.PurchaseOrder.item)
+                ).order_by(models.PurchaseOrder.created_at)
+            orders = query.offset(page * ORDERS_PER_PAGE).limit(ORDERS_PER_PAGE).all()
+
+            keyboard = build_bulk_orders_keyboard(
+                orders=orders,
+                selected=selected,
+                lang=lang,
+                order_type=order_type,
+                page=page,
+                total_pages=total_pages,
+            )
+            title = (
+                TEXTS[lang]["charging_balance_orders"]
+                if order_type == "charging"
+                else TEXTS[lang]["purchase_orders"]
+            )
+            text = f"<b>{title}</b>\n\n" + TEXTS[lang].get(
+                "bulk_select_orders", "Selected: <b>{selected}</b> of <b>{total}</b>"
+            ).format(selected=len(selected), total=total_count)
+
+            await update.callback_query.edit_message_text(
+                text=text,
+                reply_markup=keyboard,
+            )
+
+
+async def toggle_bulk_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        data = update.callback_query.data.replace("bulk_toggle_", "")
+        order_type, order_id, page = data.split("_")
+        order_id = int(order_id)
+
+        if context.user_data.get("bulk_order_type") != order_type:
+            context.user_data["bulk_order_type"] = order_type
+            context.user_data["bulk_order_ids"] = []
+        selected = context.user_data["bulk_order_ids"]
+        if order_id in selected:
+            selected.remove(order_id)
+        else:
+            selected.append(order_id)
+
+        await show_bulk_orders(update, context, order_type=order_type, page=int(page))
+
+
+async def select_bulk_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Select all open orders of a type, or clear the selection"""
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        data = update.callback_query.data
+        order_type = data.split("_")[-1]
+
+        context.user_data["bulk_order_type"] = order_type
+        if data.startswith("bulk_select_all_"):
+            with models.session_scope() as s:
+                orders = bulk_orders_query(s, order_type, update.effective_user.id)
+                context.user_data["bulk_order_ids"] = [order.id for order in orders]
+        else:
+            context.user_data["bulk_order_ids"] = []
+
+        await show_bulk_orders(update, context, order_type=order_type)
+
+
+async def apply_bulk_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        lang = get_lang(update.effective_user.id)
+        data = update.callback_query.data.replace("bulk_apply_", "")
+        order_type, status_value = data.split("_", 1)
+
+        selected = context.user_data.get("bulk_order_ids", [])
+        if not selected or context.user_data.get("bulk_order_type") != order_type:
+            await update.callback_query.answer(
+                text=TEXTS[lang].get("bulk_no_selection", "No orders selected ❗️"),
+                show_alert=True,
+            )
+            return
+
+        status_text = TEXTS[lang].get(f"order_status_{status_value}", status_value)
+        await update.callback_query.edit_message_text(
+            text=TEXTS[lang]
+            .get("bulk_confirm", "{count} orders -> {status}")
+            .format(count=len(selected), status=status_text),
+            reply_markup=build_bulk_confirm_keyboard(lang, order_type, status_value),
+        )
+
+
+async def confirm_bulk_order_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if PrivateChatAndAdmin().filter(update) and PermissionFilter(
+        models.Permission.MANAGE_ORDERS
+    ).filter(update):
+        lang = get_lang(update.effective_user.id)
+        data = update.callback_query.data.replace("bulk_confirm_", "")
+        order_type, status_value = data.split("_", 1)
+        current_admin_id = update.effective_user.id
+
+        selected = context.user_data.get("bulk_order_ids", [])
+        if not selected or context.user_data.get("bulk_order_type") != order_type:
+            await update.callback_query.answer(
+                text=TEXTS[lang].get("bulk_no_selection", "No orders selected ❗️"),
+                show_alert=True,
+            )
+            return
+
+        updated_ids = []
+        stale_messages = []
+        with models.session_scope() as s:
+            # Orders that became final or were taken by another admin since
+            # they were selected are left out by the query
+            query = bulk_orders_query(s, order_type, current_admin_id)
+            if order_type == "charging":
+                new_status = models.ChargingOrderStatus(status_value)
+                orders = (
+                    query.options(*models.CHARGING_ORDER_RENDER)
+                    .filter(models.ChargingBalanceOrder.id.in_(selected))
+                    .all()
+                )
+            else:
+                new_status = models.PurchaseOrderStatus(status_value)
+                orders = (
+                    query.options(*models.PURCHASE_ORDER_RENDER)
+                    .filter(models.PurchaseOrder.id.in_(selected))
+                    .all()
+                )
+
+            for order_obj in orders:
+                if not order_obj.user:
+                    continue
+                order_obj.assigned_admin_id = current_admin_id
+                if apply_order_status(
+                    s, order_type, order_obj, order_obj.user, new_status, lang
+                ):
+                    updated_ids.append(order_obj.id)
+
+            # The orders' messages in admins' chats are now stale
+            if updated_ids:
+                admin_messages = (
+                    s.query(models.OrderAdminMessage)
+                    .filter(
+                        models.OrderAdminMessage.order_type == order_type,
+                        models.OrderAdminMessage.order_id.in_(updated_ids),
+                    )
+                    .all()
+                )
+                for admin_msg in admin_messages:
+                    stale_messages.append((admin_msg.admin_id, admin_msg.message_id))
+                    s.delete(admin_msg)
+
+            # All status changes, balance changes and notifications are
+            # committed together
+            s.commit()
+        outbox_dispatcher.wake()
+
+        logger.info(
+            f"Admin {current_admin_id} set {len(updated_ids)} {order_type} orders to {status_value}"
+        )
+        context.user_data["bulk_order_ids"] = []
+
+        semaphore = asyncio.Semaphore(Config.BULK_ORDERS_CONCURRENCY)
+
+        async def delete_admin_message(admin_id: int, message_id: int):
+            async with semaphore:
+                try:
+                    await context.bot.delete_message(
+                        chat_id=admin_id,
+                        message_id=message_id,
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"Failed to delete message {message_id} for admin {admin_id}: {e}"
+                    )
+
+        await asyncio.gather(
+            *(
+                delete_admin_message(admin_id, message_id)
+                for admin_id, message_id in stale_messages
+            )
+        )
+
+        keyboard = [
+            build_back_button(f"bulk_orders_{order_type}_0", lang=lang),
+            build_back_to_home_page_button(lang=lang, is_admin=True)[0],
+        ]
+        await update.callback_query.edit_message_text(
+            text=TEXTS[lang]
+            .get("bulk_done", "{updated} updated, {skipped} skipped")
+            .format(updated=len(updated_ids), skipped=len(selected) - len(updated_ids)),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        )
+
+
+bulk_orders_handler = CallbackQueryHandler(
+    bulk_orders,
+    "^admin_bulk_orders$",
+)
+
+show_bulk_orders_handler = CallbackQueryHandler(
+    show_bulk_orders,
+    r"^bulk_orders_(charging|purchase)_\d+$",
+)
+
+toggle_bulk_order_handler = CallbackQueryHandler(
+    toggle_bulk_order,
+    r"^bulk_toggle_(charging|purchase)_\d+_\d+$",
+)
+
+select_bulk_orders_handler = CallbackQueryHandler(
+    select_bulk_orders,
+    r"^bulk_(select_all|clear)_(charging|purchase)$",
+)
+
+apply_bulk_order_status_handler = CallbackQueryHandler(
+    apply_bulk_order_status,
+    r"^bulk_apply_(charging_(completed|failed)|purchase_(completed|failed|refunded))$",
+)
+
+confirm_bulk_order_status_handler = CallbackQueryHandler(
+    confirm_bulk_order_status,
+    r"^bulk_confirm_(charging_(completed|failed)|purchase_(completed|failed|refunded))$",
+)
+
 back_to_charging_order_handler = CallbackQueryHandler(
     back_to_charging_order,
     r"^back_to_order_charging_\d+$",
@@ -1520,27 +1472,17 @@ async def get_order_notes_from_reply(
 
     # Save notes to order
     with models.session_scope() as s:
-        from sqlalchemy.orm import joinedload
-
         if order_type == "charging":
             order = (
                 s.query(models.ChargingBalanceOrder)
-                .options(
-                    joinedload(
-                        models.ChargingBalanceOrder.payment_method_address
-                    ).joinedload(models.PaymentMethodAddress.payment_method),
-                    joinedload(models.ChargingBalanceOrder.user),
-                )
+                .options(*models.CHARGING_ORDER_RENDER)
                 .filter(models.ChargingBalanceOrder.id == order_id)
                 .first()
             )
         else:
             order = (
                 s.query(models.PurchaseOrder)
-                .options(
-                    joinedload(models.PurchaseOrder.item).joinedload(models.Item.game),
-                    joinedload(models.PurchaseOrder.user),
-                )
+                .options(*models.PURCHASE_ORDER_RENDER)
                 .filter(models.PurchaseOrder.id == order_id)
                 .first()
             )
@@ -1592,37 +1534,17 @@ async def get_order_notes_from_reply(
     # Resend the updated order message
     chat_id = update.effective_chat.id
 
-    # Check if original message had a photo (for charging orders with payment proof)
-    if (
-        order_type == "charging"
-        and hasattr(order, "payment_proof")
-        and order.payment_proof
-    ):
-        try:
-            await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=order.payment_proof,
-                caption=text,
-                reply_markup=keyboard,
-            )
-        except:
-            # If photo fails, try document
-            try:
-                await context.bot.send_document(
-                    chat_id=chat_id,
-                    document=order.payment_proof,
-                    caption=text,
-                    reply_markup=keyboard,
-                )
-            except:
-                # Fallback to text message
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    reply_markup=keyboard,
-                )
+    # Charging orders are resent with their payment proof
+    if order_type == "charging":
+        await send_media_message(
+            context.bot,
+            chat_id,
+            text,
+            media=order.payment_proof,
+            media_kind=order.payment_proof_kind,
+            reply_markup=keyboard,
+        )
     else:
-        # No payment proof, send as text message
         await context.bot.send_message(
             chat_id=chat_id,
             text=text,
@@ -1708,16 +1630,9 @@ async def get_order_amount_from_reply(
 
     # Save new amount to order and update balance accordingly
     with models.session_scope() as s:
-        from sqlalchemy.orm import joinedload
-
         order = (
             s.query(models.ChargingBalanceOrder)
-            .options(
-                joinedload(
-                    models.ChargingBalanceOrder.payment_method_address
-                ).joinedload(models.PaymentMethodAddress.payment_method),
-                joinedload(models.ChargingBalanceOrder.user),
-            )
+            .options(*models.CHARGING_ORDER_RENDER)
             .filter(models.ChargingBalanceOrder.id == order_id)
             .first()
         )
@@ -1798,38 +1713,15 @@ async def get_order_amount_from_reply(
     # Resend the updated order message
     chat_id = update.effective_chat.id
 
-    # Check if original message had a photo (for charging orders with payment proof)
-    if hasattr(order, "payment_proof") and order.payment_proof:
-        try:
-            await context.bot.send_photo(
-                chat_id=chat_id,
-                photo=order.payment_proof,
-                caption=text,
-                reply_markup=keyboard,
-            )
-        except:
-            # If photo fails, try document
-            try:
-                await context.bot.send_document(
-                    chat_id=chat_id,
-                    document=order.payment_proof,
-                    caption=text,
-                    reply_markup=keyboard,
-                )
-            except:
-                # Fallback to text message
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    reply_markup=keyboard,
-                )
-    else:
-        # No payment proof, send as text message
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=text,
-            reply_markup=keyboard,
-        )
+    # Resend with the payment proof, if there is one
+    await send_media_message(
+        context.bot,
+        chat_id,
+        text,
+        media=order.payment_proof,
+        media_kind=order.payment_proof_kind,
+        reply_markup=keyboard,
+    )
 
 
 # Separate handlers instead of ConversationHandler
@@ -35,6 +35,12 @@ def build_orders_settings_keyboard(lang: models.Language):
                 callback_data="request_purchase_order",
             ),
         ],
+        [
+            InlineKeyboardButton(
+                text=BUTTONS[lang].get("bulk_actions", "Bulk Actions 📦"),
+                callback_data="admin_bulk_orders",
+            )
+        ],
     ]
     return keyboard
 
@@ -185,3 +191,118 @@ def build_orders_list_keyboard(
     keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=is_admin)[0])
     
     return InlineKeyboardMarkup(keyboard)
+
+
+def build_bulk_orders_type_keyboard(lang: models.Language):
+    """Build keyboard for choosing the orders type of a bulk action"""
+    return [
+        [
+            InlineKeyboardButton(
+                text=BUTTONS[lang]["charging_balance_orders"],
+                callback_data="bulk_orders_charging_0",
+            ),
+            InlineKeyboardButton(
+                text=BUTTONS[lang]["purchase_orders"],
+                callback_data="bulk_orders_purchase_0",
+            ),
+        ],
+    ]
+
+
+def build_bulk_orders_keyboard(
+    orders: list,
+    selected: set,
+    lang: models.Language,
+    order_type: str,
+    page: int,
+    total_pages: int,
+):
+    """Build keyboard for selecting open orders and applying a bulk action"""
+    keyboard = []
+
+    for order in orders:
+        if order_type == "charging":
+            order_text = f"#{order.id} - {format_float(order.amount)}"
+        else:
+            item_name = order.item.name if order.item else "N/A"
+            order_text = f"#{order.id} - {escape_html(item_name[:15])}"
+        order_text += f" {get_status_emoji(order.status)}"
+        keyboard.append([
+            InlineKeyboardButton(
+                text=f"{'☑️' if order.id in selected else '⬜'} {order_text}",
+                callback_data=f"bulk_toggle_{order_type}_{order.id}_{page}",
+            )
+        ])
+
+    if total_pages > 1:
+        pagination_row = []
+        if page > 0:
+            pagination_row.append(
+                InlineKeyboardButton(
+                    text="◀️ " + BUTTONS[lang].get("back_button", "Back"),
+                    callback_data=f"bulk_orders_{order_type}_{page - 1}",
+                )
+            )
+        pagination_row.append(
+            InlineKeyboardButton(
+                text=f"{page + 1}/{total_pages}",
+                callback_data="page_info",
+            )
+        )
+        if page < total_pages - 1:
+            pagination_row.append(
+                InlineKeyboardButton(
+                    text=BUTTONS[lang].get("next_button", "Next") + " ▶️",
+                    callback_data=f"bulk_orders_{order_type}_{page + 1}",
+                )
+            )
+        keyboard.append(pagination_row)
+
+    keyboard.append([
+        InlineKeyboardButton(
+            text=BUTTONS[lang].get("bulk_select_all", "Select All ☑️"),
+            callback_data=f"bulk_select_all_{order_type}",
+        ),
+        InlineKeyboardButton(
+            text=BUTTONS[lang].get("bulk_clear", "Clear Selection ⬜"),
+            callback_data=f"bulk_clear_{order_type}",
+        ),
+    ])
+
+    actions_row = [
+        InlineKeyboardButton(
+            text=BUTTONS[lang].get("bulk_approve", "Approve Selected ✅"),
+            callback_data=f"bulk_apply_{order_type}_completed",
+        ),
+        InlineKeyboardButton(
+            text=BUTTONS[lang].get("bulk_reject", "Reject Selected ❌"),
+            callback_data=f"bulk_apply_{order_type}_failed",
+        ),
+    ]
+    if order_type == "purchase":
+        actions_row.append(
+            InlineKeyboardButton(
+                text=BUTTONS[lang].get("bulk_refund", "Refund Selected ↩️"),
+                callback_data=f"bulk_apply_{order_type}_refunded",
+            )
+        )
+    keyboard.append(actions_row)
+
+    keyboard.append(build_back_button("admin_bulk_orders", lang=lang))
+    keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=True)[0])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def build_bulk_confirm_keyboard(lang: models.Language, order_type: str, status: str):
+    """Build keyboard for confirming a bulk status change"""
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(
+                    text=BUTTONS[lang]["confirm_button"],
+                    callback_data=f"bulk_confirm_{order_type}_{status}",
+                )
+            ],
+            build_back_button(f"bulk_orders_{order_type}_0", lang=lang),
+        ]
+    )
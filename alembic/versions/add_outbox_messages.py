@@ -0,0 +1,51 @@
+"""add outbox messages
+
+Revision ID: add_outbox_messages
+Revises: add_order_workers
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_outbox_messages'
+down_revision = 'add_order_workers'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create outbox_messages table
+    op.create_table(
+        'outbox_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('media', sa.String(), nullable=True),
+        sa.Column('media_kind', sa.String(), nullable=True),
+        sa.Column(
+            'status',
+            sa.Enum('PENDING', 'SENT', 'FAILED', name='outboxmessagestatus'),
+            nullable=False,
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_outbox_messages_status_next_attempt',
+        'outbox_messages',
+        ['status', 'next_attempt_at'],
+    )
+
+
+def downgrade() -> None:
+    # Drop outbox_messages table
+    op.drop_index('ix_outbox_messages_status_next_attempt', 'outbox_messages')
+    op.drop_table('outbox_messages')
@@ -0,0 +1,34 @@
+"""add payment proof kind
+
+Revision ID: add_payment_proof_kind
+Revises: add_outbox_messages
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_payment_proof_kind'
+down_revision = 'add_outbox_messages'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Add payment proof media kind and unique file id to charging_balance_orders table
+    with op.batch_alter_table('charging_balance_orders') as batch_op:
+        batch_op.add_column(
+            sa.Column('payment_proof_kind', sa.String(), nullable=True)
+        )
+        batch_op.add_column(
+            sa.Column('payment_proof_unique_id', sa.String(), nullable=True)
+        )
+
+
+def downgrade() -> None:
+    # Remove payment proof media kind and unique file id from charging_balance_orders table
+    with op.batch_alter_table('charging_balance_orders') as batch_op:
+        batch_op.drop_column('payment_proof_unique_id')
+        batch_op.drop_column('payment_proof_kind')
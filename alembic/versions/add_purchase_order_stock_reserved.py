@@ -0,0 +1,35 @@
+"""add purchase order stock reserved
+
+Revision ID: add_purchase_order_stock_reserved
+Revises: make_api_order_id_nullable
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_purchase_order_stock_reserved'
+down_revision = 'make_api_order_id_nullable'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Add stock reserved marker to purchase_orders table, existing orders never reserved a unit
+    with op.batch_alter_table('purchase_orders') as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                'stock_reserved',
+                sa.Boolean(),
+                server_default=sa.false(),
+                nullable=False,
+            )
+        )
+
+
+def downgrade() -> None:
+    # Remove stock reserved marker from purchase_orders table
+    with op.batch_alter_table('purchase_orders') as batch_op:
+        batch_op.drop_column('stock_reserved')
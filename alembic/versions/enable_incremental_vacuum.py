@@ -0,0 +1,31 @@
+"""enable incremental vacuum
+
+Revision ID: enable_incremental_vacuum
+Revises: add_purchase_order_stock_reserved
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'enable_incremental_vacuum'
+down_revision = 'add_purchase_order_stock_reserved'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Switch to auto_vacuum=INCREMENTAL so maintenance can release free pages.
+    # The VACUUM rewrites the whole file, run it with the bot stopped.
+    # VACUUM can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        op.execute('VACUUM')
+
+
+def downgrade() -> None:
+    # Switch back to auto_vacuum=NONE, rewriting the file again
+    with op.get_context().autocommit_block():
+        op.execute('PRAGMA auto_vacuum=NONE')
+        op.execute('VACUUM')
@@ -0,0 +1,33 @@
+"""make api order id nullable
+
+Revision ID: make_api_order_id_nullable
+Revises: add_payment_proof_kind
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'make_api_order_id_nullable'
+down_revision = 'add_payment_proof_kind'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # API orders whose creation went unconfirmed are stored before G2Bulk's order ID is known
+    with op.batch_alter_table('api_purchase_orders') as batch_op:
+        batch_op.alter_column(
+            'api_order_id', existing_type=sa.Integer(), nullable=True
+        )
+
+
+def downgrade() -> None:
+    # Drop the unconfirmed orders that were never found at G2Bulk first
+    op.execute('DELETE FROM api_purchase_orders WHERE api_order_id IS NULL')
+    with op.batch_alter_table('api_purchase_orders') as batch_op:
+        batch_op.alter_column(
+            'api_order_id', existing_type=sa.Integer(), nullable=False
+        )
@@ -0,0 +1,138 @@
+from collections import Counter, OrderedDict
+from typing import Callable
+from sqlalchemy import inspect
+from common.lang_dicts import TEXTS
+from common.common import get_status_emoji
+from Config import Config
+import models
+import threading
+
+# Cards served from the cache, rendered into it, and rendered without it
+# because a row they show had unsaved changes
+card_stats = Counter()
+
+ORDER_STATUSES = (
+    ("order_status_", models.ChargingOrderStatus),
+    ("order_status_", models.PurchaseOrderStatus),
+    ("api_order_status_", models.ApiPurchaseOrderStatus),
+)
+
+
+def compile_templates(lang: models.Language) -> dict:
+    """The lines of the order and user cards and of the API order
+    notifications in lang, as str.format() templates of their values, or
+    as they are for lines without values"""
+    texts = TEXTS[lang]
+
+    def label(key: str) -> str:
+        return texts[key].replace("{", "{{").replace("}", "}}")
+
+    def refunded(key: str, emoji: str) -> str:
+        # balance_refunded keeps its {amount}
+        return f"{emoji} {label(key)}\n\n💰 " + texts["balance_refunded"]
+
+    return {
+        "order_details": f"<b>{texts['order_details_text']}</b>\n",
+        "order_id": f"<b>{label('order_id')}:</b> <code>{{}}</code>",
+        "api_order_id": f"<b>{label('api_order_id')}:</b> <code>{{}}</code>",
+        "order_status": f"<b>{label('order_status')}:</b> {{}}",
+        "order_amount": f"<b>{label('order_amount')}:</b> <code>{{}}</code>",
+        "order_date": f"<b>{label('order_date')}:</b> <code>{{}}</code>",
+        "payment_method": f"<b>{label('payment_method')}:</b> {{}}",
+        "payment_address": f"<b>{label('payment_address')}:</b> <code>{{}}</code>",
+        "payment_proof": f"\n<b>{texts['payment_proof']}:</b> ✅",
+        "admin_notes": f"\n<b>{label('admin_notes')}:</b>\n<i>{{}}</i>",
+        "item_name": f"<b>{label('item_name')}:</b> {{}}",
+        "game_name": f"<b>{label('game_name')}:</b> {{}}",
+        "price": f"<b>{label('price')}:</b> <code>{{}}</code>",
+        "price_sdg": f"<b>{label('price')}:</b> <code>{{}} SDG</code>",
+        "game_account_id": f"<b>{label('game_account_id')}:</b> <code>{{}}</code>",
+        "game": f"<b>{label('game')}:</b> {{}}",
+        "denomination": f"<b>{label('denomination')}:</b> {{}}",
+        "player_id": f"<b>{label('player_id')}:</b> <code>{{}}</code>",
+        "player_name": f"<b>{label('player_name')}:</b> {{}}",
+        "server_id": f"<b>{label('server_id')}:</b> <code>{{}}</code>",
+        "message": f"\n<b>{label('message')}:</b>\n<i>{{}}</i>",
+        "remark": f"\n<b>{label('remark')}:</b>\n<i>{{}}</i>",
+        "statuses": {
+            status: f"{texts[prefix + status.value]} {get_status_emoji(status)}"
+            for prefix, statuses in ORDER_STATUSES
+            for status in statuses
+        },
+        "user_id": f"<b>{label('user_id')}:</b> <code>{{}}</code>",
+        "username": f"<b>{label('username')}:</b> {{}}",
+        "name": f"<b>{label('name')}:</b> <b>{{}}</b>",
+        "not_available": texts["not_available"],
+        "order_user_info": f"<i>{texts['order_user_info']}:</i>",
+        # Heads of the API order notifications, formatted with the refund amount
+        "api_order_notifications": {
+            models.ApiPurchaseOrderStatus.COMPLETED: f"✅ {label('api_order_completed')}",
+            models.ApiPurchaseOrderStatus.FAILED: refunded("api_order_failed", "❌"),
+            models.ApiPurchaseOrderStatus.CANCELLED: refunded("api_order_cancelled", "🚫"),
+        },
+    }
+
+
+# Compiled once, at startup
+CARD_TEMPLATES = {lang: compile_templates(lang) for lang in models.Language}
+
+
+def cacheable(row) -> bool:
+    """Whether row is saved as it is, so its updated_at versions its content"""
+    state = inspect(row)
+    return state.has_identity and not state.modified and row.updated_at is not None
+
+
+class CardCache:
+    """Cards rendered by the models' stringify(), kept by (model, primary
+    key, updated_at of each row the card shows, lang), least recently used
+    first out.
+
+    A row's updated_at changes with every UPDATE of it, so repeated views,
+    the admins of a fan-out sharing a language and the archive copies of a
+    notification reuse one rendering until a shown row changes. Cards of
+    rows with unsaved changes in their session are rendered around the
+    cache.
+    """
+
+    def __init__(self, size: int = Config.CARD_CACHE_SIZE):
+        self.size = size
+        self._cards: OrderedDict = OrderedDict()
+        # Cards are rendered in the loop and in worker threads
+        self._lock = threading.Lock()
+
+    def render(
+        self,
+        row,
+        lang: models.Language,
+        build: Callable[[dict], str],
+        *related,
+    ) -> str:
+        """The card of row in lang, build(templates) renders it on a miss.
+        related are the other rows it shows, None for a missing one."""
+        rows = (row, *related)
+        if not all(cacheable(r) for r in rows if r is not None):
+            card_stats["uncached"] += 1
+            return build(CARD_TEMPLATES[lang])
+        key = (
+            type(row).__name__,
+            inspect(row).identity,
+            tuple(r.updated_at if r is not None else None for r in rows),
+            lang,
+        )
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+                card_stats["reused"] += 1
+                return card
+        card = build(CARD_TEMPLATES[lang])
+        with self._lock:
+            self._cards[key] = card
+            while len(self._cards) > self.size:
+                self._cards.popitem(last=False)
+        card_stats["rendered"] += 1
+        return card
+
+
+card_cache = CardCache()
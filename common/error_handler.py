@@ -4,8 +4,13 @@ from telegram.error import TimedOut, NetworkError
 import traceback
 import json
 import html
+import gzip
+import os
+import shutil
 from Config import Config
 
+ERRORS_FILE = "errors.txt"
+
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     if isinstance(context.error, (TimedOut, NetworkError)):
@@ -36,5 +41,33 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 def write_error(error: str):
-    with open("errors.txt", "a", encoding="utf-8") as f:
+    with open(ERRORS_FILE, "a", encoding="utf-8") as f:
         f.write(error + f"{'-'*100}\n\n\n")
+
+
+def rotate_errors_file(
+    max_bytes: int = Config.ERRORS_FILE_MAX_BYTES,
+    backups: int = Config.ERRORS_FILE_BACKUPS,
+) -> int:
+    """Compress the errors file to errors.txt.1.gz once it reaches max_bytes,
+    keeping the last `backups` rotations. Returns the number of bytes reclaimed."""
+    if not os.path.exists(ERRORS_FILE) or os.path.getsize(ERRORS_FILE) < max_bytes:
+        return 0
+
+    reclaimed = 0
+    oldest = f"{ERRORS_FILE}.{backups}.gz"
+    if os.path.exists(oldest):
+        reclaimed += os.path.getsize(oldest)
+        os.remove(oldest)
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{ERRORS_FILE}.{i}.gz"):
+            os.replace(f"{ERRORS_FILE}.{i}.gz", f"{ERRORS_FILE}.{i + 1}.gz")
+
+    # Move the file away first so new errors go to a fresh one
+    rotated = f"{ERRORS_FILE}.1"
+    os.replace(ERRORS_FILE, rotated)
+    size = os.path.getsize(rotated)
+    with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(rotated)
+    return reclaimed + size - os.path.getsize(f"{rotated}.gz")
@@ -0,0 +1,320 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from telegram.ext import Application, BaseHandler, ConversationHandler
+from common.profiler import profiler
+from common.slow_queries import slow_queries
+import aiohttp
+import functools
+import sys
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Upper bounds of the SQL statements per update histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Tag of the queries and upstream calls made outside handlers (jobs, outbox)
+BACKGROUND = "background"
+
+
+class Histogram:
+    """Observations counted in fixed buckets, the layout Prometheus expects"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # The last bucket is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        """Add the observations of a histogram with the same buckets"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs of the Prometheus _bucket series"""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            pairs.append((f"{bound:g}", seen))
+        pairs.append(("+Inf", self.count))
+        return pairs
+
+
+class Metrics:
+    """Measurements of this process since it started"""
+
+    def __init__(self):
+        self.started = time.time()
+        # handler -> seconds per update
+        self.handler_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        # handler -> SQL statements per update
+        self.handler_queries: Dict[str, Histogram] = defaultdict(
+            lambda: Histogram(QUERY_COUNT_BUCKETS)
+        )
+        self.handler_errors = Counter()
+        # handler -> seconds per SQL statement
+        self.query_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        # (service, endpoint, handler) -> seconds per call
+        self.upstream_latency: Dict[Tuple[str, str, str], Histogram] = defaultdict(Histogram)
+        self.upstream_errors = Counter()
+        # seconds the event loop ran its heartbeat late
+        self.loop_lag = Histogram()
+
+
+metrics = Metrics()
+
+
+@dataclass
+class Span:
+    """The handler run the current task is part of"""
+
+    handler: str
+    queries: int = 0
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_handler() -> str:
+    span = current_span.get()
+    return span.handler if span else BACKGROUND
+
+
+def instrument_callback(callback, name: str = None):
+    """Wrap a handler callback to record its latency and SQL statements.
+
+    Everything the callback awaits runs in its span, so queries and upstream
+    calls are tagged with its name. The runs the profiler claims are sampled.
+    """
+    if getattr(callback, "__instrumented__", False):
+        return callback
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context, *args, **kwargs):
+        span = Span(name)
+        token = current_span.set(span)
+        frame = None
+        if profiler.active and profiler.claim(name, update):
+            frame = sys._getframe()
+            profiler.enter(frame, name)
+        started = time.perf_counter()
+        try:
+            return await callback(update, context, *args, **kwargs)
+        except Exception:
+            metrics.handler_errors[name] += 1
+            raise
+        finally:
+            metrics.handler_latency[name].observe(time.perf_counter() - started)
+            metrics.handler_queries[name].observe(span.queries)
+            current_span.reset(token)
+            if frame is not None:
+                profiler.exit(frame)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_handler(handler: BaseHandler):
+    if isinstance(handler, ConversationHandler):
+        for state_handler in chain(
+            handler.entry_points,
+            chain.from_iterable(handler.states.values()),
+            handler.fallbacks,
+        ):
+            instrument_handler(state_handler)
+    elif getattr(handler, "callback", None) is not None:
+        handler.callback = instrument_callback(handler.callback)
+
+
+def handler_names(handler: BaseHandler) -> Iterable[str]:
+    """Names instrument_handler() gives the callbacks of handler"""
+    if isinstance(handler, ConversationHandler):
+        for state_handler in chain(
+            handler.entry_points,
+            chain.from_iterable(handler.states.values()),
+            handler.fallbacks,
+        ):
+            yield from handler_names(state_handler)
+    elif getattr(handler, "callback", None) is not None:
+        yield handler.callback.__name__
+
+
+def instrument_handlers(app: Application):
+    """Instrument every handler added to app so far, including the states of
+    its conversations"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement engine runs and log the slow ones"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        span = current_span.get()
+        if span:
+            span.queries += 1
+        handler = span.handler if span else BACKGROUND
+        metrics.query_latency[handler].observe(elapsed)
+        if elapsed >= slow_queries.threshold:
+            slow_queries.record(cursor, statement, parameters, elapsed, handler)
+
+
+def record_upstream(service: str, endpoint: str, seconds: float, failed: bool = False):
+    key = (service, endpoint, current_handler())
+    metrics.upstream_latency[key].observe(seconds)
+    if failed:
+        metrics.upstream_errors[key] += 1
+
+
+def upstream_trace_config(service: str) -> aiohttp.TraceConfig:
+    """aiohttp trace config timing the calls of a client session.
+
+    The endpoint tag is the trace_request_ctx "endpoint" of the request, or
+    its URL path.
+    """
+
+    def endpoint_of(trace_config_ctx, params) -> str:
+        request_ctx = trace_config_ctx.trace_request_ctx
+        if isinstance(request_ctx, dict) and request_ctx.get("endpoint"):
+            return request_ctx["endpoint"]
+        return params.url.path
+
+    async def on_request_start(session, trace_config_ctx, params):
+        trace_config_ctx.started = time.perf_counter()
+
+    async def on_request_end(session, trace_config_ctx, params):
+        record_upstream(
+            service,
+            endpoint_of(trace_config_ctx, params),
+            time.perf_counter() - trace_config_ctx.started,
+            failed=params.response.status >= 500,
+        )
+
+    async def on_request_exception(session, trace_config_ctx, params):
+        record_upstream(
+            service,
+            endpoint_of(trace_config_ctx, params),
+            time.perf_counter() - trace_config_ctx.started,
+            failed=True,
+        )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+def _labels(**labels) -> str:
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def prometheus_histogram(
+    name: str, help_text: str, histograms: Iterable[Tuple[dict, Histogram]]
+) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        for le, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(**labels, le=le)} {count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def prometheus_counter(
+    name: str, help_text: str, counters: Iterable[Tuple[dict, int]]
+) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for labels, value in counters:
+        lines.append(f"{name}{_labels(**labels)} {value}")
+    return lines
+
+
+def prometheus_lines() -> List[str]:
+    upstream_labels = ("service", "endpoint", "handler")
+    return [
+        *prometheus_histogram(
+            "bot_handler_duration_seconds",
+            "Time handlers take per update.",
+            (({"handler": h}, hist) for h, hist in list(metrics.handler_latency.items())),
+        ),
+        *prometheus_histogram(
+            "bot_handler_queries",
+            "SQL statements handlers run per update.",
+            (({"handler": h}, hist) for h, hist in list(metrics.handler_queries.items())),
+        ),
+        *prometheus_counter(
+            "bot_handler_errors_total",
+            "Handler runs that raised.",
+            (({"handler": h}, n) for h, n in list(metrics.handler_errors.items())),
+        ),
+        *prometheus_histogram(
+            "bot_db_query_duration_seconds",
+            "Time SQL statements take, by the handler that ran them.",
+            (({"handler": h}, hist) for h, hist in list(metrics.query_latency.items())),
+        ),
+        *prometheus_histogram(
+            "bot_upstream_duration_seconds",
+            "Time calls to Telegram and G2Bulk take.",
+            (
+                (dict(zip(upstream_labels, key)), hist)
+                for key, hist in list(metrics.upstream_latency.items())
+            ),
+        ),
+        *prometheus_histogram(
+            "bot_event_loop_lag_seconds",
+            "How late the event loop ran its heartbeat.",
+            [({}, metrics.loop_lag)],
+        ),
+        *prometheus_counter(
+            "bot_upstream_errors_total",
+            "Calls to Telegram and G2Bulk that failed.",
+            (
+                (dict(zip(upstream_labels, key)), n)
+                for key, n in list(metrics.upstream_errors.items())
+            ),
+        ),
+    ]
@@ -398,6 +398,11 @@ TEXTS = {
         "order_processing": "جاري معالجة الطلب...",
         "order_created_success": "تم إنشاء الطلب بنجاح ✅\nرقم الطلب: {order_id}",
         "order_created_error": "حدث خطأ أثناء إنشاء الطلب ❌\n{error}",
+        "order_outcome_unknown": (
+            "تم إرسال طلبك لكن لم يصل تأكيده ⏳\n"
+            "تم خصم السعر من رصيدك وسنبلغك بحالة الطلب فور معرفتها، "
+            "وإن لم يتم تنفيذه سيُعاد المبلغ إلى رصيدك"
+        ),
         "insufficient_balance_api": (
             "رصيدك غير كافٍ ❌\n"
             "رصيدك الحالي: {balance} SDG\n"
@@ -408,6 +413,8 @@ TEXTS = {
         "no_filtered_games_available": "لا توجد ألعاب متاحة. يرجى الاتصال بالمسؤول.",
         "game_not_available": "هذه اللعبة غير متاحة",
         "no_denominations_available": "لا توجد حزم متاحة لهذه اللعبة ❗️",
+        "catalogue_changed": "تم تحديث الأسعار، يرجى اختيار الحزمة من جديد ❗️",
+        "search_expired": "انتهت صلاحية نتائج البحث، يرجى البحث من جديد ❗️",
         # API Purchase Order Statuses
         "api_order_status_pending": "قيد الانتظار",
         "api_order_status_processing": "قيد المعالجة",
@@ -467,6 +474,28 @@ TEXTS = {
         "no_filtered_games": "لا توجد ألعاب مصفاة. يرجى تصفية الألعاب من API أولاً.",
         "game_not_found": "اللعبة غير موجودة",
         "order_user_info": "معلومات صاحب الطلب",
+        "bulk_actions_title": "الإجراءات الجماعية على الطلبات 📦\n\nاختر نوع الطلبات:",
+        "bulk_select_orders": "حدد الطلبات المفتوحة ثم اختر الإجراء.\n\nالمحدد: <b>{selected}</b> من <b>{total}</b> طلب مفتوح",
+        "bulk_no_open_orders": "لا توجد طلبات مفتوحة",
+        "bulk_no_selection": "لم يتم تحديد أي طلب ❗️",
+        "bulk_confirm": "سيتم تغيير حالة <b>{count}</b> طلب إلى {status}\n\nهل أنت متأكد؟",
+        "bulk_done": "تم تحديث <b>{updated}</b> طلب ✅\nتم تخطي <b>{skipped}</b> طلب (في حالة نهائية أو مسند لمشرف آخر)",
+        "stats_title": "إحصائيات الأداء 📊\nخلال آخر {uptime} دقيقة، العامل {worker}",
+        "stats_handlers": "المعالجات (الأبطأ أولاً)",
+        "stats_database": "قاعدة البيانات",
+        "stats_upstream": "الخدمات الخارجية",
+        "stats_rendering": "عرض الرسائل",
+        "stats_event_loop": "حلقة الأحداث",
+        "stats_no_data": "لا توجد بيانات بعد",
+        "profile_usage": "الاستخدام:\n/profile [اسم المعالج] [عدد التحديثات]\n/profile stop",
+        "profile_started": "بدأ تحليل أداء {handler} لـ <b>{updates}</b> تحديث ⏱",
+        "profile_all_handlers": "كل المعالجات",
+        "profile_running": "يوجد تحليل أداء قيد التشغيل، متبقي <b>{remaining}</b> تحديث\n/profile stop لإنهائه",
+        "profile_not_running": "لا يوجد تحليل أداء قيد التشغيل",
+        "profile_unknown_handler": "لا يوجد معالج باسم <code>{handler}</code>",
+        "profile_done": "تحليل الأداء جاهز ✅\nمخطط اللهب: <code>{path}</code>",
+        "slow_queries_none": "لا توجد استعلامات أبطأ من {threshold} بعد",
+        "slow_queries_caption": "الاستعلامات الأبطأ من {threshold}: <b>{count}</b> شكل 🐢",
     },
     models.Language.ENGLISH: {
         "user_welcome_msg": "Welcome {name}",
@@ -879,12 +908,19 @@ TEXTS = {
         "order_processing": "Processing order...",
         "order_created_success": "Order created successfully ✅\nOrder ID: {order_id}",
         "order_created_error": "Error creating order ❌\n{error}",
+        "order_outcome_unknown": (
+            "Your order was sent but its confirmation didn't arrive ⏳\n"
+            "The price was deducted from your balance, we'll notify you of the order's "
+            "status as soon as it's known and refund it if the order wasn't placed"
+        ),
         "insufficient_balance_api": "Insufficient balance ❌\nYour balance: {balance}\nRequired price: {price}",
         "product_out_of_stock": "This product is currently out of stock ❌\nWe apologize for the inconvenience",
         "no_games_available": "No games available at the moment ❗️",
         "no_filtered_games_available": "No games available. Please contact admin.",
         "game_not_available": "This game is not available",
         "no_denominations_available": "No denominations available for this game ❗️",
+        "catalogue_changed": "Prices have been updated, please select the denomination again ❗️",
+        "search_expired": "Search results expired, please search again ❗️",
         # API Purchase Order Statuses
         "api_order_status_pending": "Pending",
         "api_order_status_processing": "Processing",
@@ -944,6 +980,28 @@ TEXTS = {
         "no_filtered_games": "No filtered games found. Please filter games from API first.",
         "game_not_found": "Game not found",
         "order_user_info": "Order's user info",
+        "bulk_actions_title": "Bulk order actions 📦\n\nSelect the orders type:",
+        "bulk_select_orders": "Select open orders, then choose an action.\n\nSelected: <b>{selected}</b> of <b>{total}</b> open orders",
+        "bulk_no_open_orders": "There are no open orders",
+        "bulk_no_selection": "No orders selected ❗️",
+        "bulk_confirm": "The status of <b>{count}</b> orders will be changed to {status}\n\nAre you sure?",
+        "bulk_done": "<b>{updated}</b> orders updated ✅\n<b>{skipped}</b> orders skipped (final status or assigned to another admin)",
+        "stats_title": "Performance stats 📊\nOver the last {uptime} minutes, worker {worker}",
+        "stats_handlers": "Handlers (slowest first)",
+        "stats_database": "Database",
+        "stats_upstream": "Upstream calls",
+        "stats_rendering": "Rendering",
+        "stats_event_loop": "Event loop",
+        "stats_no_data": "No data yet",
+        "profile_usage": "Usage:\n/profile [handler name] [updates]\n/profile stop",
+        "profile_started": "Profiling {handler} for <b>{updates}</b> updates ⏱",
+        "profile_all_handlers": "all handlers",
+        "profile_running": "A profile is running, <b>{remaining}</b> updates left\n/profile stop ends it",
+        "profile_not_running": "No profile is running",
+        "profile_unknown_handler": "No handler is named <code>{handler}</code>",
+        "profile_done": "Handler profile ✅\nFlame graph stacks: <code>{path}</code>",
+        "slow_queries_none": "No statements slower than {threshold} yet",
+        "slow_queries_caption": "Statements slower than {threshold}: <b>{count}</b> shapes 🐢",
     },
 }
 
@@ -1072,6 +1130,12 @@ BUTTONS = {
         "api_purchase_orders": "طلبات الشراء الفورية ⚡",
         "edit_amount": "تعديل المبلغ",
         "support": "الدعم 💬",
+        "bulk_actions": "إجراءات جماعية 📦",
+        "bulk_select_all": "تحديد الكل ☑️",
+        "bulk_clear": "إلغاء التحديد ⬜",
+        "bulk_approve": "قبول المحدد ✅",
+        "bulk_reject": "رفض المحدد ❌",
+        "bulk_refund": "استرداد المحدد ↩️",
     },
     models.Language.ENGLISH: {
         "check_joined": "Verify ✅",
@@ -1183,6 +1247,12 @@ BUTTONS = {
         "api_purchase_orders": "Instant Purchase Orders ⚡",
         "edit_amount": "Edit Amount",
         "support": "Support 💬",
+        "bulk_actions": "Bulk Actions 📦",
+        "bulk_select_all": "Select All ☑️",
+        "bulk_clear": "Clear Selection ⬜",
+        "bulk_approve": "Approve Selected ✅",
+        "bulk_reject": "Reject Selected ❌",
+        "bulk_refund": "Refund Selected ↩️",
     },
 }
 
@@ -0,0 +1,126 @@
+from collections import Counter
+from typing import Optional
+from telegram import (
+    Bot,
+    CallbackQuery,
+    InlineKeyboardMarkup,
+    InputMediaDocument,
+    InputMediaPhoto,
+    Message,
+)
+from telegram.error import BadRequest
+import logging
+
+logger = logging.getLogger(__name__)
+
+PHOTO = "photo"
+DOCUMENT = "document"
+
+# Send attempts that failed because media was sent as the wrong kind, by kind
+media_fallbacks = Counter()
+
+
+def get_message_media(message: Message):
+    """Return (file_id, file_unique_id, kind) of a message's photo or document,
+    or None if it has neither"""
+    if message.photo:
+        photo = message.photo[-1]
+        return photo.file_id, photo.file_unique_id, PHOTO
+    if message.document:
+        return message.document.file_id, message.document.file_unique_id, DOCUMENT
+    return None
+
+
+def media_kinds(media_kind: Optional[str]) -> list:
+    """Kinds to send media as, in order. The recorded kind comes first, media
+    stored before its kind was recorded is tried as a photo first."""
+    return [DOCUMENT, PHOTO] if media_kind == DOCUMENT else [PHOTO, DOCUMENT]
+
+
+async def send_media_message(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    media: Optional[str] = None,
+    media_kind: Optional[str] = None,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+) -> Message:
+    """Send text, as the caption of media if there is any, with the send method
+    of media_kind. Falls back to the other kind, then to a text message."""
+    if media:
+        for kind in media_kinds(media_kind):
+            try:
+                if kind == PHOTO:
+                    return await bot.send_photo(
+                        chat_id=chat_id,
+                        photo=media,
+                        caption=text,
+                        reply_markup=reply_markup,
+                    )
+                return await bot.send_document(
+                    chat_id=chat_id,
+                    document=media,
+                    caption=text,
+                    reply_markup=reply_markup,
+                )
+            except BadRequest as e:
+                media_fallbacks[kind] += 1
+                logger.warning(f"Sending media to {chat_id} as {kind} failed: {e}")
+    return await bot.send_message(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=reply_markup,
+    )
+
+
+async def show_media_message(
+    query: CallbackQuery,
+    text: str,
+    media: Optional[str] = None,
+    media_kind: Optional[str] = None,
+    media_unique_id: Optional[str] = None,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+):
+    """Show text and optional media in the message of a callback query.
+
+    - Same media already shown: the caption is edited.
+    - Media replacing media: the media is edited in place.
+    - Text replacing text: the text is edited.
+    - Otherwise the message is deleted and a new one is sent.
+    """
+    current = get_message_media(query.message)
+    try:
+        if media and current:
+            _, current_unique_id, current_kind = current
+            if media_unique_id and media_unique_id == current_unique_id:
+                await query.edit_message_caption(caption=text, reply_markup=reply_markup)
+                return
+            kind = media_kinds(media_kind)[0]
+            if kind == PHOTO:
+                input_media = InputMediaPhoto(media=media, caption=text)
+            else:
+                input_media = InputMediaDocument(media=media, caption=text)
+            await query.edit_message_media(media=input_media, reply_markup=reply_markup)
+            return
+        if not media and not current:
+            await query.edit_message_text(text=text, reply_markup=reply_markup)
+            return
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return
+        if media:
+            media_fallbacks[media_kinds(media_kind)[0]] += 1
+        logger.warning(f"Editing message {query.message.message_id} failed: {e}")
+
+    try:
+        await query.message.delete()
+    except BadRequest:
+        pass
+    await send_media_message(
+        query.get_bot(),
+        query.message.chat_id,
+        text,
+        media=media,
+        media_kind=media_kind,
+        reply_markup=reply_markup,
+    )
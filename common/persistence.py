@@ -0,0 +1,427 @@
+from concurrent.futures import ThreadPoolExecutor
+from telegram import Bot, TelegramObject
+from telegram.ext import BasePersistence, PersistenceInput
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stand-ins for the bot in pickles, the same ones PicklePersistence uses
+REPLACED_KNOWN_BOT = "a known bot replaced by PTB's PicklePersistence"
+REPLACED_UNKNOWN_BOT = "an unknown bot replaced by PTB's PicklePersistence"
+
+
+def _reconstruct_to(cls, kwargs: dict):
+    """Unpickles a TelegramObject, referenced by name from stored pickles"""
+    obj = cls.__new__(cls)
+    obj.__setstate__(kwargs)
+    return obj
+
+
+class BotPickler(pickle.Pickler):
+    """Pickles TelegramObjects with their bot, stored as a reference that
+    BotUnpickler replaces with the running bot (PicklePersistence's own
+    pickler lives in a private PTB module)"""
+
+    def __init__(self, bot: Bot, *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def reducer_override(self, obj):
+        if not isinstance(obj, TelegramObject):
+            return NotImplemented
+        data = obj._get_attrs(include_private=True)
+        # MappingProxyType can't be pickled, __setstate__ converts it back
+        data["api_kwargs"] = dict(data["api_kwargs"])
+        return _reconstruct_to, (obj.__class__, data)
+
+    def persistent_id(self, obj):
+        if obj is self._bot:
+            return REPLACED_KNOWN_BOT
+        if isinstance(obj, Bot):
+            logger.warning("Unknown bot instance pickled, it's unpickled as None")
+            return REPLACED_UNKNOWN_BOT
+        return None
+
+
+class BotUnpickler(pickle.Unpickler):
+    def __init__(self, bot: Bot, *args, **kwargs):
+        self._bot = bot
+        super().__init__(*args, **kwargs)
+
+    def persistent_load(self, pid):
+        if pid == REPLACED_KNOWN_BOT:
+            return self._bot
+        if pid == REPLACED_UNKNOWN_BOT:
+            return None
+        raise pickle.UnpicklingError("Found unknown persistent id when unpickling!")
+
+
+class SQLitePersistence(BasePersistence):
+    """Persistence backed by a SQLite file that stores one row per data key.
+
+    - Only keys whose pickled value changed since the last write are written.
+    - user_data/chat_data are loaded lazily the first time a user/chat is seen
+      after a restart (through refresh_user_data/refresh_chat_data).
+    - evict_idle_data() writes and drops from memory the data of users/chats
+      that have been idle for longer than idle_timeout seconds.
+
+    SQLite is read and written on a single worker thread, off the event loop
+    and in the order the calls were made, with the digests it keeps.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+        idle_timeout: float = 30 * 60,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = filepath
+        self.idle_timeout = idle_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # Per (kind, id): {key: digest of the stored pickled value}
+        self._digests: Dict[tuple, Dict[Any, bytes]] = {}
+        # Per (kind, id): the live dict handed to handlers by the application
+        self._live: Dict[tuple, dict] = {}
+        self._last_access: Dict[tuple, float] = {}
+
+        self._bot_data_digests: Dict[Any, bytes] = {}
+        self._callback_data_digest: Optional[bytes] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+
+    async def _run(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ------------------------------------------------------------------ #
+    # SQLite helpers
+    # ------------------------------------------------------------------ #
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.filepath, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS entity_data (
+                        kind TEXT NOT NULL,
+                        entity_id INTEGER NOT NULL,
+                        key BLOB NOT NULL,
+                        value BLOB NOT NULL,
+                        PRIMARY KEY (kind, entity_id, key)
+                    );
+                    CREATE TABLE IF NOT EXISTS bot_data (
+                        key BLOB PRIMARY KEY,
+                        value BLOB NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS callback_data (
+                        id INTEGER PRIMARY KEY CHECK (id = 0),
+                        value BLOB NOT NULL
+                    );
+                    CREATE TABLE IF NOT EXISTS conversations (
+                        name TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        state BLOB NOT NULL,
+                        PRIMARY KEY (name, key)
+                    );
+                    """
+                )
+        return self._conn
+
+    def _dumps(self, obj: object) -> bytes:
+        buffer = io.BytesIO()
+        BotPickler(self.bot, buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+        return buffer.getvalue()
+
+    def _loads(self, data: bytes) -> Any:
+        return BotUnpickler(self.bot, io.BytesIO(data)).load()
+
+    @staticmethod
+    def _digest(blob: bytes) -> bytes:
+        return hashlib.blake2b(blob, digest_size=16).digest()
+
+    # ------------------------------------------------------------------ #
+    # user_data / chat_data
+    # ------------------------------------------------------------------ #
+
+    def _load_entity(self, kind: str, entity_id: int) -> dict:
+        rows = self.conn.execute(
+            "SELECT key, value FROM entity_data WHERE kind = ? AND entity_id = ?",
+            (kind, entity_id),
+        ).fetchall()
+        data = {}
+        digests = {}
+        for raw_key, raw_value in rows:
+            try:
+                key = self._loads(raw_key)
+                data[key] = self._loads(raw_value)
+                digests[key] = self._digest(raw_value)
+            except Exception:
+                logger.warning(
+                    f"Skipping unreadable {kind} key for {entity_id}", exc_info=True
+                )
+        self._digests[(kind, entity_id)] = digests
+        return data
+
+    async def _refresh_entity(self, kind: str, entity_id: int, live: dict):
+        ref = (kind, entity_id)
+        self._last_access[ref] = time.monotonic()
+        if ref in self._live:
+            return
+        stored = await self._run(self._load_entity, kind, entity_id)
+        for key, value in stored.items():
+            # Anything set in memory before the first refresh wins
+            live.setdefault(key, value)
+        self._live[ref] = live
+
+    def _write_entity(self, kind: str, entity_id: int, data: dict, merge: bool):
+        ref = (kind, entity_id)
+        # Entries that were evicted (or never refreshed) are only merged into
+        # what's stored, the in-memory dict may be an empty stub.
+        if merge:
+            if not data:
+                return
+            self._load_entity(kind, entity_id)
+        old_digests = self._digests.setdefault(ref, {})
+        new_digests = {}
+        upserts = []
+        for key, value in data.items():
+            try:
+                blob = self._dumps(value)
+            except Exception:
+                logger.warning(
+                    f"Can't pickle {kind} key {key!r} for {entity_id}", exc_info=True
+                )
+                continue
+            digest = self._digest(blob)
+            new_digests[key] = digest
+            if old_digests.get(key) != digest:
+                upserts.append((kind, entity_id, self._dumps(key), blob))
+        deletes = [
+            (kind, entity_id, self._dumps(key))
+            for key in old_digests
+            if key not in new_digests and not merge
+        ]
+        if upserts or deletes:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entity_data (kind, entity_id, key, value) "
+                    "VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+                self.conn.executemany(
+                    "DELETE FROM entity_data WHERE kind = ? AND entity_id = ? AND key = ?",
+                    deletes,
+                )
+        if merge:
+            self._digests.pop(ref, None)
+        else:
+            self._digests[ref] = new_digests
+
+    def _evict_entity(self, kind: str, entity_id: int, data: dict):
+        self._write_entity(kind, entity_id, data, merge=False)
+        self._digests.pop((kind, entity_id), None)
+
+    def _delete_entity(self, kind: str, entity_id: int):
+        self._digests.pop((kind, entity_id), None)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM entity_data WHERE kind = ? AND entity_id = ?",
+                (kind, entity_id),
+            )
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        # Loaded lazily in refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        # Loaded lazily in refresh_chat_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh_entity("user", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh_entity("chat", chat_id, chat_data)
+
+    async def _update_entity(self, kind: str, entity_id: int, data: dict):
+        # The application hands over a deep copy, it can be pickled off the loop
+        merge = (kind, entity_id) not in self._live
+        await self._run(self._write_entity, kind, entity_id, data, merge)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._update_entity("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._update_entity("chat", chat_id, data)
+
+    async def _drop_entity(self, kind: str, entity_id: int):
+        self._live.pop((kind, entity_id), None)
+        self._last_access.pop((kind, entity_id), None)
+        await self._run(self._delete_entity, kind, entity_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop_entity("user", user_id)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop_entity("chat", chat_id)
+
+    async def evict_idle_data(self) -> int:
+        """Write and release from memory the data of idle users/chats.
+
+        The application keeps an (empty) dict for evicted entries, it's filled
+        again from SQLite the next time the user/chat sends an update.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [ref for ref, last in self._last_access.items() if last < deadline]
+        for kind, entity_id in idle:
+            live = self._live.pop((kind, entity_id), None)
+            self._last_access.pop((kind, entity_id), None)
+            # Released before the write, an update arriving meanwhile reloads
+            # the data after it
+            if live is None:
+                await self._run(self._digests.pop, (kind, entity_id), None)
+                continue
+            data = copy.deepcopy(live)
+            live.clear()
+            await self._run(self._evict_entity, kind, entity_id, data)
+        if idle:
+            logger.info(f"Evicted persistence data of {len(idle)} idle users/chats")
+        return len(idle)
+
+    # ------------------------------------------------------------------ #
+    # bot_data / callback_data
+    # ------------------------------------------------------------------ #
+
+    def _load_bot_data(self) -> dict:
+        data = {}
+        for raw_key, raw_value in self.conn.execute(
+            "SELECT key, value FROM bot_data"
+        ).fetchall():
+            key = self._loads(raw_key)
+            data[key] = self._loads(raw_value)
+            self._bot_data_digests[key] = self._digest(raw_value)
+        return data
+
+    def _write_bot_data(self, data: dict):
+        new_digests = {}
+        upserts = []
+        for key, value in data.items():
+            blob = self._dumps(value)
+            digest = self._digest(blob)
+            new_digests[key] = digest
+            if self._bot_data_digests.get(key) != digest:
+                upserts.append((self._dumps(key), blob))
+        deletes = [
+            (self._dumps(key),)
+            for key in self._bot_data_digests
+            if key not in new_digests
+        ]
+        if upserts or deletes:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO bot_data (key, value) VALUES (?, ?)",
+                    upserts,
+                )
+                self.conn.executemany("DELETE FROM bot_data WHERE key = ?", deletes)
+        self._bot_data_digests = new_digests
+
+    async def get_bot_data(self) -> dict:
+        return await self._run(self._load_bot_data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        await self._run(self._write_bot_data, data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    def _load_callback_data(self):
+        row = self.conn.execute("SELECT value FROM callback_data WHERE id = 0").fetchone()
+        if not row:
+            return None
+        self._callback_data_digest = self._digest(row[0])
+        return self._loads(row[0])
+
+    def _write_callback_data(self, data):
+        blob = self._dumps(data)
+        digest = self._digest(blob)
+        if digest == self._callback_data_digest:
+            return
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO callback_data (id, value) VALUES (0, ?)",
+                (blob,),
+            )
+        self._callback_data_digest = digest
+
+    async def get_callback_data(self):
+        return await self._run(self._load_callback_data)
+
+    async def update_callback_data(self, data) -> None:
+        await self._run(self._write_callback_data, data)
+
+    # ------------------------------------------------------------------ #
+    # conversations
+    # ------------------------------------------------------------------ #
+
+    def _load_conversations(self, name: str) -> dict:
+        conversations = {}
+        for raw_key, raw_state in self.conn.execute(
+            "SELECT key, state FROM conversations WHERE name = ?", (name,)
+        ).fetchall():
+            conversations[tuple(json.loads(raw_key))] = self._loads(raw_state)
+        return conversations
+
+    def _write_conversation(self, name: str, key: tuple, new_state: Optional[object]):
+        raw_key = json.dumps(list(key))
+        with self.conn:
+            if new_state is None:
+                self.conn.execute(
+                    "DELETE FROM conversations WHERE name = ? AND key = ?",
+                    (name, raw_key),
+                )
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO conversations (name, key, state) "
+                    "VALUES (?, ?, ?)",
+                    (name, raw_key, self._dumps(new_state)),
+                )
+
+    async def get_conversations(self, name: str) -> dict:
+        return await self._run(self._load_conversations, name)
+
+    async def update_conversation(
+        self, name: str, key: tuple, new_state: Optional[object]
+    ) -> None:
+        await self._run(self._write_conversation, name, key, new_state)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+
+    async def flush(self) -> None:
+        await self._run(self._close)
+        # Called once, when the application stops
+        self._executor.shutdown(wait=True)
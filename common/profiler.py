@@ -0,0 +1,178 @@
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+from typing import Awaitable, Callable, Dict, Optional, Set
+from Config import Config
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds without claimed runs before the last update's profile is written
+FINISH_DELAY = 1
+
+
+def frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.abspath(code.co_filename)
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class HandlerProfiler:
+    """Samples the stacks of the next runs of handlers.
+
+    Armed with start(), instrument_callback() claims the runs of the next
+    `updates` updates, or of `handler` only. A thread samples the event loop
+    thread every PROFILER_INTERVAL seconds and keeps the samples whose stack
+    is inside a claimed run, so time a handler spends awaiting isn't counted
+    and concurrent updates don't mix. Disarmed, the cost per run is the
+    `active` check.
+
+    When the runs are done, the samples are written to data/ as collapsed
+    stacks (flamegraph.pl, speedscope) with a text summary, and on_done gets
+    both paths.
+    """
+
+    def __init__(self, interval: float = Config.PROFILER_INTERVAL):
+        self.interval = interval
+        self.active = False
+        self.handler: Optional[str] = None
+        self.remaining = 0
+        self.samples = Counter()
+        self.runs = Counter()
+        self.started = 0.0
+        self._claimed: Set[int] = set()
+        self._frames: Dict[FrameType, str] = {}
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._on_done: Optional[Callable[[str, str], Awaitable]] = None
+        self._finishing: Optional[asyncio.Task] = None
+
+    def start(
+        self,
+        updates: int,
+        handler: Optional[str] = None,
+        on_done: Optional[Callable[[str, str], Awaitable]] = None,
+    ):
+        self.handler = handler
+        self.remaining = updates
+        self.samples.clear()
+        self.runs.clear()
+        self._claimed.clear()
+        self._frames.clear()
+        self._on_done = on_done
+        if self._finishing:
+            self._finishing.cancel()
+            self._finishing = None
+        self._loop_thread_id = threading.get_ident()
+        self.started = time.time()
+        self._stopped.clear()
+        self._sampler = threading.Thread(
+            target=self._sample, name="handler-profiler", daemon=True
+        )
+        self._sampler.start()
+        self.active = True
+
+    def claim(self, name: str, update) -> bool:
+        """Whether this run of handler name is profiled"""
+        if self.handler and name != self.handler:
+            return False
+        update_id = getattr(update, "update_id", None)
+        if update_id in self._claimed:
+            # Another handler of an update already claimed
+            return True
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        self._claimed.add(update_id)
+        return True
+
+    def enter(self, frame: FrameType, name: str):
+        self._frames[frame] = name
+        self.runs[name] += 1
+
+    def exit(self, frame: FrameType):
+        self._frames.pop(frame, None)
+        if self.remaining <= 0 and not self._frames and self._finishing is None:
+            self._finishing = asyncio.get_running_loop().create_task(self._finish_when_idle())
+
+    async def _finish_when_idle(self):
+        # The handlers of the later groups of the last update run after this one
+        while True:
+            await asyncio.sleep(FINISH_DELAY)
+            if not self._frames:
+                break
+        self._finishing = None
+        await self.finish()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            if not self._frames:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = []
+            while frame is not None:
+                name = self._frames.get(frame)
+                if name is not None:
+                    stack.append(name)
+                    self.samples[";".join(reversed(stack))] += 1
+                    break
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+
+    def summary(self, top: int = 25) -> str:
+        total = sum(self.samples.values())
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+        lines = [
+            f"Profiled {sum(self.runs.values())} handler runs since "
+            f"{datetime.fromtimestamp(self.started):%Y-%m-%d %H:%M:%S}, "
+            f"{total} samples every {self.interval * 1000:g}ms",
+            "",
+            "Runs:",
+            *(f"  {count:>6}  {name}" for name, count in self.runs.most_common()),
+        ]
+        for title, counter in (("Own time", own), ("Inclusive time", inclusive)):
+            lines += ["", f"{title}:"]
+            lines += [
+                f"  {count / total * 100:>5.1f}%  {count:>6}  {label}"
+                for label, count in counter.most_common(top)
+            ]
+        return "\n".join(lines)
+
+    async def finish(self):
+        """Stop sampling, write the profile to data/ and hand it to on_done"""
+        if not self.active:
+            return
+        self.active = False
+        self._stopped.set()
+        self._sampler.join()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        folded_path = os.path.join("data", f"profile_{stamp}.folded")
+        summary_path = os.path.join("data", f"profile_{stamp}.txt")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self.samples.items())
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(self.summary())
+        logger.info(f"Handler profile written to {folded_path}")
+        on_done, self._on_done = self._on_done, None
+        if on_done:
+            await on_done(summary_path, folded_path)
+
+
+profiler = HandlerProfiler()
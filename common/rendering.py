@@ -0,0 +1,156 @@
+from collections import Counter, OrderedDict
+from telegram import Message, Update
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import ContextTypes, ExtBot, TypeHandler
+from common.cards import card_stats
+from common.instrumentation import record_upstream
+from Config import Config
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Edits skipped because the message already had the content, and edits that
+# Telegram rejected as not modified (their delete+send fallbacks are skipped too)
+render_stats = Counter()
+
+EDIT_ENDPOINTS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+SEND_ENDPOINTS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageMedia"}
+
+
+def markup_fingerprint(markup) -> str:
+    if markup is None:
+        return ""
+    if isinstance(markup, str):
+        return markup
+    return json.dumps(markup.to_dict(), sort_keys=True)
+
+
+class RenderingBot(ExtBot):
+    """ExtBot that remembers the text/caption and inline keyboard it last
+    rendered in each message and skips edits that would not change them.
+
+    Edits Telegram rejects with "message is not modified" are treated as
+    successful, so handlers don't fall back to deleting and resending the
+    message. Any other failure forgets what the message shows, since the call
+    may have reached Telegram anyway. Every call except getUpdates is timed as
+    an upstream call.
+    """
+
+    def __init__(self, *args, render_cache_size: int = Config.RENDER_CACHE_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._render_cache_size = render_cache_size
+        # (chat_id, message_id) -> (("text" or "caption", body), markup fingerprint)
+        self._rendered: OrderedDict = OrderedDict()
+
+    def remember(self, chat_id, message_id: int, body: tuple, markup: str):
+        key = (str(chat_id), int(message_id))
+        self._rendered[key] = (body, markup)
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self._render_cache_size:
+            self._rendered.popitem(last=False)
+
+    def remember_message(self, message: Message):
+        """Remember the content of a message as Telegram reports it, replacing
+        what was rendered in it before (another process may have edited it)"""
+        if message.text:
+            body = ("text", message.text_html)
+        else:
+            body = ("caption", message.caption_html or "")
+        self.remember(
+            message.chat_id,
+            message.message_id,
+            body,
+            markup_fingerprint(message.reply_markup),
+        )
+
+    def _is_rendered(self, key: tuple, endpoint: str, body: tuple, markup: str) -> bool:
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            return False
+        if endpoint == "editMessageReplyMarkup":
+            return rendered[1] == markup
+        return rendered == (body, markup)
+
+    async def _timed_post(self, endpoint: str, data: dict, **kwargs):
+        # getUpdates waits for updates, its time says nothing about Telegram
+        if endpoint == "getUpdates":
+            return await super()._do_post(endpoint, data, **kwargs)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await super()._do_post(endpoint, data, **kwargs)
+        except TelegramError:
+            failed = True
+            raise
+        finally:
+            record_upstream("telegram", endpoint, time.perf_counter() - started, failed)
+
+    async def _do_post(self, endpoint: str, data: dict, **kwargs):
+        if endpoint not in EDIT_ENDPOINTS | SEND_ENDPOINTS | {"deleteMessage"}:
+            return await self._timed_post(endpoint, data, **kwargs)
+
+        key = None
+        if data.get("chat_id") is not None and data.get("message_id") is not None:
+            key = (str(data["chat_id"]), int(data["message_id"]))
+        if "text" in data:
+            body = ("text", data["text"])
+        elif endpoint == "editMessageMedia":
+            body = ("caption", getattr(data.get("media"), "caption", None) or "")
+        else:
+            body = ("caption", data.get("caption", ""))
+        markup = markup_fingerprint(data.get("reply_markup"))
+
+        if endpoint in EDIT_ENDPOINTS and key and self._is_rendered(key, endpoint, body, markup):
+            render_stats["skipped_edits"] += 1
+            return True
+
+        try:
+            result = await self._timed_post(endpoint, data, **kwargs)
+        except Exception as e:
+            if not (
+                endpoint in EDIT_ENDPOINTS
+                and isinstance(e, BadRequest)
+                and "not modified" in str(e).lower()
+            ):
+                if key:
+                    self._rendered.pop(key, None)
+                raise
+            render_stats["not_modified_edits"] += 1
+            result = True
+
+        if endpoint == "deleteMessage":
+            if key:
+                self._rendered.pop(key, None)
+        elif endpoint == "editMessageReplyMarkup":
+            if key and key in self._rendered:
+                self.remember(*key, self._rendered[key][0], markup)
+        elif isinstance(result, dict) and "message_id" in result:
+            self.remember(result["chat"]["id"], result["message_id"], body, markup)
+        elif key:
+            self.remember(*key, body, markup)
+        return result
+
+
+def render_report() -> str:
+    return (
+        f"{render_stats['skipped_edits']} redundant edits skipped, "
+        f"{render_stats['not_modified_edits']} not modified edits absorbed, "
+        f"cards {card_stats['reused']} reused, {card_stats['rendered']} rendered, "
+        f"{card_stats['uncached']} with unsaved rows"
+    )
+
+
+async def remember_callback_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Update the rendering cache with the message a callback query came from"""
+    if (
+        isinstance(context.bot, RenderingBot)
+        and update.callback_query
+        and update.callback_query.message
+        and isinstance(update.callback_query.message, Message)
+    ):
+        context.bot.remember_message(update.callback_query.message)
+
+
+remember_callback_message_handler = TypeHandler(Update, remember_callback_message)
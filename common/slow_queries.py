@@ -0,0 +1,145 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+from Config import Config
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Statements EXPLAIN QUERY PLAN can explain
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+# Literals and expanded IN lists, collapsed so statements of one shape match
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement without its literals, whitespace or IN list lengths"""
+    shape = STRING_LITERAL.sub("?", statement)
+    shape = NUMBER_LITERAL.sub("?", shape)
+    shape = PLACEHOLDER_LIST.sub("(?, ...)", shape)
+    return WHITESPACE.sub(" ", shape).strip()
+
+
+def redact(parameters) -> str:
+    """The types of the parameters, never their values"""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(
+        parameters[0], (list, tuple, dict)
+    ):
+        # executemany, the first row stands for all of them
+        return f"{len(parameters)} x {redact(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+def explain(cursor, statement: str, parameters) -> str:
+    """EXPLAIN QUERY PLAN of statement as an indented tree, run on a fresh
+    cursor of the connection that ran it, outside the engine's events"""
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return "not explainable"
+    if isinstance(parameters, list) and parameters and isinstance(
+        parameters[0], (list, tuple, dict)
+    ):
+        parameters = parameters[0]
+    try:
+        rows = (
+            cursor.connection.cursor()
+            .execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+            .fetchall()
+        )
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines) or "no plan rows"
+
+
+@dataclass
+class SlowQuery:
+    shape: str
+    parameters: str
+    plan: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    handlers: Counter = field(default_factory=Counter)
+
+
+class SlowQueryLog:
+    """Statements slower than SLOW_QUERY_THRESHOLD seconds, aggregated by
+    shape.
+
+    The first slow statement of a shape is explained and logged with its
+    plan, the later ones are only counted. Parameters are kept as their
+    types. At most SLOW_QUERY_MAX_SHAPES shapes are kept, statements of
+    shapes beyond that are counted in dropped.
+    """
+
+    def __init__(
+        self,
+        threshold: float = Config.SLOW_QUERY_THRESHOLD,
+        max_shapes: int = Config.SLOW_QUERY_MAX_SHAPES,
+    ):
+        self.threshold = threshold
+        self.max_shapes = max_shapes
+        self.queries: Dict[str, SlowQuery] = {}
+        self.dropped = 0
+        # Statements run in the loop and in worker threads
+        self._lock = threading.Lock()
+
+    def record(self, cursor, statement: str, parameters, seconds: float, handler: str):
+        shape = statement_shape(statement)
+        with self._lock:
+            query = self.queries.get(shape)
+            if query is None and len(self.queries) >= self.max_shapes:
+                self.dropped += 1
+                return
+        if query is None:
+            # Explained outside the lock, two threads may both explain a new shape
+            query = SlowQuery(shape, redact(parameters), explain(cursor, statement, parameters))
+            with self._lock:
+                query = self.queries.setdefault(shape, query)
+            logger.warning(
+                f"Slow query in {handler} took {seconds * 1000:.0f}ms: {shape}\n"
+                f"Parameters: {query.parameters}\nPlan:\n{query.plan}"
+            )
+        with self._lock:
+            query.count += 1
+            query.total += seconds
+            query.max = max(query.max, seconds)
+            query.handlers[handler] += 1
+
+    def worst(self, top: int = None) -> List[SlowQuery]:
+        with self._lock:
+            queries = sorted(self.queries.values(), key=lambda q: q.total, reverse=True)
+        return queries[:top] if top else queries
+
+    def report(self) -> str:
+        title = f"Statements slower than {self.threshold * 1000:g}ms, by total time"
+        if self.dropped:
+            title += f", {self.dropped} more of shapes past the first {self.max_shapes}"
+        sections = [title]
+        for query in self.worst():
+            handlers = ", ".join(f"{name} {n}" for name, n in query.handlers.most_common())
+            sections.append(
+                f"{query.count}x total {query.total * 1000:.0f}ms "
+                f"max {query.max * 1000:.0f}ms\n"
+                f"Handlers: {handlers}\n"
+                f"{query.shape}\n"
+                f"Parameters: {query.parameters}\n"
+                f"Plan:\n{query.plan}"
+            )
+        return "\n\n".join(sections)
+
+
+slow_queries = SlowQueryLog()
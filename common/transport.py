@@ -0,0 +1,43 @@
+from importlib.util import find_spec
+from telegram.request import HTTPXRequest
+from Config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def http_version() -> str:
+    """HTTP/2 if it's enabled and httpx can speak it (the h2 package is installed)"""
+    if Config.BOT_HTTP2 and find_spec("h2") is not None:
+        return "2"
+    return "1.1"
+
+
+def build_request() -> HTTPXRequest:
+    """Request object of every bot call except getUpdates.
+
+    Broadcasts and concurrent updates share it, so it gets a large pool and
+    a pool timeout long enough to wait for a connection instead of failing.
+    """
+    return HTTPXRequest(
+        connection_pool_size=Config.BOT_CONNECTION_POOL_SIZE,
+        connect_timeout=Config.BOT_CONNECT_TIMEOUT,
+        read_timeout=Config.BOT_READ_TIMEOUT,
+        write_timeout=Config.BOT_WRITE_TIMEOUT,
+        media_write_timeout=Config.BOT_MEDIA_WRITE_TIMEOUT,
+        pool_timeout=Config.BOT_POOL_TIMEOUT,
+        http_version=http_version(),
+    )
+
+
+def build_get_updates_request() -> HTTPXRequest:
+    """Dedicated request object of getUpdates so long polling never waits
+    behind bot calls for a connection"""
+    return HTTPXRequest(
+        connection_pool_size=Config.GET_UPDATES_CONNECTION_POOL_SIZE,
+        connect_timeout=Config.BOT_CONNECT_TIMEOUT,
+        read_timeout=Config.GET_UPDATES_READ_TIMEOUT,
+        write_timeout=Config.BOT_WRITE_TIMEOUT,
+        pool_timeout=Config.BOT_POOL_TIMEOUT,
+        http_version=http_version(),
+    )
@@ -1,4 +1,5 @@
 from telegram import Update
+from Config import Config
 from start import start_command, admin_command
 from common.common import create_folders
 from common.back_to_home_page import (
@@ -7,6 +8,11 @@ from common.back_to_home_page import (
 )
 from common.error_handler import error_handler
 from common.force_join import check_joined_handler
+from common.rendering import remember_callback_message_handler
+from common.instrumentation import instrument_handlers
+from services.webhook_server import run_webhook
+from services.update_recorder import update_recorder_handler
+from services.sharding import WORKER_UPDATE_PATH, run_sharded
 
 from user.user_calls import *
 from user.user_settings import *
@@ -30,12 +36,18 @@ from models import init_db
 from MyApp import MyApp
 
 
-def setup_and_run():
-    create_folders()
-    init_db()
-
+def build_app():
+    """The application with every handler and job registered"""
     app = MyApp.build_app()
 
+    # Sees every update as it arrived, a group runs only its first matching
+    # handler so the recorder can't share group -1
+    if Config.UPDATE_LOG_PATH:
+        app.add_handler(update_recorder_handler, group=-2)
+
+    # Runs before every other handler group
+    app.add_handler(remember_callback_message_handler, group=-1)
+
     # USER ORDERS
     app.add_handler(back_to_charging_balance_orders_handler)
     app.add_handler(back_to_purchase_orders_handler)
@@ -108,6 +120,12 @@ def setup_and_run():
     app.add_handler(back_to_admin_purchase_orders_handler)
     app.add_handler(request_charging_order_handler)
     app.add_handler(request_purchase_order_handler)
+    app.add_handler(bulk_orders_handler)
+    app.add_handler(show_bulk_orders_handler)
+    app.add_handler(toggle_bulk_order_handler)
+    app.add_handler(select_bulk_orders_handler)
+    app.add_handler(apply_bulk_order_status_handler)
+    app.add_handler(confirm_bulk_order_status_handler)
 
     # GENERAL SETTINGS
     app.add_handler(general_settings_handler)
@@ -149,26 +167,98 @@ def setup_and_run():
     app.add_handler(ban_unban_user_handler)
 
     app.add_handler(admin_command)
+    app.add_handler(stats_command)
+    app.add_handler(profile_command)
+    app.add_handler(slow_queries_command)
     app.add_handler(start_command)
     app.add_handler(find_id_handler)
     app.add_handler(hide_ids_keyboard_handler)
     app.add_handler(back_to_user_home_page_handler)
     app.add_handler(back_to_admin_home_page_handler)
 
+    # Latency and query counts of every handler above
+    instrument_handlers(app)
+
     app.add_error_handler(error_handler)
 
-    # Schedule API orders polling job (every 30 seconds)
-    from jobs import poll_api_orders_status
+    from jobs import (
+        poll_api_orders_status,
+        evict_idle_persistence_data,
+        refresh_upstream_balance,
+        run_maintenance,
+    )
 
+    # Caches of the process, every worker runs these
     app.job_queue.run_repeating(
-        poll_api_orders_status,
-        interval=30,  # Check every 30 seconds
-        first=10,  # Start after 10 seconds
-        name="poll_api_orders_status",
+        evict_idle_persistence_data,
+        interval=5 * 60,
+        first=5 * 60,
+        name="evict_idle_persistence_data",
+        job_kwargs={
+            "id": "evict_idle_persistence_data",
+            "replace_existing": True,
+        },
+    )
+
+    app.job_queue.run_repeating(
+        refresh_upstream_balance,
+        interval=Config.UPSTREAM_BALANCE_REFRESH_INTERVAL,
+        first=1,
+        name="refresh_upstream_balance",
         job_kwargs={
-            "id": "poll_api_orders_status",
+            "id": "refresh_upstream_balance",
             "replace_existing": True,
         },
     )
 
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Shared state, only the leader runs these
+    if Config.IS_LEADER:
+        # Schedule API orders polling job (every 30 seconds)
+        app.job_queue.run_repeating(
+            poll_api_orders_status,
+            interval=30,  # Check every 30 seconds
+            first=10,  # Start after 10 seconds
+            name="poll_api_orders_status",
+            job_kwargs={
+                "id": "poll_api_orders_status",
+                "replace_existing": True,
+            },
+        )
+
+        app.job_queue.run_repeating(
+            run_maintenance,
+            interval=Config.MAINTENANCE_INTERVAL,
+            first=10 * 60,
+            name="run_maintenance",
+            job_kwargs={
+                "id": "run_maintenance",
+                "replace_existing": True,
+            },
+        )
+
+    return app
+
+
+def setup_and_run():
+    create_folders()
+    init_db()
+
+    if Config.WORKERS > 1 and Config.WORKER_INDEX is None:
+        # Front process, the handlers run in the workers it starts
+        return run_sharded()
+
+    app = build_app()
+
+    if Config.WORKER_INDEX is not None:
+        run_webhook(
+            app,
+            listen="127.0.0.1",
+            port=Config.WORKER_BASE_PORT + Config.WORKER_INDEX,
+            path=WORKER_UPDATE_PATH,
+            secret_token=Config.WORKER_SECRET,
+            set_webhook=False,
+        )
+    elif Config.BOT_MODE == "webhook":
+        run_webhook(app)
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -1,24 +1,114 @@
 from telegram.ext import ContextTypes
 from services.g2bulk_api import G2BulkAPI
+from services.upstream_balance import upstream_balance
+from services.outbox import enqueue, outbox_dispatcher
 import models
 from sqlalchemy.orm import Session
-from common.lang_dicts import TEXTS, get_lang
 from common.common import escape_html, format_float
+from common.cards import CARD_TEMPLATES
+from common.error_handler import rotate_errors_file
+from datetime import datetime, timedelta
+import asyncio
 import logging
 from Config import Config
 
 logger = logging.getLogger(__name__)
 
 
+# Map API status to our enum (handle both uppercase and lowercase)
+API_ORDER_STATUS_MAPPING = {
+    "pending": models.ApiPurchaseOrderStatus.PENDING,
+    "processing": models.ApiPurchaseOrderStatus.PROCESSING,
+    "completed": models.ApiPurchaseOrderStatus.COMPLETED,
+    "failed": models.ApiPurchaseOrderStatus.FAILED,
+    "cancelled": models.ApiPurchaseOrderStatus.CANCELLED,
+    "canceled": models.ApiPurchaseOrderStatus.CANCELLED,  # Alternative spelling
+}
+
+
+def parse_api_order(order_info: dict, status_data: dict = None):
+    """Extract (status, api message, player name) from an API order"""
+    status_data = status_data or {}
+    # Status might be in order object or root level
+    new_status_str = (order_info.get("status") or status_data.get("status") or "").lower()
+    api_message = status_data.get("message") or order_info.get("message") or ""
+    return (
+        API_ORDER_STATUS_MAPPING.get(new_status_str),
+        api_message,
+        order_info.get("player_name"),
+    )
+
+
+async def fetch_api_orders_status(api: G2BulkAPI, orders: list, remarks=()) -> tuple:
+    """Get {api_order_id: (status, api message, player name)} for the given
+    (api_order_id, api_game_code) orders, and {remark: (api_order_id, status,
+    api message, player name)} for the API orders placed with the given remarks.
+
+    Uses one get_orders call for all of them and falls back to
+    get_order_status for the orders missing from its response. The remarks
+    are only looked up in get_orders, their results are None when it fails.
+    """
+    wanted = dict(orders)
+    results = {}
+    placed = None
+    try:
+        api_orders = await api.get_orders()
+        placed = {}
+        for order_info in api_orders:
+            # Hash join on the API order ID
+            api_order_id = order_info.get("order_id") or order_info.get("id")
+            try:
+                api_order_id = int(api_order_id)
+            except (TypeError, ValueError):
+                continue
+            if api_order_id in wanted:
+                results[api_order_id] = parse_api_order(order_info)
+            if order_info.get("remark") in remarks:
+                placed[order_info["remark"]] = (api_order_id, *parse_api_order(order_info))
+    except Exception as e:
+        logger.warning(f"Bulk API orders fetch failed, polling each order: {str(e)}")
+
+    missing = [
+        (api_order_id, api_game_code)
+        for api_order_id, api_game_code in wanted.items()
+        if api_order_id not in results
+    ]
+    if missing:
+        logger.info(f"Polling {len(missing)} API orders missing from the bulk response...")
+    for api_order_id, api_game_code in missing:
+        try:
+            status_data = await api.get_order_status(api_order_id, api_game_code)
+            if not status_data.get("success"):
+                continue
+            results[api_order_id] = parse_api_order(
+                status_data.get("order", {}), status_data
+            )
+        except Exception as e:
+            logger.error(
+                f"Error polling order {api_order_id}: {str(e)}",
+                exc_info=True,
+            )
+    return results, placed
+
+
 async def poll_api_orders_status(context: ContextTypes.DEFAULT_TYPE):
-    """Poll API orders status and notify users when orders complete"""
+    """Reconcile API orders status and notify users when orders complete.
+
+    No session is held open while the API is called: the orders are listed,
+    their status fetched, then read again to apply it.
+    """
     try:
         api = G2BulkAPI()
 
-        # Get all non-terminal orders
         with models.session_scope() as s:
+            # Get all non-terminal orders
             non_terminal_orders = (
-                s.query(models.ApiPurchaseOrder)
+                s.query(
+                    models.ApiPurchaseOrder.id,
+                    models.ApiPurchaseOrder.api_order_id,
+                    models.ApiPurchaseOrder.api_game_code,
+                    models.ApiPurchaseOrder.remark,
+                )
                 .filter(
                     models.ApiPurchaseOrder.status.in_(
                         [
@@ -30,166 +120,218 @@ async def poll_api_orders_status(context: ContextTypes.DEFAULT_TYPE):
                 .all()
             )
 
-            if not non_terminal_orders:
-                return
+        if not non_terminal_orders:
+            return
 
-            logger.info(f"Polling {len(non_terminal_orders)} API orders...")
+        # Orders whose creation went unconfirmed are looked up by remark
+        orders = [
+            (order.api_order_id, order.api_game_code)
+            for order in non_terminal_orders
+            if order.api_order_id
+        ]
+        unconfirmed = {
+            order.remark for order in non_terminal_orders if not order.api_order_id
+        }
 
-            for order in non_terminal_orders:
-                try:
-                    # Get order status from API
-                    status_data = await api.get_order_status(
-                        order.api_order_id, order.api_game.api_game_code
-                    )
+        logger.info(f"Reconciling {len(non_terminal_orders)} API orders...")
+        api_statuses, placed = await fetch_api_orders_status(api, orders, unconfirmed)
 
-                    if not status_data.get("success"):
-                        continue
+        with models.session_scope() as s:
+            # Callbacks may have finished some of them meanwhile
+            current_orders = (
+                s.query(models.ApiPurchaseOrder)
+                .options(*models.API_PURCHASE_ORDER_RENDER)
+                .filter(
+                    models.ApiPurchaseOrder.id.in_(
+                        [order.id for order in non_terminal_orders]
+                    )
+                )
+                .all()
+            )
 
-                    order_info = status_data.get("order", {})
-                    # Status might be in order object or root level
-                    new_status_str = (
-                        order_info.get("status") or status_data.get("status") or ""
-                    ).lower()
-                    api_message = (
-                        status_data.get("message") or order_info.get("message") or ""
+            # Apply all transitions in one transaction
+            transitions = []
+            for order in current_orders:
+                if order.is_terminal():
+                    continue
+                if order.api_order_id in api_statuses:
+                    changed = apply_api_order_status(
+                        s, order, *api_statuses[order.api_order_id]
                     )
-                    player_name = order_info.get("player_name")
-
-                    # Map API status to our enum (handle both uppercase and lowercase)
-                    status_mapping = {
-                        "pending": models.ApiPurchaseOrderStatus.PENDING,
-                        "processing": models.ApiPurchaseOrderStatus.PROCESSING,
-                        "completed": models.ApiPurchaseOrderStatus.COMPLETED,
-                        "failed": models.ApiPurchaseOrderStatus.FAILED,
-                        "cancelled": models.ApiPurchaseOrderStatus.CANCELLED,
-                        "canceled": models.ApiPurchaseOrderStatus.CANCELLED,  # Alternative spelling
-                    }
-
-                    new_status = status_mapping.get(new_status_str)
-                    if not new_status:
-                        continue
-
-                    # Check if status changed
-                    old_status = order.status
-                    status_changed = old_status != new_status
-
-                    # Update order in database
-                    with models.session_scope() as update_session:
-                        db_order = update_session.get(models.ApiPurchaseOrder, order.id)
-                        if db_order:
-                            db_order.status = new_status
-                            if api_message:
-                                db_order.api_message = api_message
-                            if player_name:
-                                db_order.player_name = player_name
-                            
-                            # If order failed or cancelled, refund balance to user
-                            # (API automatically refunds, so we need to refund in our DB too)
-                            if status_changed and new_status in [
-                                models.ApiPurchaseOrderStatus.FAILED,
-                                models.ApiPurchaseOrderStatus.CANCELLED,
-                            ]:
-                                user = update_session.get(models.User, db_order.user_id)
-                                if user:
-                                    # Refund the price in SDG
-                                    user.balance += db_order.price_sudan
-                                    logger.info(
-                                        f"Refunded {db_order.price_sudan} SDG to user {user.user_id} "
-                                        f"for failed/cancelled order {db_order.api_order_id}"
-                                    )
-                            
-                            update_session.commit()
-
-                            # Notify user if status changed to terminal state
-                            if status_changed and db_order.is_terminal():
-                                await notify_user_order_status(
-                                    context, db_order, old_status, new_status, s
-                                )
-
-                except Exception as e:
-                    logger.error(
-                        f"Error polling order {order.api_order_id}: {str(e)}",
-                        exc_info=True,
+                elif not order.api_order_id and placed is not None:
+                    changed = apply_unconfirmed_api_order(
+                        s, order, placed.get(order.remark)
                     )
-                    continue
+                else:
+                    changed = False
+                if changed:
+                    transitions.append(order)
+            s.commit()
+
+        if transitions:
+            logger.info(f"Applied {len(transitions)} API order status changes")
+            outbox_dispatcher.wake()
 
     except Exception as e:
         logger.error(f"Error in poll_api_orders_status: {str(e)}", exc_info=True)
 
 
-async def notify_user_order_status(
-    context: ContextTypes.DEFAULT_TYPE,
+def apply_api_order_status(
+    s: Session,
+    order: models.ApiPurchaseOrder,
+    new_status,
+    api_message: str,
+    player_name: str,
+) -> bool:
+    """Apply an upstream status to an API order, refunding and notifying the
+    user when it reaches a final status. Returns whether the status changed."""
+    if not new_status:
+        return False
+
+    old_status = order.status
+    order.status = new_status
+    if api_message:
+        order.api_message = api_message
+    if player_name:
+        order.player_name = player_name
+
+    if old_status == new_status:
+        return False
+
+    # If order failed or cancelled, refund balance to user
+    # (API automatically refunds, so we need to refund in our DB too)
+    if new_status in [
+        models.ApiPurchaseOrderStatus.FAILED,
+        models.ApiPurchaseOrderStatus.CANCELLED,
+    ]:
+        user = s.get(models.User, order.user_id)
+        if user:
+            # Refund the price in SDG
+            user.balance += order.price_sudan
+            logger.info(
+                f"Refunded {order.price_sudan} SDG to user {user.user_id} "
+                f"for failed/cancelled order {order.api_order_id}"
+            )
+
+    # Notify user if status changed to terminal state
+    if order.is_terminal():
+        notify_user_order_status(order, old_status, new_status, s)
+    return True
+
+
+def apply_unconfirmed_api_order(
+    s: Session, order: models.ApiPurchaseOrder, placed: tuple
+) -> bool:
+    """Apply what the orders list says of an order whose creation went
+    unconfirmed: placed is (api_order_id, status, api message, player name)
+    if it's there. Orders that don't show up in time were never placed and
+    are failed, refunding the user. Returns whether the status changed."""
+    if placed:
+        api_order_id, *api_status = placed
+        order.api_order_id = api_order_id
+        logger.info(f"Found unconfirmed API order {order.id} as {api_order_id}")
+        return apply_api_order_status(s, order, *api_status)
+
+    deadline = datetime.now() - timedelta(
+        seconds=Config.G2BULK_UNCONFIRMED_ORDER_TIMEOUT
+    )
+    if order.created_at > deadline:
+        return False
+    logger.info(f"Unconfirmed API order {order.id} was never placed, failing it")
+    return apply_api_order_status(
+        s, order, models.ApiPurchaseOrderStatus.FAILED, "Order not found at G2Bulk", None
+    )
+
+
+async def reconcile_api_order(api_order_id: int):
+    """Fetch and apply the status of one API order, on a G2Bulk callback.
+
+    The callback only says which order to look at, the status itself always
+    comes from the API. No session is held open while it's fetched.
+    """
+    try:
+        with models.session_scope() as s:
+            order = (
+                s.query(models.ApiPurchaseOrder)
+                .filter(models.ApiPurchaseOrder.api_order_id == api_order_id)
+                .first()
+            )
+            if not order or order.is_terminal():
+                return
+            api_game_code = order.api_game_code
+
+        status_data = await G2BulkAPI().get_order_status(api_order_id, api_game_code)
+        if not status_data.get("success"):
+            return
+
+        with models.session_scope() as s:
+            # The poller may have finished it meanwhile
+            order = (
+                s.query(models.ApiPurchaseOrder)
+                .options(*models.API_PURCHASE_ORDER_RENDER)
+                .filter(models.ApiPurchaseOrder.api_order_id == api_order_id)
+                .first()
+            )
+            if not order or order.is_terminal():
+                return
+            if apply_api_order_status(
+                s, order, *parse_api_order(status_data.get("order", {}), status_data)
+            ):
+                s.commit()
+                logger.info(f"Applied callback status change of API order {api_order_id}")
+                outbox_dispatcher.wake()
+    except Exception as e:
+        logger.error(
+            f"Error reconciling API order {api_order_id}: {str(e)}", exc_info=True
+        )
+
+
+def notify_user_order_status(
     order: models.ApiPurchaseOrder,
     old_status,
     new_status,
     s: Session,
 ):
-    """Notify user about order status change"""
+    """Queue the user and archive notifications about an order status change
+    in the outbox, as part of the transaction that changed it"""
     try:
-        lang = get_lang(order.user_id)
-        # Build notification message
-        if new_status == models.ApiPurchaseOrderStatus.COMPLETED:
-            status_emoji = "✅"
-            status_text = TEXTS[lang].get(
-                "api_order_completed",
-                "Your order has been completed successfully!",
-            )
-        elif new_status == models.ApiPurchaseOrderStatus.FAILED:
-            status_emoji = "❌"
-            status_text = TEXTS[lang].get(
-                "api_order_failed",
-                "Your order has failed.",
-            )
-            # Add refund message
-            refund_text = TEXTS[lang].get(
-                "balance_refunded",
-                "Your balance has been refunded: {amount} SDG",
-            ).format(amount=format_float(order.price_sudan))
-            status_text += f"\n\n💰 {refund_text}"
-        elif new_status == models.ApiPurchaseOrderStatus.CANCELLED:
-            status_emoji = "🚫"
-            status_text = TEXTS[lang].get(
-                "api_order_cancelled",
-                "Your order has been cancelled.",
-            )
-            # Add refund message
-            refund_text = TEXTS[lang].get(
-                "balance_refunded",
-                "Your balance has been refunded: {amount} SDG",
-            ).format(amount=format_float(order.price_sudan))
-            status_text += f"\n\n💰 {refund_text}"
-        else:
+        user = s.get(models.User, order.user_id)
+        lang = user.lang
+        # Build notification message from the templates compiled at startup
+        t = CARD_TEMPLATES[lang]
+        head = t["api_order_notifications"].get(new_status)
+        if head is None:
             return  # Don't notify for non-terminal statuses
 
-        message = f"{status_emoji} {status_text}\n\n"
-        message += f"<b>{TEXTS[lang].get('order_id', 'Order ID')}:</b> <code>{order.api_order_id}</code>\n"
-        message += f"<b>{TEXTS[lang].get('game', 'Game')}:</b> {escape_html(order.api_game.arabic_name if (lang == models.Language.ARABIC and order.api_game.arabic_name) else order.api_game.api_game_name)}\n"
-        message += f"<b>{TEXTS[lang].get('denomination', 'Denomination')}:</b> {escape_html(order.denomination_name)}\n"
-        message += f"<b>{TEXTS[lang].get('player_id', 'Player ID')}:</b> <code>{escape_html(order.player_id)}</code>\n"
+        lines = [
+            head.format(amount=format_float(order.price_sudan)),
+            "",
+            t["order_id"].format(order.api_order_id or t["not_available"]),
+            t["game"].format(escape_html(order.api_game.get_display_name(lang))),
+            t["denomination"].format(escape_html(order.denomination_name)),
+            t["player_id"].format(escape_html(order.player_id)),
+        ]
 
         if order.player_name:
-            message += f"<b>{TEXTS[lang].get('player_name', 'Player Name')}:</b> {escape_html(order.player_name)}\n"
+            lines.append(t["player_name"].format(escape_html(order.player_name)))
 
-        message += f"<b>{TEXTS[lang].get('price', 'Price')}:</b> <code>{format_float(order.price_sudan)} SDG</code>\n"
+        lines.append(t["price_sdg"].format(format_float(order.price_sudan)))
+        message = "\n".join(lines) + "\n"
 
-        # Send notification to user
-        await context.bot.send_message(
-            chat_id=order.user_id,
-            text=message,
-        )
-        user = s.get(models.User, order.user_id)
-        await context.bot.send_message(
-            chat_id=Config.API_PURCHASES_ARCHIVE_CHANNEL,
-            text=(
+        enqueue(s, order.user_id, message)
+        enqueue(
+            s,
+            Config.API_PURCHASES_ARCHIVE_CHANNEL,
+            (
                 message
                 + "\n\n"
-                + f"<i>{TEXTS[lang].get("order_user_info", "Order's user info")}:</i>\n\n"
+                + f"{t['order_user_info']}\n\n"
                 + user.stringify(lang)
             ),
         )
 
         logger.info(
-            f"Notified user {order.user_id} about order {order.api_order_id} status change: {old_status.value} -> {new_status.value}"
+            f"Queued notification for user {order.user_id} about order {order.api_order_id} status change: {old_status.value} -> {new_status.value}"
         )
 
     except Exception as e:
@@ -197,3 +339,96 @@ async def notify_user_order_status(
             f"Error notifying user {order.user_id} about order {order.id}: {str(e)}",
             exc_info=True,
         )
+
+
+async def evict_idle_persistence_data(context: ContextTypes.DEFAULT_TYPE):
+    """Release the persisted user/chat data of idle users from memory"""
+    try:
+        persistence = context.application.persistence
+        if persistence and hasattr(persistence, "evict_idle_data"):
+            await persistence.evict_idle_data()
+    except Exception as e:
+        logger.error(
+            f"Error in evict_idle_persistence_data: {str(e)}", exc_info=True
+        )
+
+
+async def refresh_upstream_balance(context: ContextTypes.DEFAULT_TYPE):
+    """Refresh the locally tracked G2Bulk balance"""
+    try:
+        await upstream_balance.refresh()
+    except Exception as e:
+        logger.error(f"Error in refresh_upstream_balance: {str(e)}", exc_info=True)
+
+
+def prune_stale_rows(s: Session) -> dict:
+    """Delete admin order messages of long final orders and old delivered outbox
+    messages. Returns the number of deleted rows per table."""
+    cutoff = datetime.now() - timedelta(days=Config.ORDER_ADMIN_MESSAGES_RETENTION_DAYS)
+    final_orders = {
+        "charging": s.query(models.ChargingBalanceOrder.id).filter(
+            models.ChargingBalanceOrder.status.in_(
+                [
+                    models.ChargingOrderStatus.COMPLETED,
+                    models.ChargingOrderStatus.FAILED,
+                    models.ChargingOrderStatus.CANCELLED,
+                ]
+            ),
+            models.ChargingBalanceOrder.updated_at < cutoff,
+        ),
+        "purchase": s.query(models.PurchaseOrder.id).filter(
+            models.PurchaseOrder.status.in_(
+                [
+                    models.PurchaseOrderStatus.COMPLETED,
+                    models.PurchaseOrderStatus.FAILED,
+                    models.PurchaseOrderStatus.CANCELLED,
+                    models.PurchaseOrderStatus.REFUNDED,
+                ]
+            ),
+            models.PurchaseOrder.updated_at < cutoff,
+        ),
+    }
+    existing_orders = {
+        "charging": s.query(models.ChargingBalanceOrder.id),
+        "purchase": s.query(models.PurchaseOrder.id),
+    }
+
+    admin_messages = 0
+    for order_type in final_orders:
+        admin_messages += (
+            s.query(models.OrderAdminMessage)
+            .filter(
+                models.OrderAdminMessage.order_type == order_type,
+                models.OrderAdminMessage.order_id.in_(final_orders[order_type])
+                # Messages of deleted orders too
+                | models.OrderAdminMessage.order_id.not_in(existing_orders[order_type]),
+            )
+            .delete(synchronize_session=False)
+        )
+
+    outbox_messages = (
+        s.query(models.OutboxMessage)
+        .filter(
+            models.OutboxMessage.status != models.OutboxMessageStatus.PENDING,
+            models.OutboxMessage.updated_at
+            < datetime.now() - timedelta(days=Config.OUTBOX_RETENTION_DAYS),
+        )
+        .delete(synchronize_session=False)
+    )
+    return {"order_admin_messages": admin_messages, "outbox_messages": outbox_messages}
+
+
+async def run_maintenance(context: ContextTypes.DEFAULT_TYPE):
+    """Prune stale rows, rotate the errors file and compact the database"""
+    try:
+        with models.session_scope() as s:
+            pruned = prune_stale_rows(s)
+        # File and database work blocks, keep it off the event loop
+        errors_file_reclaimed = await asyncio.to_thread(rotate_errors_file)
+        db_reclaimed = await asyncio.to_thread(models.optimize_db)
+        logger.info(
+            f"Maintenance done: pruned {pruned}, reclaimed {errors_file_reclaimed / 1024:.1f} KB "
+            f"from the errors file and {db_reclaimed / 1024:.1f} KB from the database"
+        )
+    except Exception as e:
+        logger.error(f"Error in run_maintenance: {str(e)}", exc_info=True)
@@ -23,8 +23,8 @@ class ApiPurchaseOrder(Base):
         nullable=False,
     )
     api_order_id = sa.Column(
-        sa.Integer, nullable=False, unique=True
-    )  # Order ID from G2Bulk API
+        sa.Integer, nullable=True, unique=True
+    )  # Order ID from G2Bulk API, None until an order whose creation went unconfirmed is found there
     api_game_code = sa.Column(
         sa.String,
         sa.ForeignKey("api_games.api_game_code", ondelete="SET NULL"),
@@ -60,56 +60,47 @@ class ApiPurchaseOrder(Base):
 
     def stringify(self, lang):
         """Return a formatted HTML string preview of the API purchase order properties"""
-        from common.lang_dicts import TEXTS
-        from common.common import escape_html, format_datetime, format_float
+        from common.cards import card_cache
 
-        texts = TEXTS[lang]
-        from common.common import get_status_emoji
-        status_emoji = get_status_emoji(self.status)
-        status_text = texts.get(
-            f"api_order_status_{self.status.value}", self.status.value
+        return card_cache.render(
+            self, lang, lambda t: self._render(t, lang), self.api_game
         )
+
+    def _render(self, t: dict, lang) -> str:
+        from common.common import escape_html, format_datetime, format_float
+
         game_display_name = (
             self.api_game.get_display_name(lang) if self.api_game else "N/A"
         )
 
         lines = [
-            f"<b>{texts.get('order_details_text', 'Order Details')}</b>",
-            "",
-            f"<b>{texts.get('order_id', 'Order ID')}:</b> <code>{self.id}</code>",
-            f"<b>{texts.get('api_order_id', 'API Order ID')}:</b> <code>{self.api_order_id}</code>",
-            f"<b>{texts.get('order_status', 'Status')}:</b> {status_text} {status_emoji}",
-            f"<b>{texts.get('game', 'Game')}:</b> {escape_html(game_display_name)}",
-            f"<b>{texts.get('denomination', 'Denomination')}:</b> {escape_html(self.denomination_name)}",
-            f"<b>{texts.get('player_id', 'Player ID')}:</b> <code>{escape_html(self.player_id)}</code>",
+            t["order_details"],
+            t["order_id"].format(self.id),
+            t["api_order_id"].format(self.api_order_id or t["not_available"]),
+            t["order_status"].format(t["statuses"][self.status]),
+            t["game"].format(escape_html(game_display_name)),
+            t["denomination"].format(escape_html(self.denomination_name)),
+            t["player_id"].format(escape_html(self.player_id)),
         ]
 
         if self.player_name:
-            lines.append(
-                f"<b>{texts.get('player_name', 'Player Name')}:</b> {escape_html(self.player_name)}"
-            )
+            lines.append(t["player_name"].format(escape_html(self.player_name)))
 
         if self.server_id:
-            lines.append(
-                f"<b>{texts.get('server_id', 'Server ID')}:</b> <code>{escape_html(self.server_id)}</code>"
-            )
+            lines.append(t["server_id"].format(escape_html(self.server_id)))
 
         lines.extend(
             [
-                f"<b>{texts.get('price', 'Price')}:</b> <code>{format_float(self.price_sudan)} SDG</code>",
-                f"<b>{texts.get('order_date', 'Order Date')}:</b> <code>{format_datetime(self.created_at)}</code>",
+                t["price_sdg"].format(format_float(self.price_sudan)),
+                t["order_date"].format(format_datetime(self.created_at)),
             ]
         )
 
         if self.api_message:
-            lines.append("")
-            lines.append(f"<b>{texts.get('message', 'Message')}:</b>")
-            lines.append(f"<i>{escape_html(self.api_message)}</i>")
+            lines.append(t["message"].format(escape_html(self.api_message)))
 
         if self.remark:
-            lines.append("")
-            lines.append(f"<b>{texts.get('remark', 'Remark')}:</b>")
-            lines.append(f"<i>{escape_html(self.remark)}</i>")
+            lines.append(t["remark"].format(escape_html(self.remark)))
 
         return "\n".join(lines)
 
@@ -36,6 +36,12 @@ class ChargingBalanceOrder(Base):
     payment_proof = sa.Column(
         sa.String, nullable=True
     )  # File ID or URL for payment proof
+    payment_proof_kind = sa.Column(
+        sa.String, nullable=True
+    )  # "photo" or "document", unknown for proofs uploaded before it was stored
+    payment_proof_unique_id = sa.Column(
+        sa.String, nullable=True
+    )  # Telegram file_unique_id of the payment proof
     admin_notes = sa.Column(sa.Text, nullable=True)  # Admin notes about the order
     assigned_admin_id = sa.Column(
         sa.BigInteger, nullable=True
@@ -57,35 +63,33 @@ class ChargingBalanceOrder(Base):
 
     def stringify(self, lang):
         """Return a formatted HTML string preview of the charging balance order properties"""
-        from common.lang_dicts import TEXTS
+        from common.cards import card_cache
+
+        address = self.payment_method_address
+        return card_cache.render(
+            self, lang, self._render, address, address.payment_method if address else None
+        )
+
+    def _render(self, t: dict) -> str:
         from common.common import escape_html, format_datetime, format_float
 
-        texts = TEXTS[lang]
-        from common.common import get_status_emoji
-        status_emoji = get_status_emoji(self.status)
-        status_text = texts.get(f"order_status_{self.status.value}", self.status.value)
-        
         lines = [
-            f"<b>{texts['order_details_text']}</b>",
-            "",
-            f"<b>{texts['order_id']}:</b> <code>{self.id}</code>",
-            f"<b>{texts['order_status']}:</b> {status_text} {status_emoji}",
-            f"<b>{texts['order_amount']}:</b> <code>{format_float(self.amount)}</code>",
-            f"<b>{texts['order_date']}:</b> <code>{format_datetime(self.created_at)}</code>",
+            t["order_details"],
+            t["order_id"].format(self.id),
+            t["order_status"].format(t["statuses"][self.status]),
+            t["order_amount"].format(format_float(self.amount)),
+            t["order_date"].format(format_datetime(self.created_at)),
         ]
 
         if self.payment_method_address:
             pm = self.payment_method_address.payment_method
-            lines.append(f"<b>{texts['payment_method']}:</b> {escape_html(pm.name)}")
-            lines.append(f"<b>{texts['payment_address']}:</b> <code>{escape_html(self.payment_method_address.address)}</code>")
+            lines.append(t["payment_method"].format(escape_html(pm.name)))
+            lines.append(t["payment_address"].format(escape_html(self.payment_method_address.address)))
 
         if self.payment_proof:
-            lines.append("")
-            lines.append(f"<b>{texts['payment_proof']}:</b> ✅")
+            lines.append(t["payment_proof"])
 
         if self.admin_notes:
-            lines.append("")
-            lines.append(f"<b>{texts.get('admin_notes', 'Admin Notes')}:</b>")
-            lines.append(f"<i>{escape_html(self.admin_notes)}</i>")
+            lines.append(t["admin_notes"].format(escape_html(self.admin_notes)))
 
         return "\n".join(lines)
\ No newline at end of file
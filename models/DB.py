@@ -8,8 +8,10 @@ from contextlib import contextmanager
 from functools import wraps
 import logging
 import asyncio
+import os
 import traceback
 from common.error_handler import write_error
+from common.instrumentation import instrument_engine
 
 Base = declarative_base()
 engine = create_engine(
@@ -19,6 +21,7 @@ engine = create_engine(
     max_overflow=Config.DB_MAX_OVERFLOW,
     pool_pre_ping=True,
 )
+instrument_engine(engine)
 
 
 def init_db():
@@ -32,6 +35,39 @@ def init_db():
     Base.metadata.create_all(engine)
 
 
+def db_size(cursor) -> int:
+    """Size in bytes of the database file and its WAL"""
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    wal_path = f"{Config.DB_PATH}-wal"
+    wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    return page_count * page_size + wal_size
+
+
+def optimize_db() -> int:
+    """Refresh the query planner statistics, release free pages and truncate the
+    WAL. Blocks while it runs. Returns the number of bytes reclaimed."""
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        size_before = db_size(cursor)
+        # Free pages can only be released incrementally with auto_vacuum=INCREMENTAL,
+        # the full VACUUM switching a database to it is the enable_incremental_vacuum
+        # migration, run with the bot stopped
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logging.getLogger(__name__).warning(
+                "auto_vacuum isn't INCREMENTAL, free pages aren't released until "
+                "the database is migrated with alembic upgrade head"
+            )
+        # executescript steps the pragmas to completion, execute would free one page
+        cursor.executescript(
+            "PRAGMA optimize; PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);"
+        )
+        return size_before - db_size(cursor)
+    finally:
+        conn.close()
+
+
 Session = scoped_session(
     sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
 )
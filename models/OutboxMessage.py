@@ -0,0 +1,44 @@
+from enum import Enum
+import sqlalchemy as sa
+from models.DB import Base
+from datetime import datetime
+
+
+class OutboxMessageStatus(Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboxMessage(Base):
+    """A Telegram message written in the same transaction as the change it
+    reports, sent later by the outbox dispatcher"""
+
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        sa.Index("ix_outbox_messages_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    chat_id = sa.Column(sa.BigInteger, nullable=False)
+    text = sa.Column(sa.Text, nullable=False)  # Message text, or caption with media
+    media = sa.Column(sa.String, nullable=True)  # Telegram file_id
+    media_kind = sa.Column(sa.String, nullable=True)  # "photo" or "document"
+    status = sa.Column(
+        sa.Enum(OutboxMessageStatus),
+        default=OutboxMessageStatus.PENDING,
+        nullable=False,
+    )
+    attempts = sa.Column(sa.Integer, default=0, nullable=False)
+    next_attempt_at = sa.Column(sa.DateTime, default=datetime.now, nullable=False)
+    last_error = sa.Column(sa.Text, nullable=True)
+    sent_at = sa.Column(sa.DateTime, nullable=True)
+
+    created_at = sa.Column(sa.DateTime, default=datetime.now)
+    updated_at = sa.Column(sa.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return (
+            f"OutboxMessage(id={self.id}, chat_id={self.chat_id}, "
+            f"status={self.status.value}, attempts={self.attempts})"
+        )
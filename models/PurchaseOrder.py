@@ -37,6 +37,9 @@ class PurchaseOrder(Base):
         nullable=False,
     )
     admin_notes = sa.Column(sa.Text, nullable=True)  # Admin notes about the order
+    stock_reserved = sa.Column(
+        sa.Boolean, default=False, server_default=sa.false(), nullable=False
+    )  # Whether the order holds a unit of its item's stock, to give back on refund
     assigned_admin_id = sa.Column(
         sa.BigInteger, nullable=True
     )  # ID of the admin currently handling this order
@@ -55,32 +58,29 @@ class PurchaseOrder(Base):
 
     def stringify(self, lang):
         """Return a formatted HTML string preview of the purchase order properties"""
-        from common.lang_dicts import TEXTS
+        from common.cards import card_cache
+
+        item = self.item
+        return card_cache.render(self, lang, self._render, item, item.game if item else None)
+
+    def _render(self, t: dict) -> str:
         from common.common import escape_html, format_datetime, format_float
 
-        texts = TEXTS[lang]
-        from common.common import get_status_emoji
-        status_emoji = get_status_emoji(self.status)
-        status_text = texts.get(f"order_status_{self.status.value}", self.status.value)
-        
         lines = [
-            f"<b>{texts['order_details_text']}</b>",
-            "",
-            f"<b>{texts['order_id']}:</b> <code>{self.id}</code>",
-            f"<b>{texts['order_status']}:</b> {status_text} {status_emoji}",
-            f"<b>{texts['order_date']}:</b> <code>{format_datetime(self.created_at)}</code>",
+            t["order_details"],
+            t["order_id"].format(self.id),
+            t["order_status"].format(t["statuses"][self.status]),
+            t["order_date"].format(format_datetime(self.created_at)),
         ]
 
         if self.item:
-            lines.append(f"<b>{texts['item_name']}:</b> {escape_html(self.item.name)}")
-            lines.append(f"<b>{texts['game_name']}:</b> {escape_html(self.item.game.name)}")
-            lines.append(f"<b>{texts.get('price', 'Price')}:</b> <code>{format_float(self.item.price)}</code>")
+            lines.append(t["item_name"].format(escape_html(self.item.name)))
+            lines.append(t["game_name"].format(escape_html(self.item.game.name)))
+            lines.append(t["price"].format(format_float(self.item.price)))
 
-        lines.append(f"<b>{texts['game_account_id']}:</b> <code>{escape_html(self.game_account_id)}</code>")
+        lines.append(t["game_account_id"].format(escape_html(self.game_account_id)))
 
         if self.admin_notes:
-            lines.append("")
-            lines.append(f"<b>{texts.get('admin_notes', 'Admin Notes')}:</b>")
-            lines.append(f"<i>{escape_html(self.admin_notes)}</i>")
+            lines.append(t["admin_notes"].format(escape_html(self.admin_notes)))
 
         return "\n".join(lines)
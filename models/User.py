@@ -33,19 +33,33 @@ class User(Base):
 
     def stringify(self, lang):
         """Return a formatted HTML string preview of the user properties"""
-        from common.lang_dicts import TEXTS
+        from common.cards import card_cache
+
+        return card_cache.render(self, lang, self._render)
+
+    def _render(self, t: dict) -> str:
         from common.common import escape_html
 
-        texts = TEXTS[lang]
-        username_text = f"@{self.username}" if self.username else texts.get("not_available", "N/A")
-        
+        username_text = f"@{self.username}" if self.username else t["not_available"]
+
         lines = [
-            f"<b>{texts.get('user_id', 'ID')}:</b> <code>{self.user_id}</code>",
-            f"<b>{texts.get('username', 'Username')}:</b> {username_text}",
-            f"<b>{texts.get('name', 'Name')}:</b> <b>{escape_html(self.name)}</b>",
+            t["user_id"].format(self.user_id),
+            t["username"].format(username_text),
+            t["name"].format(escape_html(self.name)),
         ]
 
         return "\n".join(lines)
 
+    @classmethod
+    def charge_balance(cls, s, user_id: int, amount) -> bool:
+        """Deduct amount from a user's balance in s's transaction, only if it
+        covers it"""
+        result = s.execute(
+            sa.update(cls)
+            .where(cls.user_id == user_id, cls.balance >= amount)
+            .values(balance=cls.balance - amount)
+        )
+        return result.rowcount == 1
+
     def __repr__(self):
         return f"User(user_id={self.user_id}, username={self.username}, name={self.name}, is_admin={bool(self.is_admin)}, is_banned={bool(self.is_banned)}"
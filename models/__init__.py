@@ -1,4 +1,4 @@
-from models.DB import init_db, session_scope, with_retry
+from models.DB import init_db, session_scope, with_retry, optimize_db
 from models.User import User
 from models.Language import Language
 from models.ForceJoinChat import ForceJoinChat
@@ -12,3 +12,9 @@ from models.GeneralSettings import GeneralSettings
 from models.ApiGame import ApiGame
 from models.ApiPurchaseOrder import ApiPurchaseOrder, ApiPurchaseOrderStatus
 from models.OrderAdminMessage import OrderAdminMessage
+from models.OutboxMessage import OutboxMessage, OutboxMessageStatus
+from models.loading import (
+    CHARGING_ORDER_RENDER,
+    PURCHASE_ORDER_RENDER,
+    API_PURCHASE_ORDER_RENDER,
+)
@@ -0,0 +1,25 @@
+from sqlalchemy.orm import joinedload
+from models.ChargingBalanceOrder import ChargingBalanceOrder
+from models.PurchaseOrder import PurchaseOrder
+from models.ApiPurchaseOrder import ApiPurchaseOrder
+from models.PaymentMethod import PaymentMethodAddress
+from models.Item import Item
+
+# Loader options of every relationship an order's stringify() and the user
+# line shown under it touch, joined into the query loading the order so
+# rendering it doesn't lazy load a row per relationship (per row in lists).
+# Used as query.options(*RENDER) or s.get(Model, id, options=RENDER).
+CHARGING_ORDER_RENDER = (
+    joinedload(ChargingBalanceOrder.user),
+    joinedload(ChargingBalanceOrder.payment_method_address).joinedload(
+        PaymentMethodAddress.payment_method
+    ),
+)
+PURCHASE_ORDER_RENDER = (
+    joinedload(PurchaseOrder.user),
+    joinedload(PurchaseOrder.item).joinedload(Item.game),
+)
+API_PURCHASE_ORDER_RENDER = (
+    joinedload(ApiPurchaseOrder.user),
+    joinedload(ApiPurchaseOrder.api_game),
+)
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from services.g2bulk_api import G2BulkAPI, G2BulkUnavailable
+from Config import Config
+import asyncio
+import hashlib
+import json
+import time
+
+
+def _version_of(data) -> str:
+    """Content hash of an API payload, identical payloads share a version"""
+    blob = json.dumps(data, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(blob, digest_size=8).hexdigest()
+
+
+def query_hash(query: str) -> str:
+    """Hash of a normalized search query"""
+    normalized = " ".join(query.lower().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class CachedGames:
+    version: str
+    games: List[dict]
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class CachedCatalogue:
+    version: str
+    game: dict
+    catalogues: List[dict]
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+class CatalogueCache:
+    """Process-wide cache of G2Bulk games and catalogues.
+
+    Conversations keep references (game code, catalogue version, denomination
+    index, search query hash) and resolve them here. Versions are content
+    hashes, so a reference only goes stale when the upstream data changes.
+    While the G2Bulk circuit breaker is open, cached entries are served past
+    their ttl.
+    """
+
+    def __init__(
+        self,
+        ttl: float = Config.CATALOGUE_CACHE_TTL,
+        max_searches: int = Config.CATALOGUE_CACHE_MAX_SEARCHES,
+    ):
+        self.ttl = ttl
+        self.max_searches = max_searches
+        self._games: Optional[CachedGames] = None
+        self._catalogues: Dict[str, CachedCatalogue] = {}
+        # (games version, query hash) -> matching game codes
+        self._searches: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def _expired(self, fetched_at: float) -> bool:
+        return time.monotonic() - fetched_at > self.ttl
+
+    async def get_games(self, force: bool = False) -> CachedGames:
+        """All games from the API, fetched at most once per ttl"""
+        async with self._lock("games"):
+            if force or self._games is None or self._expired(self._games.fetched_at):
+                try:
+                    games = await G2BulkAPI().get_games()
+                except G2BulkUnavailable:
+                    if self._games is None:
+                        raise
+                    return self._games
+                version = _version_of(games)
+                if self._games is None or self._games.version != version:
+                    self._games = CachedGames(version=version, games=games)
+                else:
+                    self._games.fetched_at = time.monotonic()
+            return self._games
+
+    async def get_catalogue(self, game_code: str, force: bool = False) -> CachedCatalogue:
+        """Game info and denominations of a game, fetched at most once per ttl"""
+        async with self._lock(f"catalogue:{game_code}"):
+            cached = self._catalogues.get(game_code)
+            if force or cached is None or self._expired(cached.fetched_at):
+                try:
+                    data = await G2BulkAPI().get_game_catalogue(game_code)
+                except G2BulkUnavailable:
+                    if cached is None:
+                        raise
+                    return cached
+                game = data.get("game", {})
+                catalogues = data.get("catalogues", [])
+                version = _version_of(catalogues)
+                if cached is None or cached.version != version:
+                    cached = CachedCatalogue(
+                        version=version, game=game, catalogues=catalogues
+                    )
+                    self._catalogues[game_code] = cached
+                else:
+                    cached.fetched_at = time.monotonic()
+            return cached
+
+    async def resolve_denomination(
+        self, game_code: str, version: str, index: int
+    ) -> Optional[dict]:
+        """Return the referenced denomination, or None if the reference is stale"""
+        cached = await self.get_catalogue(game_code)
+        if cached.version != version or not 0 <= index < len(cached.catalogues):
+            return None
+        return cached.catalogues[index]
+
+    def store_search(self, games_version: str, query: str, game_codes: List[str]) -> str:
+        """Remember the results of a search and return its query hash"""
+        key = (games_version, query_hash(query))
+        self._searches[key] = game_codes
+        self._searches.move_to_end(key)
+        while len(self._searches) > self.max_searches:
+            self._searches.popitem(last=False)
+        return key[1]
+
+    def get_search(self, games_version: str, search_hash: str) -> Optional[List[str]]:
+        """Game codes of a stored search, None if evicted or made for another version"""
+        key = (games_version, search_hash)
+        game_codes = self._searches.get(key)
+        if game_codes is not None:
+            self._searches.move_to_end(key)
+        return game_codes
+
+
+catalogue_cache = CatalogueCache()
@@ -1,83 +1,259 @@
 import aiohttp
-from typing import Optional, Dict, List, Any
+import asyncio
+import logging
+import random
+import time
+from typing import Optional, Dict, List, Any, Tuple
 from Config import Config
+from common.instrumentation import upstream_trace_config
+
+logger = logging.getLogger(__name__)
+
+
+class G2BulkUnavailable(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class G2BulkOutcomeUnknown(Exception):
+    """Raised when a non-idempotent request failed with a network error, a
+    timeout or a 5xx response, G2Bulk may still have carried it out"""
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive upstream failures.
+
+    While open, calls fail fast with G2BulkUnavailable. After reset_timeout
+    seconds a single probe call is let through, its outcome closes the
+    breaker again or keeps it open for another reset_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Let one probe through, the others keep failing fast
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info("G2Bulk circuit breaker closed")
+        self.failures = 0
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == self.OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(
+                    f"G2Bulk circuit breaker opened after {self.failures} failures"
+                )
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=Config.G2BULK_BREAKER_THRESHOLD,
+    reset_timeout=Config.G2BULK_BREAKER_RESET_TIMEOUT,
+)
 
 
 class G2BulkAPI:
-    BASE_URL = "https://api.g2bulk.com/v1"
+    BASE_URL = Config.G2BULK_BASE_URL
+
+    # Total timeout in seconds per endpoint
+    TIMEOUTS = {
+        "getMe": 5,
+        "games": 10,
+        "games/fields": 10,
+        "games/servers": 10,
+        "games/checkPlayerId": 15,
+        "games/catalogue": 10,
+        "games/order": 30,
+        "games/order/status": 10,
+        "games/orders": 20,
+    }
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 5
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, breaker: CircuitBreaker = None):
         self.api_key = api_key or Config.G2BULK_API_KEY
         if not self.api_key:
             raise ValueError("G2BULK_API_KEY is not set in Config")
+        self.breaker = breaker or circuit_breaker
+        self.max_retries = Config.G2BULK_MAX_RETRIES
+        self.hedge_delay = Config.G2BULK_HEDGE_DELAY
 
     def _get_headers(self) -> Dict[str, str]:
         return {"X-API-Key": self.api_key, "Content-Type": "application/json"}
 
-    async def get_me(self) -> Dict[str, Any]:
-        """Get authenticated user details including balance"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.BASE_URL}/getMe", headers=self._get_headers()
+    @staticmethod
+    def _raise_api_error(data: Dict[str, Any]):
+        raise Exception(f"API Error: {data.get('message', 'Unknown error')}")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, so retries from many users don't arrive together
+        return random.uniform(
+            0, min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2**attempt)
+        )
+
+    async def _send(
+        self, method: str, path: str, endpoint: str, payload: Optional[dict]
+    ) -> Tuple[int, Dict[str, Any]]:
+        timeout = aiohttp.ClientTimeout(total=self.TIMEOUTS[endpoint])
+        async with aiohttp.ClientSession(
+            timeout=timeout, trace_configs=[upstream_trace_config("g2bulk")]
+        ) as session:
+            async with session.request(
+                method,
+                f"{self.BASE_URL}/{path}",
+                headers=self._get_headers(),
+                json=payload,
+                trace_request_ctx={"endpoint": endpoint},
             ) as response:
-                if response.status == 200:
-                    return await response.json()
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    # Error pages from proxies aren't JSON
+                    text = (await response.text()).strip()
+                    data = {"message": text[:200] or f"HTTP {response.status}"}
+                if not isinstance(data, dict):
+                    data = {"data": data}
+                return response.status, data
+
+    async def _send_hedged(
+        self, method: str, path: str, endpoint: str, payload: Optional[dict]
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Send a second identical request if the first is slower than hedge_delay"""
+        first = asyncio.ensure_future(self._send(method, path, endpoint, payload))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+        pending = {first, asyncio.ensure_future(self._send(method, path, endpoint, payload))}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        endpoint: str,
+        payload: Optional[dict] = None,
+        idempotent: bool = True,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Send a request through the circuit breaker.
+
+        Only idempotent requests are retried and hedged, on network errors,
+        timeouts, 429 and 5xx responses. The same failures of the others raise
+        G2BulkOutcomeUnknown.
+        """
+        attempts = self.max_retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise G2BulkUnavailable("API Error: G2Bulk service is unavailable")
+            last_attempt = attempt == attempts - 1
+            try:
+                if idempotent and self.hedge_delay:
+                    status, data = await self._send_hedged(
+                        method, path, endpoint, payload
+                    )
                 else:
-                    error_data = await response.json()
+                    status, data = await self._send(method, path, endpoint, payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                logger.warning(
+                    f"G2Bulk {endpoint} attempt {attempt + 1}/{attempts} failed: {e!r}"
+                )
+                if not idempotent:
+                    raise G2BulkOutcomeUnknown(
+                        f"API Error: {str(e) or type(e).__name__}"
+                    ) from e
+                if last_attempt:
                     raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
+                        f"API Error: {str(e) or type(e).__name__}"
+                    ) from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if status == 429 or status >= 500:
+                self.breaker.record_failure()
+                logger.warning(
+                    f"G2Bulk {endpoint} attempt {attempt + 1}/{attempts} returned {status}"
+                )
+                if status >= 500 and not idempotent:
+                    raise G2BulkOutcomeUnknown(
+                        f"API Error: {data.get('message', 'Unknown error')}"
                     )
+                if not last_attempt:
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+            else:
+                self.breaker.record_success()
+            return status, data
+
+    async def get_me(self) -> Dict[str, Any]:
+        """Get authenticated user details including balance"""
+        status, data = await self._request("GET", "getMe", "getMe")
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def get_games(self) -> List[Dict[str, Any]]:
         """Get all supported games"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.BASE_URL}/games", headers=self._get_headers()
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("games", [])
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request("GET", "games", "games")
+        if status == 200:
+            return data.get("games", [])
+        self._raise_api_error(data)
 
     async def get_game_fields(self, game_code: str) -> Dict[str, Any]:
         """Get required input fields for a specific game"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.BASE_URL}/games/fields",
-                headers=self._get_headers(),
-                json={"game": game_code},
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request(
+            "POST", "games/fields", "games/fields", {"game": game_code}
+        )
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def get_game_servers(self, game_code: str) -> Optional[Dict[str, str]]:
         """Get available server list for a specific game. Returns None if servers are not required."""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.BASE_URL}/games/servers",
-                headers=self._get_headers(),
-                json={"game": game_code},
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("servers")
-                elif response.status == 403:
-                    # Game does not require servers
-                    return None
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request(
+            "POST", "games/servers", "games/servers", {"game": game_code}
+        )
+        if status == 200:
+            return data.get("servers")
+        elif status == 403:
+            # Game does not require servers
+            return None
+        self._raise_api_error(data)
 
     async def check_player_id(
         self, game_code: str, user_id: str, server_id: Optional[str] = None
@@ -87,34 +263,21 @@ class G2BulkAPI:
         if server_id:
             payload["server_id"] = server_id
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.BASE_URL}/games/checkPlayerId",
-                headers=self._get_headers(),
-                json=payload,
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request(
+            "POST", "games/checkPlayerId", "games/checkPlayerId", payload
+        )
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def get_game_catalogue(self, game_code: str) -> Dict[str, Any]:
         """Get all available denominations/packages for a specific game"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.BASE_URL}/games/{game_code}/catalogue",
-                headers=self._get_headers(),
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request(
+            "GET", f"games/{game_code}/catalogue", "games/catalogue"
+        )
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def create_game_order(
         self,
@@ -125,7 +288,11 @@ class G2BulkAPI:
         remark: Optional[str] = None,
         callback_url: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Place a game top-up order"""
+        """Place a game top-up order.
+
+        Raises G2BulkOutcomeUnknown when the order may or may not have been
+        placed, it's found again in get_orders() by its remark.
+        """
         payload = {"catalogue_name": catalogue_name, "player_id": player_id}
         if server_id:
             payload["server_id"] = server_id
@@ -134,47 +301,68 @@ class G2BulkAPI:
         if callback_url:
             payload["callback_url"] = callback_url
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.BASE_URL}/games/{game_code}/order",
-                headers=self._get_headers(),
-                json=payload,
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        # Never retried, a retry could place the order twice
+        status, data = await self._request(
+            "POST", f"games/{game_code}/order", "games/order", payload, idempotent=False
+        )
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def get_order_status(self, order_id: int, game_code: str) -> Dict[str, Any]:
         """Check the current status of a specific game order"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.BASE_URL}/games/order/status",
-                headers=self._get_headers(),
-                json={"order_id": order_id, "game": game_code},
-            ) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request(
+            "POST",
+            "games/order/status",
+            "games/order/status",
+            {"order_id": order_id, "game": game_code},
+        )
+        if status == 200:
+            return data
+        self._raise_api_error(data)
 
     async def get_orders(self) -> List[Dict[str, Any]]:
         """Get complete game top-up order history"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.BASE_URL}/games/orders", headers=self._get_headers()
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("orders", [])
-                else:
-                    error_data = await response.json()
-                    raise Exception(
-                        f"API Error: {error_data.get('message', 'Unknown error')}"
-                    )
+        status, data = await self._request("GET", "games/orders", "games/orders")
+        if status == 200:
+            return data.get("orders", [])
+        self._raise_api_error(data)
+
+
+class MemoizedG2BulkAPI(G2BulkAPI):
+    """G2BulkAPI that memoizes read-only calls for its own lifetime.
+
+    Meant to be created once per handler call, repeated or concurrent calls
+    with the same arguments share one request.
+    """
+
+    def __init__(self, api_key: str = None, breaker: CircuitBreaker = None):
+        super().__init__(api_key, breaker)
+        self._memo: Dict[tuple, asyncio.Future] = {}
+
+    def _memoized(self, name: str, call, *args) -> asyncio.Future:
+        key = (name, *args)
+        if key not in self._memo:
+            self._memo[key] = asyncio.ensure_future(call(*args))
+        return self._memo[key]
+
+    async def get_me(self) -> Dict[str, Any]:
+        return await self._memoized("get_me", super().get_me)
+
+    async def get_games(self) -> List[Dict[str, Any]]:
+        return await self._memoized("get_games", super().get_games)
+
+    async def get_game_fields(self, game_code: str) -> Dict[str, Any]:
+        return await self._memoized(
+            "get_game_fields", super().get_game_fields, game_code
+        )
+
+    async def get_game_servers(self, game_code: str) -> Optional[Dict[str, str]]:
+        return await self._memoized(
+            "get_game_servers", super().get_game_servers, game_code
+        )
+
+    async def get_game_catalogue(self, game_code: str) -> Dict[str, Any]:
+        return await self._memoized(
+            "get_game_catalogue", super().get_game_catalogue, game_code
+        )
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from common.instrumentation import metrics
+from Config import Config
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Location of blocks the watchdog didn't see, shorter than its sampling period
+UNKNOWN = "unknown"
+
+
+@dataclass
+class BlockingCall:
+    location: str
+    stack: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+def blocking_location(stack: traceback.StackSummary) -> str:
+    """The innermost frame of the bot's own code, the call to move off the
+    loop, or the innermost frame if the stack has none"""
+    for frame in reversed(stack):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename.startswith(PROJECT_ROOT)
+            and filename != os.path.abspath(__file__)
+            and "site-packages" not in filename
+        ):
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    """Measures how late the event loop runs a heartbeat every
+    LOOP_MONITOR_INTERVAL seconds.
+
+    A watchdog thread captures the loop thread's stack when the heartbeat is
+    more than LOOP_BLOCK_THRESHOLD seconds late, and the block is charged to
+    the bot's own frame in it. With LOOP_DEBUG, asyncio's debug mode also
+    logs every callback slower than the threshold.
+    """
+
+    def __init__(
+        self,
+        interval: float = Config.LOOP_MONITOR_INTERVAL,
+        threshold: float = Config.LOOP_BLOCK_THRESHOLD,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocking_calls: Dict[str, BlockingCall] = {}
+        self._last_beat = time.monotonic()
+        self._capture: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    def _record(self, location: str, stack: str, seconds: float):
+        call = self.blocking_calls.get(location)
+        if call is None:
+            call = self.blocking_calls[location] = BlockingCall(location, stack)
+        call.count += 1
+        call.total += seconds
+        if seconds > call.max:
+            # Logged once per new worst block of each location
+            call.max = seconds
+            call.stack = stack or call.stack
+            logger.warning(
+                f"Event loop blocked for {seconds * 1000:.0f}ms at {location}\n{stack}"
+            )
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._last_beat - self.interval)
+            metrics.loop_lag.observe(lag)
+            with self._lock:
+                capture, self._capture = self._capture, None
+            if lag >= self.threshold:
+                location, stack = capture or (UNKNOWN, "")
+                self._record(location, stack, lag)
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            late = time.monotonic() - self._last_beat - self.interval
+            if late < self.threshold:
+                continue
+            with self._lock:
+                if self._capture is not None:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            capture = (blocking_location(stack), "".join(stack.format()[-8:]).rstrip())
+            with self._lock:
+                self._capture = capture
+
+    async def start(self):
+        if self._task:
+            return
+        loop = asyncio.get_running_loop()
+        if Config.LOOP_DEBUG:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def worst_offenders(self, top: int = Config.STATS_TOP_ROWS) -> List[BlockingCall]:
+        return sorted(
+            self.blocking_calls.values(), key=lambda call: call.total, reverse=True
+        )[:top]
+
+    def report(self) -> str:
+        lines = [
+            f"{call.location}: {call.count} blocks, total {call.total * 1000:.0f}ms, "
+            f"max {call.max * 1000:.0f}ms"
+            for call in self.worst_offenders()
+        ]
+        return "\n".join(lines) or "no blocking calls"
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,77 @@
+from typing import Optional
+from aiohttp import web
+from common.instrumentation import prometheus_counter, prometheus_lines
+from common.cards import card_stats
+from common.media import media_fallbacks
+from common.rendering import render_stats
+from services.loop_monitor import loop_monitor
+from Config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def render_metrics() -> str:
+    """All the process' metrics in the Prometheus text format"""
+    lines = [
+        *prometheus_lines(),
+        *prometheus_counter(
+            "bot_render_edits_total",
+            "Message edits the rendering cache kept from Telegram.",
+            (({"outcome": outcome}, n) for outcome, n in list(render_stats.items())),
+        ),
+        *prometheus_counter(
+            "bot_card_renders_total",
+            "Order and user cards served from, rendered into or around the card cache.",
+            (({"outcome": outcome}, n) for outcome, n in list(card_stats.items())),
+        ),
+        *prometheus_counter(
+            "bot_event_loop_blocked_seconds_total",
+            "Time the event loop was blocked, by the code blocking it.",
+            (
+                ({"location": call.location}, f"{call.total:.6f}")
+                for call in list(loop_monitor.blocking_calls.values())
+            ),
+        ),
+        *prometheus_counter(
+            "bot_media_fallbacks_total",
+            "Media sends retried as the other media kind.",
+            (({"kind": kind}, n) for kind, n in list(media_fallbacks.items())),
+        ),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves GET /metrics for Prometheus on METRICS_LISTEN:METRICS_PORT,
+    worker i of the sharded mode on METRICS_PORT + i"""
+
+    def __init__(
+        self,
+        listen: str = Config.METRICS_LISTEN,
+        port: int = Config.METRICS_PORT,
+    ):
+        self.listen = listen
+        self.port = port + (Config.WORKER_INDEX or 0) if port else 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def metrics(self, request: web.Request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Metrics served on {self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
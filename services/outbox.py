@@ -0,0 +1,295 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from sqlalchemy.orm import Session
+from Config import Config
+from common.media import send_media_message
+import models
+import sqlalchemy as sa
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit on the length of a text message
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖➖\n\n"
+
+
+def enqueue(
+    s: Session,
+    chat_id: int,
+    text: str,
+    media: Optional[str] = None,
+    media_kind: str = "photo",
+):
+    """Add a message to the outbox as part of the caller's transaction"""
+    s.add(
+        models.OutboxMessage(
+            chat_id=chat_id,
+            text=text,
+            media=media,
+            media_kind=media_kind if media else None,
+        )
+    )
+
+
+class OutboxDispatcher:
+    """Sends pending OutboxMessage rows with a pool of async workers.
+
+    - Messages of the same chat are sent one at a time in id order, at most
+      one every chat_interval seconds, and a message waiting for a retry
+      holds back the ones after it.
+    - All workers share a rate limit of rate_limit messages per second.
+    - RetryAfter holds back only the chat it was raised for, network errors
+      are retried with backoff, messages to chats that blocked the bot or
+      don't exist are marked failed.
+    - Text posts to digest_chats (the archive channels) are coalesced into
+      one message once the oldest has waited digest_window seconds or
+      digest_max_items are pending.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.OUTBOX_WORKERS,
+        rate_limit: float = Config.OUTBOX_RATE_LIMIT,
+        chat_interval: float = Config.OUTBOX_CHAT_INTERVAL,
+        poll_interval: float = Config.OUTBOX_POLL_INTERVAL,
+        max_attempts: int = Config.OUTBOX_MAX_ATTEMPTS,
+        digest_chats: Optional[Set[int]] = None,
+        digest_window: float = Config.ARCHIVE_DIGEST_WINDOW,
+        digest_max_items: int = Config.ARCHIVE_DIGEST_MAX_ITEMS,
+        batch_size: int = 500,
+    ):
+        self.workers = workers
+        self.rate_limit = rate_limit
+        self.chat_interval = chat_interval
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.digest_chats = (
+            digest_chats
+            if digest_chats is not None
+            else {
+                Config.API_PURCHASES_ARCHIVE_CHANNEL,
+                Config.CHARGING_BALANCE_ORDERS_ARCHIVE_CHANNEL,
+                Config.MANUAL_PURCHASES_ARCHIVE_CHANNEL,
+            }
+        )
+        self.digest_window = digest_window
+        self.digest_max_items = digest_max_items
+        self.bot: Optional[Bot] = None
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._rate_lock: Optional[asyncio.Lock] = None
+        self._tasks = []
+        self._in_flight: Set[int] = set()
+        self._chat_next_at: Dict[int, float] = {}
+        self._next_send_at = 0.0
+
+    async def start(self, bot: Bot):
+        self.bot = bot
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._rate_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._poll_loop())] + [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+        logger.info(f"Outbox dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """Look for pending messages now instead of at the next poll"""
+        if self._wake:
+            self._wake.set()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                self._dispatch_ready()
+            except Exception as e:
+                logger.error(f"Error in outbox poll: {str(e)}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _dispatch_ready(self):
+        """Queue the oldest pending message (or digest) of every chat that is ready"""
+        now = datetime.now()
+        busy = self._in_flight | {
+            chat_id
+            for chat_id, next_at in self._chat_next_at.items()
+            if next_at > time.monotonic()
+        }
+        columns = (
+            models.OutboxMessage.id,
+            models.OutboxMessage.chat_id,
+            models.OutboxMessage.next_attempt_at,
+            models.OutboxMessage.created_at,
+            models.OutboxMessage.media,
+            sa.func.length(models.OutboxMessage.text),
+        )
+        pending = models.OutboxMessage.status == models.OutboxMessageStatus.PENDING
+        with models.session_scope() as s:
+            # One head per chat, so chats with a long backlog don't hide the others
+            heads = (
+                s.query(sa.func.min(models.OutboxMessage.id).label("id"))
+                .filter(pending)
+                .group_by(models.OutboxMessage.chat_id)
+                .subquery()
+            )
+            head_rows = (
+                s.query(*columns)
+                .join(heads, models.OutboxMessage.id == heads.c.id)
+                .filter(
+                    models.OutboxMessage.next_attempt_at <= now,
+                    models.OutboxMessage.chat_id.not_in(busy),
+                )
+                .order_by(models.OutboxMessage.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            by_chat: Dict[int, list] = {}
+            for row in head_rows:
+                chat_id, media = row[1], row[4]
+                by_chat[chat_id] = [row]
+                if chat_id in self.digest_chats and not media:
+                    by_chat[chat_id] = (
+                        s.query(*columns)
+                        .filter(pending, models.OutboxMessage.chat_id == chat_id)
+                        .order_by(models.OutboxMessage.id)
+                        .limit(self.digest_max_items)
+                        .all()
+                    )
+
+        for chat_id, chat_rows in by_chat.items():
+            message_id, _, _, created_at, media, _ = chat_rows[0]
+            message_ids = [message_id]
+            if chat_id in self.digest_chats and not media:
+                message_ids = self._digest_ids(chat_rows)
+                window_open = created_at + timedelta(seconds=self.digest_window) > now
+                if window_open and len(message_ids) < self.digest_max_items:
+                    continue
+            self._in_flight.add(chat_id)
+            self._queue.put_nowait((message_ids, chat_id))
+
+    def _digest_ids(self, chat_rows: list) -> List[int]:
+        """Ids of the leading text posts of a chat that fit in one message"""
+        message_ids = []
+        length = 0
+        for message_id, _, _, _, media, text_length in chat_rows:
+            if media or len(message_ids) >= self.digest_max_items:
+                break
+            length += text_length + (len(DIGEST_SEPARATOR) if message_ids else 0)
+            if message_ids and length > MAX_MESSAGE_LENGTH:
+                break
+            message_ids.append(message_id)
+        return message_ids
+
+    async def _worker(self):
+        while True:
+            message_ids, chat_id = await self._queue.get()
+            try:
+                await self._deliver(message_ids)
+            except Exception as e:
+                logger.error(
+                    f"Error delivering outbox messages {message_ids}: {str(e)}",
+                    exc_info=True,
+                )
+            finally:
+                self._in_flight.discard(chat_id)
+                self._chat_next_at[chat_id] = max(
+                    self._chat_next_at.get(chat_id, 0),
+                    time.monotonic() + self.chat_interval,
+                )
+                self._queue.task_done()
+                self.wake()
+
+    async def _throttle(self):
+        async with self._rate_lock:
+            now = time.monotonic()
+            if self._next_send_at > now:
+                await asyncio.sleep(self._next_send_at - now)
+            self._next_send_at = max(now, self._next_send_at) + 1 / self.rate_limit
+
+    async def _send(self, chat_id: int, text: str, media: str, media_kind: str):
+        await send_media_message(
+            self.bot, chat_id, text, media=media, media_kind=media_kind
+        )
+
+    async def _deliver(self, message_ids: List[int]):
+        """Send one message, or a digest of several, and record the outcome"""
+        with models.session_scope() as s:
+            messages = (
+                s.query(models.OutboxMessage)
+                .filter(
+                    models.OutboxMessage.id.in_(message_ids),
+                    models.OutboxMessage.status == models.OutboxMessageStatus.PENDING,
+                )
+                .order_by(models.OutboxMessage.id)
+                .all()
+            )
+            if not messages:
+                return
+            message_ids = [message.id for message in messages]
+            chat_id = messages[0].chat_id
+            text = DIGEST_SEPARATOR.join(message.text for message in messages)
+            media, media_kind = messages[0].media, messages[0].media_kind
+            attempts = messages[0].attempts + 1
+
+        await self._throttle()
+        status = models.OutboxMessageStatus.SENT
+        error = None
+        retry_in = 0.0
+        try:
+            await self._send(chat_id, text, media, media_kind)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            status, error, retry_in = (
+                models.OutboxMessageStatus.PENDING,
+                str(e),
+                float(retry_after),
+            )
+            # Flood control of one chat must not slow the other chats down
+            self._chat_next_at[chat_id] = time.monotonic() + retry_in
+        except (Forbidden, BadRequest) as e:
+            status, error = models.OutboxMessageStatus.FAILED, str(e)
+        except Exception as e:
+            status, error = models.OutboxMessageStatus.PENDING, str(e)
+            retry_in = min(300.0, 5.0 * 2 ** (attempts - 1))
+
+        if status == models.OutboxMessageStatus.PENDING and attempts >= self.max_attempts:
+            status = models.OutboxMessageStatus.FAILED
+        if status == models.OutboxMessageStatus.FAILED:
+            logger.warning(
+                f"Outbox messages {message_ids} to {chat_id} failed after {attempts} attempts: {error}"
+            )
+
+        with models.session_scope() as s:
+            for message in s.query(models.OutboxMessage).filter(
+                models.OutboxMessage.id.in_(message_ids)
+            ):
+                message.status = status
+                message.attempts = attempts
+                message.last_error = error
+                if status == models.OutboxMessageStatus.SENT:
+                    message.sent_at = datetime.now()
+                else:
+                    message.next_attempt_at = datetime.now() + timedelta(
+                        seconds=retry_in
+                    )
+
+
+outbox_dispatcher = OutboxDispatcher()
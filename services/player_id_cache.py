@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from services.g2bulk_api import G2BulkAPI
+from Config import Config
+import asyncio
+import time
+
+
+class PlayerIdCache:
+    """Cache of G2Bulk player ID validations keyed by (game, player, server).
+
+    Valid results are kept for positive_ttl seconds, invalid ones for
+    negative_ttl. Concurrent checks of the same key share one request, and
+    API errors are never cached.
+    """
+
+    def __init__(
+        self,
+        positive_ttl: float = Config.PLAYER_ID_CACHE_TTL,
+        negative_ttl: float = Config.PLAYER_ID_CACHE_NEGATIVE_TTL,
+        max_size: int = Config.PLAYER_ID_CACHE_MAX_SIZE,
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        # key -> (expires_at, check result)
+        self._results: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[Tuple, asyncio.Future] = {}
+
+    def _get_cached(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        cached = self._results.get(key)
+        if cached is None:
+            return None
+        expires_at, result = cached
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def _store(self, key: Tuple, result: Dict[str, Any]):
+        ttl = self.positive_ttl if result.get("valid") == "valid" else self.negative_ttl
+        self._results[key] = (time.monotonic() + ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    async def _check(self, key: Tuple, api: G2BulkAPI) -> Dict[str, Any]:
+        try:
+            result = await api.check_player_id(*key)
+            self._store(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def check_player_id(
+        self,
+        game_code: str,
+        player_id: str,
+        server_id: Optional[str] = None,
+        api: G2BulkAPI = None,
+    ) -> Dict[str, Any]:
+        """Same result as G2BulkAPI.check_player_id, served from cache when possible"""
+        key = (game_code, player_id, server_id or None)
+        result = self._get_cached(key)
+        if result is not None:
+            return result
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._check(key, api or G2BulkAPI()))
+            self._in_flight[key] = future
+        # shield so one cancelled waiter doesn't cancel the shared request
+        return await asyncio.shield(future)
+
+
+player_id_cache = PlayerIdCache()
@@ -0,0 +1,246 @@
+from typing import List, Optional, Set
+from aiohttp import ClientSession, ClientError, web
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from common.transport import build_get_updates_request, build_request
+from services.webhook_server import SECRET_TOKEN_HEADER
+from Config import Config
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+
+logger = logging.getLogger(__name__)
+
+WORKER_UPDATE_PATH = "/update"
+
+
+def shard_of(update: Update, workers: int) -> int:
+    """Worker of an update: all updates of a user go to the same worker so its
+    conversations and user_data stay in one process"""
+    if update.effective_user:
+        key = update.effective_user.id
+    elif update.effective_chat:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % workers
+
+
+class UpdateRouter:
+    """Front process of the sharded mode.
+
+    Starts WORKERS copies of the bot, each serving its shard of the updates
+    on 127.0.0.1:WORKER_BASE_PORT + index, then receives the updates
+    (long polling or webhook, per BOT_MODE) and forwards each one to its
+    worker. Updates of one worker are forwarded in order and retried until
+    the worker takes them. G2Bulk callbacks go to worker 0, the leader, which
+    also runs the jobs and the outbox dispatcher. Exited workers are restarted.
+
+    On shutdown it stops receiving, forwards what's queued for up to
+    WORKER_DRAIN_TIMEOUT seconds, then stops the workers. Polled updates
+    are confirmed up to the first one that wasn't forwarded.
+    """
+
+    def __init__(
+        self,
+        workers: int = Config.WORKERS,
+        base_port: int = Config.WORKER_BASE_PORT,
+    ):
+        self.workers = workers
+        self.base_port = base_port
+        self.secret = secrets.token_urlsafe(32)
+        self.bot = Bot(
+            token=Config.BOT_TOKEN,
+            base_url=Config.BOT_API_BASE_URL,
+            request=build_request(),
+            get_updates_request=build_get_updates_request(),
+        )
+        self._processes: List[Optional[subprocess.Popen]] = [None] * workers
+        self._queues: List[asyncio.Queue] = []
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._offset: Optional[int] = None
+        # IDs of the polled updates queued and not forwarded yet
+        self._undelivered: Set[int] = set()
+
+    def _start_worker(self, index: int):
+        env = {
+            **os.environ,
+            "WORKER_INDEX": str(index),
+            "WORKER_SECRET": self.secret,
+            "WORKER_BASE_PORT": str(self.base_port),
+        }
+        self._processes[index] = subprocess.Popen([sys.executable, *sys.argv], env=env)
+        logger.info(f"Started worker {index} (pid {self._processes[index].pid})")
+
+    async def _watch_workers(self):
+        while True:
+            await asyncio.sleep(5)
+            for index, process in enumerate(self._processes):
+                if process.poll() is not None:
+                    logger.error(
+                        f"Worker {index} exited with code {process.returncode}, restarting"
+                    )
+                    self._start_worker(index)
+
+    def route(self, update: Update, polled: bool = False):
+        shard = shard_of(update, self.workers)
+        update_id = update.update_id if polled else None
+        if polled:
+            self._undelivered.add(update_id)
+        self._queues[shard].put_nowait((WORKER_UPDATE_PATH, update.to_json(), update_id))
+
+    async def _forward_loop(self, index: int):
+        url = f"http://127.0.0.1:{self.base_port + index}"
+        queue = self._queues[index]
+        while True:
+            path, body, update_id = await queue.get()
+            while True:
+                try:
+                    async with self._session.post(
+                        f"{url}{path}",
+                        data=body,
+                        headers={
+                            SECRET_TOKEN_HEADER: self.secret,
+                            "Content-Type": "application/json",
+                        },
+                    ) as response:
+                        if response.status >= 400:
+                            logger.error(
+                                f"Worker {index} rejected {path} with {response.status}"
+                            )
+                    break
+                except (ClientError, OSError) as e:
+                    # The worker is starting or restarting, keep the order
+                    logger.warning(f"Worker {index} unreachable, retrying: {str(e)}")
+                    await asyncio.sleep(1)
+            self._undelivered.discard(update_id)
+            queue.task_done()
+
+    async def _poll(self):
+        await self.bot.delete_webhook()
+        while True:
+            try:
+                updates = await self.bot.get_updates(
+                    offset=self._offset, timeout=10, allowed_updates=Update.ALL_TYPES
+                )
+            except TelegramError as e:
+                logger.warning(f"getUpdates failed: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                self.route(update, polled=True)
+                self._offset = update.update_id + 1
+
+    async def telegram_update(self, request: web.Request):
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token, Config.WEBHOOK_SECRET_TOKEN):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.bot)
+        except Exception as e:
+            logger.warning(f"Invalid webhook update: {str(e)}")
+            return web.Response(status=400)
+        self.route(update)
+        return web.Response()
+
+    async def g2bulk_callback(self, request: web.Request):
+        # The leader checks the secret
+        self._queues[0].put_nowait((request.path, await request.read(), None))
+        return web.json_response({"success": True})
+
+    async def _start_webhook(self):
+        if not Config.WEBHOOK_URL or not Config.WEBHOOK_SECRET_TOKEN:
+            raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET_TOKEN are required in webhook mode")
+        path = f"/{Config.WEBHOOK_PATH.strip('/')}"
+        await self.bot.set_webhook(
+            url=f"{Config.WEBHOOK_URL.rstrip('/')}{path}",
+            secret_token=Config.WEBHOOK_SECRET_TOKEN,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        app = web.Application()
+        app.router.add_post(path, self.telegram_update)
+        if Config.G2BULK_CALLBACK_SECRET:
+            app.router.add_post("/g2bulk/{secret}", self.g2bulk_callback)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT).start()
+
+    async def _drain(self):
+        """Wait for the workers to take the queued updates, for a bounded time"""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=Config.WORKER_DRAIN_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Stopping with {len(self._undelivered)} polled updates not forwarded "
+                "to the workers, they're fetched again on the next start"
+            )
+
+    def _confirm_offset(self) -> Optional[int]:
+        """Offset confirming the polled updates up to the first one that wasn't
+        forwarded, Telegram sends it and the ones after it again"""
+        if self._undelivered:
+            return min(self._undelivered)
+        return self._offset
+
+    async def serve(self):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._session = ClientSession()
+        for index in range(self.workers):
+            self._start_worker(index)
+        tasks = [asyncio.create_task(self._watch_workers())] + [
+            asyncio.create_task(self._forward_loop(index)) for index in range(self.workers)
+        ]
+        poller = None
+        await self.bot.initialize()
+        try:
+            if Config.BOT_MODE == "webhook":
+                await self._start_webhook()
+            else:
+                poller = asyncio.create_task(self._poll())
+            logger.info(f"Routing updates to {self.workers} workers")
+            await stop_event.wait()
+        finally:
+            # Stop receiving first, the webhook server with its G2Bulk callbacks too
+            if poller:
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+            if self._runner:
+                await self._runner.cleanup()
+            await self._drain()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for process in self._processes:
+                if process and process.poll() is None:
+                    process.terminate()
+            offset = self._confirm_offset()
+            if offset is not None:
+                try:
+                    # Confirm the forwarded updates so they aren't fetched again
+                    await self.bot.get_updates(offset=offset, timeout=0)
+                except TelegramError as e:
+                    logger.warning(f"Couldn't confirm the last updates: {str(e)}")
+            await self._session.close()
+            await self.bot.shutdown()
+            for process in self._processes:
+                if process:
+                    process.wait()
+
+
+def run_sharded():
+    asyncio.run(UpdateRouter().serve())
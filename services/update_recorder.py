@@ -0,0 +1,140 @@
+from typing import Optional, TextIO
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+from Config import Config
+import hashlib
+import hmac
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# The owner is logged with this id, replays run with OWNER_ID=1
+LOG_OWNER_ID = 1
+# Fields naming a user or chat, dropped from the log
+PERSONAL_FIELDS = ("last_name", "username", "bio", "description", "invite_link")
+# Texts kept verbatim, commands without their arguments and plain numbers
+COMMAND = re.compile(r"^/\w+(@\w+)?")
+NUMBER = re.compile(r"^[0-9]+(\.[0-9]+)?$")
+# Digit runs long enough to be user or chat ids, mapped to their pseudonyms in
+# callback data and integer texts: admins type and press the ids of other
+# users (balance_action_set_{user_id})
+ID = re.compile(r"(?<![0-9])[0-9]{5,}(?![0-9])")
+
+
+class UpdateRecorder:
+    """Appends every incoming update to UPDATE_LOG_PATH, one compact JSON
+    line {"t": unix time, "update": update} each, for test/replay_updates.py.
+
+    Users and chats get stable pseudonyms keyed with the bot token, names
+    and file ids are dropped or hashed and texts other than commands and
+    numbers are masked keeping their length, so entities still line up.
+    Ids in callback data and integer texts take the pseudonyms too, so
+    flows acting on another user still find them on replay.
+    Worker i of the sharded mode appends to UPDATE_LOG_PATH.i.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = Config.UPDATE_LOG_PATH,
+        keep_text: bool = Config.UPDATE_LOG_KEEP_TEXT,
+    ):
+        if path and Config.WORKER_INDEX is not None:
+            path = f"{path}.{Config.WORKER_INDEX}"
+        self.path = path
+        self.keep_text = keep_text
+        self.recorded = 0
+        self._key = (Config.BOT_TOKEN or "").encode()
+        self._file: Optional[TextIO] = None
+        self._flushed = time.monotonic()
+
+    def pseudonym(self, chat_id: int) -> int:
+        if chat_id == Config.OWNER_ID:
+            return LOG_OWNER_ID
+        digest = hmac.new(self._key, str(chat_id).encode(), hashlib.sha256).digest()
+        # Clear of the small ids the owner and the fake servers use
+        pseudonym = 1_000_000 + int.from_bytes(digest[:5], "big")
+        return -pseudonym if chat_id < 0 else pseudonym
+
+    def _hash(self, value: str) -> str:
+        return hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()[:24]
+
+    def _ids(self, value: str) -> str:
+        return ID.sub(lambda match: str(self.pseudonym(int(match.group(0)))), value)
+
+    def _text(self, text: str) -> str:
+        if ID.fullmatch(text):
+            return self._ids(text)
+        if self.keep_text or NUMBER.match(text):
+            return text
+        command = COMMAND.match(text)
+        if command:
+            return command.group(0) + re.sub(r"\w", "x", text[command.end() :])
+        return re.sub(r"\w", "x", text)
+
+    def anonymize(self, data, bot_id: int = None):
+        if isinstance(data, list):
+            return [self.anonymize(value, bot_id) for value in data]
+        if not isinstance(data, dict):
+            return data
+        data = {key: self.anonymize(value, bot_id) for key, value in data.items()}
+        # A User or a Chat
+        if "id" in data and ("is_bot" in data or "type" in data):
+            if data["id"] != bot_id:
+                data["id"] = self.pseudonym(data["id"])
+                for field in PERSONAL_FIELDS:
+                    data.pop(field, None)
+                if "first_name" in data:
+                    data["first_name"] = f"User{data['id']}"
+                if "title" in data:
+                    data["title"] = f"Chat{data['id']}"
+        for key in ("user_id", "chat_id"):
+            if isinstance(data.get(key), int):
+                data[key] = self.pseudonym(data[key])
+        for key in ("file_id", "file_unique_id", "chat_instance"):
+            if key in data:
+                data[key] = self._hash(data[key])
+        for key in ("text", "caption"):
+            if isinstance(data.get(key), str):
+                data[key] = self._text(data[key])
+        # A button of a recorded reply_markup
+        if isinstance(data.get("callback_data"), str):
+            data["callback_data"] = self._ids(data["callback_data"])
+        # A CallbackQuery
+        if "chat_instance" in data and isinstance(data.get("data"), str):
+            data["data"] = self._ids(data["data"])
+        if "phone_number" in data:
+            data["phone_number"] = "0"
+        return data
+
+    async def record(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.path:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        line = json.dumps(
+            {
+                "t": round(time.time(), 3),
+                "update": self.anonymize(update.to_dict(), context.bot.id),
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        self._file.write(line + "\n")
+        self.recorded += 1
+        # Buffered, a crash loses at most the last second of updates
+        if time.monotonic() - self._flushed >= 1:
+            self._file.flush()
+            self._flushed = time.monotonic()
+
+    def stop(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self.recorded} updates to {self.path}")
+
+
+update_recorder = UpdateRecorder()
+update_recorder_handler = TypeHandler(Update, update_recorder.record)
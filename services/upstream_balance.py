@@ -0,0 +1,55 @@
+from typing import Optional
+from services.g2bulk_api import G2BulkAPI
+from Config import Config
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamBalance:
+    """Locally tracked G2Bulk account balance (USD).
+
+    Refreshed in the background by the refresh_upstream_balance job and
+    debited locally after each order, so handlers don't call getMe on every
+    tap. It's only fetched inline when it's unknown or too old.
+    """
+
+    def __init__(self, max_age: float = Config.UPSTREAM_BALANCE_MAX_AGE):
+        self.max_age = max_age
+        self.balance: Optional[float] = None
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return (
+            self.balance is None or time.monotonic() - self.refreshed_at > self.max_age
+        )
+
+    async def refresh(self, api: G2BulkAPI = None) -> float:
+        """Fetch the balance from the API"""
+        async with self._lock:
+            user_info = await (api or G2BulkAPI()).get_me()
+            self.balance = float(user_info.get("balance", 0))
+            self.refreshed_at = time.monotonic()
+            return self.balance
+
+    async def get(self, api: G2BulkAPI = None) -> float:
+        """The tracked balance, fetched first if unknown or too old"""
+        if self.is_stale:
+            return await self.refresh(api)
+        return self.balance
+
+    def debit(self, amount_usd: float):
+        """Account for an order placed since the last refresh"""
+        if self.balance is not None:
+            self.balance -= amount_usd
+
+    def invalidate(self):
+        """Force the next get() to fetch the balance from the API"""
+        self.balance = None
+
+
+upstream_balance = UpstreamBalance()
@@ -0,0 +1,138 @@
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from Config import Config
+import asyncio
+import hmac
+import logging
+import signal
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def g2bulk_callback_url() -> Optional[str]:
+    """URL G2Bulk should call when an order changes, None if callbacks are off"""
+    if Config.BOT_MODE != "webhook" or not Config.G2BULK_CALLBACK_SECRET:
+        return None
+    return f"{Config.WEBHOOK_URL.rstrip('/')}/g2bulk/{Config.G2BULK_CALLBACK_SECRET}"
+
+
+class WebhookServer:
+    """Receives Telegram updates, and G2Bulk order callbacks if enabled, on
+    one aiohttp server in the bot's process.
+
+    Updates are put on the application's update queue as soon as they arrive,
+    concurrent_updates then processes them side by side. Requests without
+    the webhook secret token are rejected.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        listen: str = Config.WEBHOOK_LISTEN,
+        port: int = Config.WEBHOOK_PORT,
+        path: str = Config.WEBHOOK_PATH,
+        secret_token: Optional[str] = Config.WEBHOOK_SECRET_TOKEN,
+        set_webhook: bool = True,
+    ):
+        if not secret_token or (set_webhook and not Config.WEBHOOK_URL):
+            raise ValueError("WEBHOOK_URL and WEBHOOK_SECRET_TOKEN are required in webhook mode")
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = f"/{path.strip('/')}"
+        self.secret_token = secret_token
+        # Workers of the sharded mode get updates from the front process
+        self.set_webhook = set_webhook
+        self._runner: Optional[web.AppRunner] = None
+
+    async def telegram_update(self, request: web.Request):
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token, self.secret_token):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logger.warning(f"Invalid webhook update: {str(e)}")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def g2bulk_callback(self, request: web.Request):
+        from jobs import reconcile_api_order
+
+        if not hmac.compare_digest(
+            request.match_info["secret"], Config.G2BULK_CALLBACK_SECRET
+        ):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            order = data.get("order") or data
+            api_order_id = int(order.get("order_id") or order.get("id"))
+        except Exception as e:
+            logger.warning(f"Invalid G2Bulk callback: {str(e)}")
+            return web.Response(status=400)
+        # Answer right away, the order status is fetched from the API
+        self.application.create_task(
+            reconcile_api_order(api_order_id), name=f"g2bulk_callback_{api_order_id}"
+        )
+        return web.json_response({"success": True})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.telegram_update)
+        if Config.G2BULK_CALLBACK_SECRET:
+            app.router.add_post("/g2bulk/{secret}", self.g2bulk_callback)
+        return app
+
+    async def start(self):
+        if self.set_webhook:
+            await self.application.bot.set_webhook(
+                url=f"{Config.WEBHOOK_URL.rstrip('/')}{self.path}",
+                secret_token=self.secret_token,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def serve(self):
+        """Run the application behind the webhook until SIGINT/SIGTERM, with the
+        same post_init/post_shutdown hooks run_polling calls"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        try:
+            await application.start()
+            await self.start()
+            await stop_event.wait()
+        finally:
+            await self.stop()
+            if application.running:
+                await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, **kwargs):
+    asyncio.run(WebhookServer(application, **kwargs).serve())
@@ -5,11 +5,24 @@ from common.keyboards import build_user_keyboard, build_admin_keyboard
 from common.common import check_hidden_permission_requests_keyboard
 from common.lang_dicts import TEXTS, get_lang
 from custom_filters import Admin, PrivateChat, PrivateChatAndAdmin
+from common.rendering import render_report
+from services.loop_monitor import loop_monitor
+from services.metrics_server import metrics_server
+from services.outbox import outbox_dispatcher
+from services.update_recorder import update_recorder
 from Config import Config
 import models
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 async def inits(app: Application):
+    await loop_monitor.start()
+    await metrics_server.start()
+    # Workers of the sharded mode only handle updates
+    if not Config.IS_LEADER:
+        return
     bot: Bot = app.bot
     tg_owner = await bot.get_chat(chat_id=Config.OWNER_ID)
     with models.session_scope() as s:
@@ -23,6 +36,16 @@ async def inits(app: Application):
                     is_admin=True,
                 )
             )
+    await outbox_dispatcher.start(bot)
+
+
+async def shutdown(app: Application):
+    await outbox_dispatcher.stop()
+    await metrics_server.stop()
+    await loop_monitor.stop()
+    update_recorder.stop()
+    logger.info(f"Rendering: {render_report()}")
+    logger.info(f"Event loop blocking calls:\n{loop_monitor.report()}")
 
 
 async def set_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
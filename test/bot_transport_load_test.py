@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+from statistics import quantiles
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+from telegram import Bot
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+from common.transport import build_get_updates_request, build_request
+
+TOKEN = "123456:fake-token"
+BROADCAST_SIZE = 500
+REPLIES = 50
+LATENCY = 0.2
+PORT = 8082
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+async def run_scenario(name: str, bot: Bot) -> dict:
+    """Broadcast to BROADCAST_SIZE chats while long polling and measure how
+    long REPLIES handler replies sent at the same time take"""
+    await bot.initialize()
+    errors = 0
+    polls = 0
+    reply_latencies = []
+
+    async def send(chat_id: int):
+        nonlocal errors
+        try:
+            await bot.send_message(chat_id=chat_id, text="Broadcast")
+        except TelegramError:
+            errors += 1
+
+    async def reply():
+        nonlocal errors
+        started = time.monotonic()
+        try:
+            await bot.send_message(chat_id=1, text="Reply")
+            reply_latencies.append(time.monotonic() - started)
+        except TelegramError:
+            errors += 1
+
+    async def poll():
+        nonlocal polls, errors
+        while True:
+            try:
+                await bot.get_updates(timeout=0.2)
+                polls += 1
+            except TelegramError:
+                errors += 1
+
+    poller = asyncio.create_task(poll())
+    started = time.monotonic()
+    broadcast = asyncio.gather(*(send(chat_id) for chat_id in range(BROADCAST_SIZE)))
+    replies = []
+    for _ in range(REPLIES):
+        replies.append(asyncio.create_task(reply()))
+        await asyncio.sleep(0.01)
+    await asyncio.gather(broadcast, *replies)
+    elapsed = time.monotonic() - started
+    poller.cancel()
+    await asyncio.gather(poller, return_exceptions=True)
+    await bot.shutdown()
+
+    p50, p95 = (
+        (quantiles(reply_latencies, n=20)[9], quantiles(reply_latencies, n=20)[18])
+        if len(reply_latencies) > 1
+        else (float("inf"), float("inf"))
+    )
+    print(
+        f"{name}: broadcast {elapsed:.2f}s, reply p50 {p50 * 1000:.0f}ms "
+        f"p95 {p95 * 1000:.0f}ms, getUpdates polls {polls}, errors {errors}"
+    )
+    return {"elapsed": elapsed, "p95": p95, "polls": polls, "errors": errors}
+
+
+def start_server() -> subprocess.Popen:
+    """Run the fake Bot API in its own process so it doesn't compete with
+    the bot for the event loop"""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bot_api_server.py"),
+            "--port",
+            str(PORT),
+            "--latency",
+            str(LATENCY),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", PORT), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("Fake Bot API server didn't start")
+
+
+async def main():
+    server = start_server()
+    base_url = f"http://127.0.0.1:{PORT}/bot"
+    try:
+        # A small pool shared by getUpdates and every other call
+        shared = HTTPXRequest(connection_pool_size=8)
+        small = await run_scenario(
+            "small shared pool",
+            Bot(TOKEN, base_url=base_url, request=shared, get_updates_request=shared),
+        )
+        tuned = await run_scenario(
+            "tuned pools",
+            Bot(
+                TOKEN,
+                base_url=base_url,
+                request=build_request(),
+                get_updates_request=build_get_updates_request(),
+            ),
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    check("tuned pools make no failed calls", tuned["errors"] == 0)
+    check("tuned pools answer replies faster", tuned["p95"] < small["p95"])
+    check("tuned pools finish the broadcast faster", tuned["elapsed"] < small["elapsed"])
+    check("long polling keeps running during the broadcast", tuned["polls"] > 0)
+    print(f"\nFailures: {check.failures}")
+
+
+asyncio.run(main())
@@ -0,0 +1,444 @@
+"""End-to-end load test of the whole bot against local fakes.
+
+The real application from handlers.build_app() long polls a fake Bot API
+while simulated users walk the main flows concurrently: /start, charging
+their balance with a payment proof, then an instant purchase by search,
+denomination and player ID. The owner approves the charging orders as they
+arrive and finally broadcasts to every user. G2Bulk is faked too and the
+database is a throwaway one, so it runs headless without network:
+
+    python test/e2e_load_test.py --users 50 --bot-latency 0.05 --g2bulk-latency 0.1
+
+Reports the throughput, p50/p95/p99 latency of every step, the database
+lock errors logged and the peak memory of the process. With --record FILE
+the updates sent are logged for test/replay_updates.py.
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import warnings
+from collections import defaultdict
+from statistics import quantiles
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+BOT_API_PORT = free_port()
+G2BULK_PORT = free_port()
+OWNER_ID = 1
+FIRST_USER_ID = 1000
+CHARGE_AMOUNT = "5000"
+BROADCAST_TEXT = "Load test broadcast"
+STEP_TIMEOUT = 60  # Seconds a step may take before its flow counts as failed
+
+# The bot reads its settings at import, everything points at the fakes and
+# at a throwaway working directory before the first bot module is imported
+# Paths given on the command line are relative to where it was run
+INVOKED_FROM = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+os.environ.update(
+    {
+        "BOT_TOKEN": "123456:fake-token",
+        "BOT_API_BASE_URL": f"http://127.0.0.1:{BOT_API_PORT}/bot",
+        "G2BULK_BASE_URL": f"http://127.0.0.1:{G2BULK_PORT}/v1",
+        "G2BULK_API_KEY": "fake-key",
+        "DB_PATH": os.path.abspath("e2e_load_test.sqlite3"),
+        "PERSISTENCE_PATH": os.path.abspath("data/persistence.sqlite3"),
+        "OWNER_ID": str(OWNER_ID),
+        "API_ID": "1",
+        "ERRORS_CHANNEL": "-100",
+        "API_PURCHASES_ARCHIVE_CHANNEL": "-101",
+        "CHARGING_BALANCE_ORDERS_ARCHIVE_CHANNEL": "-102",
+        "MANUAL_PURCHASES_ARCHIVE_CHANNEL": "-103",
+        "BOT_MODE": "polling",
+        "WORKERS": "1",
+        "METRICS_PORT": "0",
+    }
+)
+os.environ.pop("WORKER_INDEX", None)
+os.environ.pop("UPDATE_LOG_PATH", None)
+
+from telegram import Update
+from telegram.warnings import PTBUserWarning
+
+# The per_message notes of every conversation would bury the report
+warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+from fake_bot_api_server import FakeBotAPI
+from fake_g2bulk_server import GAMES, FakeG2Bulk
+from common.common import create_folders
+from services.update_recorder import update_recorder, update_recorder_handler
+import handlers
+import models
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "sendVideo"}
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+class LockErrors(logging.Handler):
+    """Counts the "database is locked" errors logged anywhere"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        text = record.getMessage()
+        if record.exc_info:
+            text += str(record.exc_info[1])
+        if "database is locked" in text:
+            self.count += 1
+
+
+class StepFailed(Exception):
+    pass
+
+
+def to_chat(chat_id: int, button: str = None, methods: set = None):
+    """Predicate of a call to chat_id, with a button whose callback data
+    contains button if given"""
+
+    def predicate(method, data, result):
+        return (
+            str(data.get("chat_id")) == str(chat_id)
+            and (methods is None or method in methods)
+            and (button is None or button in (data.get("reply_markup") or ""))
+        )
+
+    return predicate
+
+
+class Actor:
+    """A Telegram user talking to the bot, each step sends one update and
+    waits for the bot's call that answers it"""
+
+    def __init__(self, api: FakeBotAPI, user_id: int, latencies: dict):
+        self.api = api
+        self.user_id = user_id
+        self.latencies = latencies
+        # The last message of the bot in the chat, the one buttons are on
+        self.message = None
+
+    def remember(self, method: str, data: dict, result):
+        if isinstance(result, dict):
+            self.message = result
+        elif self.message and method == "editMessageText":
+            self.message = {**self.message, "text": data.get("text", "")}
+
+    async def step(self, name: str, update: dict, predicate) -> tuple:
+        callback_id = update.get("callback_query", {}).get("id")
+
+        def answered(method, data, result):
+            if predicate(method, data, result):
+                return True
+            # An alert instead of the expected answer ends the flow
+            return (
+                callback_id is not None
+                and method == "answerCallbackQuery"
+                and data.get("callback_query_id") == callback_id
+                and data.get("show_alert") in ("true", "True", True)
+            )
+
+        start = len(self.api.requests)
+        started = time.perf_counter()
+        self.api.push_update(update)
+        try:
+            index = await self.api.wait_for(answered, start, STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise StepFailed(f"{name}: no answer in {STEP_TIMEOUT}s")
+        method, data, result = self.api.requests[index]
+        if not predicate(method, data, result):
+            raise StepFailed(f"{name}: {data.get('text')}")
+        self.latencies[name].append(time.perf_counter() - started)
+        self.remember(method, data, result)
+        return method, data, result
+
+    async def send(self, name: str, text: str, predicate):
+        return await self.step(name, self.api.message_update(self.user_id, text), predicate)
+
+    async def press(self, name: str, data: str, predicate):
+        update = self.api.callback_update(self.user_id, data, self.message)
+        return await self.step(name, update, predicate)
+
+
+def seed() -> tuple:
+    """Games to sell and a payment method to charge with, returns the ids
+    of the payment method and its address"""
+    with models.session_scope() as s:
+        for game in GAMES:
+            s.add(
+                models.ApiGame(
+                    api_game_code=game["code"],
+                    api_game_name=game["name"],
+                    is_active=True,
+                )
+            )
+        s.add(models.GeneralSettings(usd_to_sudan_rate=1000))
+        payment_method = models.PaymentMethod(
+            name="Load Test Bank", type=models.PaymentMethodType.BANK_TRANSFER
+        )
+        s.add(payment_method)
+        s.flush()
+        address = models.PaymentMethodAddress(
+            payment_method_id=payment_method.id,
+            address="0000-0000",
+            label="Main account",
+        )
+        s.add(address)
+        s.flush()
+        return payment_method.id, address.id
+
+
+async def user_flow(
+    api: FakeBotAPI,
+    user_id: int,
+    approved: asyncio.Event,
+    payment: tuple,
+    latencies: dict,
+) -> bool:
+    pm_id, address_id = payment
+    user = Actor(api, user_id, latencies)
+    try:
+        await user.send("start", "/start", to_chat(user_id, "instant_purchase"))
+        await user.press("profile", "user_profile", to_chat(user_id, "charge_balance"))
+        await user.press(
+            "charge_balance", "charge_balance", to_chat(user_id, "back_to_user_profile")
+        )
+        await user.send("charge_amount", CHARGE_AMOUNT, to_chat(user_id, "charge_pm_"))
+        await user.press("payment_method", f"charge_pm_{pm_id}", to_chat(user_id, "charge_addr_"))
+        await user.press(
+            "payment_address",
+            f"charge_addr_{address_id}",
+            to_chat(user_id, "back_to_charge_balance_addr"),
+        )
+        await user.step(
+            "payment_proof",
+            api.photo_update(user_id, f"proof-{user_id}"),
+            to_chat(user_id, "instant_purchase"),
+        )
+        started = time.perf_counter()
+        await asyncio.wait_for(approved.wait(), STEP_TIMEOUT)
+        latencies["approval_wait"].append(time.perf_counter() - started)
+        await user.press("instant_purchase", "instant_purchase", to_chat(user_id, "api_game_"))
+        await user.send("search", "pubg", to_chat(user_id, "api_denom_0"))
+        await user.press("denomination", "api_denom_0", to_chat(user_id, "back_to_api_denom"))
+        await user.send("player_id", "12345678", to_chat(user_id, "instant_purchase"))
+        return True
+    except (StepFailed, asyncio.TimeoutError) as e:
+        print(f"User {user_id} failed at {e or 'approval_wait'}")
+        return False
+
+
+async def approve_charging_orders(api: FakeBotAPI, approved: dict, latencies: dict):
+    """The owner approves every charging order notification as it arrives"""
+    owner = Actor(api, OWNER_ID, latencies)
+    cursor = 0
+    notification = to_chat(OWNER_ID, "change_status_charging_", SEND_METHODS)
+    while True:
+        try:
+            index = await api.wait_for(notification, cursor, STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            continue
+        cursor = index + 1
+        method, data, result = api.requests[index]
+        order_id = int(
+            re.search(r"change_status_charging_(\d+)", data["reply_markup"]).group(1)
+        )
+        owner.message = result
+        try:
+            await owner.press(
+                "admin_open_order",
+                f"change_status_charging_{order_id}",
+                to_chat(OWNER_ID, "set_order_status_charging_completed"),
+            )
+            update = api.callback_update(
+                OWNER_ID, "set_order_status_charging_completed", owner.message
+            )
+            callback_id = update["callback_query"]["id"]
+            await owner.step(
+                "admin_approve",
+                update,
+                lambda method, data, result: method == "answerCallbackQuery"
+                and data.get("callback_query_id") == callback_id,
+            )
+        except StepFailed as e:
+            print(f"Approving charging order {order_id} failed at {e}")
+            continue
+        with models.session_scope() as s:
+            user_id = s.get(models.ChargingBalanceOrder, order_id).user_id
+        approved[user_id].set()
+
+
+async def broadcast(api: FakeBotAPI, user_ids: list, latencies: dict) -> float:
+    """The owner broadcasts to all users, returns the seconds until every
+    one of them got it"""
+    owner = Actor(api, OWNER_ID, latencies)
+    await owner.send("admin", "/admin", to_chat(OWNER_ID, "broadcast"))
+    await owner.press("broadcast", "broadcast", to_chat(OWNER_ID, methods={"editMessageText"}))
+    await owner.send("broadcast_message", BROADCAST_TEXT, to_chat(OWNER_ID, "all_users"))
+    start = len(api.requests)
+    started = time.perf_counter()
+    await owner.press(
+        "broadcast_target", "all_users", to_chat(OWNER_ID, methods={"editMessageText"})
+    )
+    for user_id in user_ids:
+        await api.wait_for(
+            lambda method, data, result, user_id=user_id: method == "sendMessage"
+            and data.get("chat_id") == str(user_id)
+            and data.get("text") == BROADCAST_TEXT,
+            start,
+            STEP_TIMEOUT,
+        )
+    return time.perf_counter() - started
+
+
+def report(latencies: dict):
+    print(f"{'step':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, values in latencies.items():
+        if len(values) > 1:
+            cuts = quantiles(values, n=100, method="inclusive")
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = values[0]
+        print(
+            f"{name:<20}{len(values):>7}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}"
+            f"{p99 * 1000:>10.0f}{max(values) * 1000:>10.0f}"
+        )
+
+
+async def start_bot(bot_latency: float, g2bulk_latency: float, record: str = None) -> tuple:
+    """Start the fakes and the application on a seeded database, returns
+    the fakes, the application and the seeded payment ids. With record the
+    incoming updates are logged there for test/replay_updates.py"""
+    api = FakeBotAPI(latency=bot_latency)
+    g2bulk = FakeG2Bulk(latency=g2bulk_latency)
+    await api.start(port=BOT_API_PORT)
+    await g2bulk.start(port=G2BULK_PORT)
+
+    create_folders()
+    models.init_db()
+    payment = seed()
+
+    app = handlers.build_app()
+    if record:
+        update_recorder.path = os.path.join(INVOKED_FROM, record)
+        app.add_handler(update_recorder_handler, group=-2)
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    await app.start()
+    return api, g2bulk, app, payment
+
+
+async def stop_bot(api: FakeBotAPI, g2bulk: FakeG2Bulk, app):
+    await app.updater.stop()
+    await app.stop()
+    await app.shutdown()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    await api.stop()
+    await g2bulk.stop()
+
+
+async def main(args):
+    lock_errors = LockErrors()
+    logging.getLogger().addHandler(lock_errors)
+
+    api, g2bulk, app, payment = await start_bot(
+        args.bot_latency, args.g2bulk_latency, args.record
+    )
+
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+    approved = {user_id: asyncio.Event() for user_id in user_ids}
+    latencies = defaultdict(list)
+    approver = asyncio.create_task(approve_charging_orders(api, approved, latencies))
+
+    async def ramped_flow(i: int, user_id: int) -> bool:
+        await asyncio.sleep(args.ramp * i / max(1, args.users))
+        return await user_flow(api, user_id, approved[user_id], payment, latencies)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(ramped_flow(i, user_id) for i, user_id in enumerate(user_ids))
+    )
+    flows_elapsed = time.perf_counter() - started
+    approver.cancel()
+
+    broadcast_elapsed = None
+    try:
+        broadcast_elapsed = await broadcast(api, user_ids, latencies)
+    except (StepFailed, asyncio.TimeoutError) as e:
+        print(f"Broadcast failed at {e or 'delivery'}")
+
+    await stop_bot(api, g2bulk, app)
+
+    with models.session_scope() as s:
+        approved_orders = (
+            s.query(models.ChargingBalanceOrder)
+            .filter(models.ChargingBalanceOrder.status == models.ChargingOrderStatus.COMPLETED)
+            .count()
+        )
+        api_orders = s.query(models.ApiPurchaseOrder).count()
+
+    completed = sum(results)
+    steps = sum(len(values) for values in latencies.values())
+    print()
+    report(latencies)
+    print()
+    print(f"{completed}/{args.users} flows completed in {flows_elapsed:.1f}s")
+    print(f"Throughput: {completed / flows_elapsed:.2f} flows/s, {steps / flows_elapsed:.1f} steps/s")
+    print(f"Bot API calls: {len(api.requests)}, G2Bulk calls: {sum(g2bulk.calls.values())}")
+    if broadcast_elapsed is not None:
+        print(
+            f"Broadcast to {len(user_ids)} users delivered in {broadcast_elapsed:.2f}s "
+            f"({len(user_ids) / broadcast_elapsed:.1f} messages/s)"
+        )
+    print(f"Database lock errors: {lock_errors.count}")
+    # ru_maxrss is in KiB on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    print()
+
+    check("every flow completed", completed == args.users)
+    check("every charging order approved", approved_orders == args.users)
+    check("every instant purchase ordered", api_orders == args.users)
+    check("broadcast reached every user", broadcast_elapsed is not None)
+    check("no database lock errors", lock_errors.count == 0)
+    print(f"\n{check.failures} failure(s)")
+    sys.exit(1 if check.failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end load test of the bot")
+    parser.add_argument("--users", type=int, default=20, help="simulated users")
+    parser.add_argument("--bot-latency", type=float, default=0.05)
+    parser.add_argument("--g2bulk-latency", type=float, default=0.1)
+    parser.add_argument(
+        "--ramp", type=float, default=2, help="seconds over which the users start"
+    )
+    parser.add_argument("--record", help="log the updates sent to the bot to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,215 @@
+"""Local fake of the Telegram Bot API with injectable latency.
+
+Run it standalone and point the bot at it with
+BOT_API_BASE_URL=http://127.0.0.1:8082/bot:
+
+    python test/fake_bot_api_server.py --port 8082 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from aiohttp import web
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "Fake Bot",
+    "username": "fake_bot",
+}
+
+
+class FakeBotAPI:
+    """In-process fake Bot API server.
+
+    Every method answers after latency seconds. getUpdates returns the
+    updates queued with push_update(), holding the request for its long
+    polling timeout while there are none. Sent messages are recorded in
+    sent, every other call too in requests (wait_for() waits for one,
+    wait_idle() until the bot is done), max_open tracks the highest number of requests served at the same time.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.calls = Counter()
+        self.sent = []
+        self.requests = []
+        self._new_request = asyncio.Event()
+        self.open = 0
+        self.max_open = 0
+        self._message_id = 0
+        self._updates = []
+        # Updates with a lower id were confirmed by the bot
+        self.offset = 0
+        self._new_update = asyncio.Event()
+        self._runner = None
+
+    def push_update(self, update: dict) -> int:
+        """Queue an update for getUpdates, update_id is filled in"""
+        update_id = len(self._updates) + 1
+        self._updates.append({**update, "update_id": update_id})
+        self._new_update.set()
+        return update_id
+
+    def message_update(self, user_id: int, text: str) -> dict:
+        """A private text message update from user_id"""
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        return {
+            "message": {
+                **self._message(user_id),
+                "from": user,
+                "text": text,
+                "entities": (
+                    [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                    if text.startswith("/")
+                    else []
+                ),
+            }
+        }
+
+    def callback_update(self, user_id: int, data: str, message: dict) -> dict:
+        """A press of the inline button with callback data on message"""
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+        self._message_id += 1
+        return {
+            "callback_query": {
+                "id": str(self._message_id),
+                "from": user,
+                "chat_instance": str(user_id),
+                "message": message,
+                "data": data,
+            }
+        }
+
+    def photo_update(self, user_id: int, file_id: str) -> dict:
+        """A private photo message from user_id"""
+        update = self.message_update(user_id, "")
+        message = update["message"]
+        del message["text"], message["entities"]
+        message["photo"] = [
+            {"file_id": file_id, "file_unique_id": file_id, "width": 100, "height": 100}
+        ]
+        return update
+
+    async def wait_idle(self, quiet: float = 1, timeout: float = 60):
+        """Wait until the bot fetched every update and made no call for
+        quiet seconds"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            count = len(self.requests)
+            await asyncio.sleep(quiet)
+            if self.offset > len(self._updates) and count == len(self.requests):
+                return
+        raise asyncio.TimeoutError()
+
+    async def wait_for(self, predicate, start: int = 0, timeout: float = 30) -> int:
+        """Index of the first call in requests from start on that predicate
+        accepts, predicate gets (method, data, result)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            for index in range(start, len(self.requests)):
+                if predicate(*self.requests[index]):
+                    return index
+            start = len(self.requests)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            self._new_request.clear()
+            try:
+                await asyncio.wait_for(self._new_request.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _get_updates(self, data) -> list:
+        offset = int(data.get("offset") or 0)
+        self.offset = max(self.offset, offset)
+        deadline = time.monotonic() + float(data.get("timeout") or 0)
+        while True:
+            pending = [u for u in self._updates if u["update_id"] >= offset]
+            remaining = deadline - time.monotonic()
+            if pending or remaining <= 0:
+                return pending
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _message(self, chat_id) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+        }
+
+    async def method(self, request: web.Request):
+        method = request.match_info["method"]
+        data = await request.post()
+        self.calls[method] += 1
+        self.open += 1
+        self.max_open = max(self.max_open, self.open)
+        try:
+            if method == "getUpdates":
+                await asyncio.sleep(self.latency)
+                return web.json_response({"ok": True, "result": await self._get_updates(data)})
+            await asyncio.sleep(self.latency)
+            if method == "getMe":
+                result = BOT_USER
+            elif method == "getChat":
+                result = {
+                    "id": int(data["chat_id"]),
+                    "type": "private",
+                    "first_name": "Owner",
+                    "accent_color_id": 0,
+                    "max_reaction_count": 11,
+                }
+            elif method.startswith("send"):
+                self.sent.append((method, dict(data)))
+                result = {**self._message(data.get("chat_id", 0)), "text": data.get("text", "")}
+                # Sent messages come back with their inline keyboard only
+                reply_markup = json.loads(data.get("reply_markup") or "{}")
+                if "inline_keyboard" in reply_markup:
+                    result["reply_markup"] = reply_markup
+                if method == "sendPhoto":
+                    file_id = str(data.get("photo"))
+                    result["photo"] = [
+                        {"file_id": file_id, "file_unique_id": file_id, "width": 100, "height": 100}
+                    ]
+            else:
+                result = True
+            self.requests.append((method, dict(data), result))
+            self._new_request.set()
+            return web.json_response({"ok": True, "result": result})
+        finally:
+            self.open -= 1
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.method)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to use as BOT_API_BASE_URL"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/bot"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0)
+    args = parser.parse_args()
+    web.run_app(FakeBotAPI(latency=args.latency).app(), host=args.host, port=args.port)
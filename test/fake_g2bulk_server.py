@@ -0,0 +1,205 @@
+"""Local fake of the G2Bulk API with injectable latency and errors.
+
+Run it standalone and point the bot at it with
+G2BULK_BASE_URL=http://127.0.0.1:8081/v1:
+
+    python test/fake_g2bulk_server.py --port 8081 --latency 0.2 --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter, defaultdict, deque
+from aiohttp import web
+
+GAMES = [
+    {"code": "pubgm", "name": "PUBG Mobile"},
+    {"code": "mlbb", "name": "Mobile Legends"},
+    {"code": "freefire", "name": "Free Fire"},
+]
+CATALOGUES = {
+    "pubgm": [
+        {"name": "60 UC", "amount": 0.99},
+        {"name": "325 UC", "amount": 4.99},
+        {"name": "660 UC", "amount": 9.99},
+    ],
+    "mlbb": [
+        {"name": "86 Diamonds", "amount": 1.5},
+        {"name": "172 Diamonds", "amount": 3.0},
+    ],
+    "freefire": [
+        {"name": "100 Diamonds", "amount": 1.0},
+    ],
+}
+SERVERS = {"mlbb": {"Asia": "asia", "Europe": "eu"}}
+
+
+class FakeG2Bulk:
+    """In-process fake G2Bulk server.
+
+    Faults are queued per endpoint with inject() and consumed one per
+    request. latency and error_rate apply to every request on top of that.
+    Faults injected with lost_response=True replace the response of a
+    request that was carried out.
+    """
+
+    def __init__(self, latency: float = 0, error_rate: float = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.orders = {}
+        self.balance = 1000.0
+        self._faults = defaultdict(deque)
+        self._runner = None
+
+    def inject(
+        self,
+        endpoint: str,
+        status: int = None,
+        delay: float = 0,
+        body: str = None,
+        times: int = 1,
+        lost_response: bool = False,
+    ):
+        """Make the next `times` requests to endpoint slow and/or fail"""
+        for _ in range(times):
+            self._faults[endpoint].append((status, delay, body, lost_response))
+
+    @web.middleware
+    async def _faults_middleware(self, request: web.Request, handler):
+        # Route names use dots, faults are keyed like the client's endpoints
+        endpoint = request.match_info.route.name.replace(".", "/")
+        self.calls[endpoint] += 1
+        status, delay, body, lost_response = (None, 0, None, False)
+        if self._faults[endpoint]:
+            status, delay, body, lost_response = self._faults[endpoint].popleft()
+        if lost_response:
+            await handler(request)
+        await asyncio.sleep(delay + self.latency)
+        if status is None and random.random() < self.error_rate:
+            status = 503
+        if status is not None:
+            if body is not None:
+                return web.Response(status=status, text=body, content_type="text/html")
+            return web.json_response({"message": f"Injected {status}"}, status=status)
+        return await handler(request)
+
+    async def get_me(self, request: web.Request):
+        return web.json_response({"success": True, "balance": self.balance})
+
+    async def games(self, request: web.Request):
+        return web.json_response({"success": True, "games": GAMES})
+
+    async def fields(self, request: web.Request):
+        return web.json_response({"success": True, "fields": ["user_id"]})
+
+    async def servers(self, request: web.Request):
+        data = await request.json()
+        servers = SERVERS.get(data.get("game"))
+        if servers is None:
+            return web.json_response({"message": "Servers not required"}, status=403)
+        return web.json_response({"success": True, "servers": servers})
+
+    async def check_player_id(self, request: web.Request):
+        data = await request.json()
+        valid = str(data.get("user_id", "")).isdigit()
+        return web.json_response(
+            {
+                "valid": "valid" if valid else "invalid",
+                "name": f"Player{data.get('user_id')}" if valid else None,
+            }
+        )
+
+    async def catalogue(self, request: web.Request):
+        code = request.match_info["game_code"]
+        if code not in CATALOGUES:
+            return web.json_response({"message": "Game not found"}, status=404)
+        game = next(game for game in GAMES if game["code"] == code)
+        return web.json_response(
+            {"success": True, "game": game, "catalogues": CATALOGUES[code]}
+        )
+
+    async def create_order(self, request: web.Request):
+        code = request.match_info["game_code"]
+        data = await request.json()
+        catalogue = next(
+            (c for c in CATALOGUES.get(code, []) if c["name"] == data.get("catalogue_name")),
+            None,
+        )
+        if catalogue is None:
+            return web.json_response({"message": "Catalogue not available"}, status=400)
+        if self.balance < catalogue["amount"]:
+            return web.json_response({"message": "Insufficient balance"}, status=400)
+        self.balance -= catalogue["amount"]
+        order_id = len(self.orders) + 1
+        order = {
+            "order_id": order_id,
+            "game": code,
+            "catalogue_name": catalogue["name"],
+            "player_id": data.get("player_id"),
+            "player_name": f"Player{data.get('player_id')}",
+            "remark": data.get("remark"),
+            "status": "PENDING",
+        }
+        self.orders[order_id] = order
+        return web.json_response(
+            {"success": True, "message": "Order created", "order": order}
+        )
+
+    async def order_status(self, request: web.Request):
+        data = await request.json()
+        order = self.orders.get(data.get("order_id"))
+        if order is None:
+            return web.json_response({"message": "Order not found"}, status=404)
+        return web.json_response({"success": True, "order": order})
+
+    async def orders_list(self, request: web.Request):
+        return web.json_response({"success": True, "orders": list(self.orders.values())})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults_middleware])
+        app.router.add_get("/v1/getMe", self.get_me, name="getMe")
+        app.router.add_get("/v1/games", self.games, name="games")
+        app.router.add_post("/v1/games/fields", self.fields, name="games.fields")
+        app.router.add_post("/v1/games/servers", self.servers, name="games.servers")
+        app.router.add_post(
+            "/v1/games/checkPlayerId", self.check_player_id, name="games.checkPlayerId"
+        )
+        app.router.add_post(
+            "/v1/games/order/status", self.order_status, name="games.order.status"
+        )
+        app.router.add_get("/v1/games/orders", self.orders_list, name="games.orders")
+        app.router.add_get(
+            "/v1/games/{game_code}/catalogue", self.catalogue, name="games.catalogue"
+        )
+        app.router.add_post(
+            "/v1/games/{game_code}/order", self.create_order, name="games.order"
+        )
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to use as G2BULK_BASE_URL"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake G2Bulk API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+    web.run_app(
+        FakeG2Bulk(latency=args.latency, error_rate=args.error_rate).app(),
+        host=args.host,
+        port=args.port,
+    )
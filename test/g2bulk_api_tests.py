@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import asyncio
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+os.environ.setdefault("G2BULK_API_KEY", "test-key")
+
+from fake_g2bulk_server import FakeG2Bulk
+from services.g2bulk_api import (
+    G2BulkAPI,
+    CircuitBreaker,
+    G2BulkOutcomeUnknown,
+    G2BulkUnavailable,
+)
+from services.catalogue_cache import CatalogueCache
+import services.g2bulk_api as g2bulk_api
+
+
+def make_api(breaker: CircuitBreaker = None, **timeouts) -> G2BulkAPI:
+    api = G2BulkAPI(breaker=breaker or CircuitBreaker(100, 60))
+    api.RETRY_BASE_DELAY = 0.01
+    api.TIMEOUTS = {**G2BulkAPI.TIMEOUTS, **timeouts}
+    api.hedge_delay = 0
+    return api
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+async def test_timeouts_and_retries(server: FakeG2Bulk):
+    api = make_api(games=0.2)
+
+    server.inject("games", delay=0.5)
+    server.calls.clear()
+    games = await api.get_games()
+    check("slow read times out and is retried", len(games) == 3 and server.calls["games"] == 2)
+
+    server.inject("games", status=503, times=2)
+    server.calls.clear()
+    games = await api.get_games()
+    check("5xx is retried until success", len(games) == 3 and server.calls["games"] == 3)
+
+    server.inject("games", status=502, body="<html>Bad Gateway</html>", times=3)
+    try:
+        await api.get_games()
+        check("non-JSON error page raises API Error", False)
+    except Exception as e:
+        check("non-JSON error page raises API Error", "Bad Gateway" in str(e))
+
+
+async def test_orders_are_not_retried(server: FakeG2Bulk):
+    api = make_api()
+    server.inject("games/order", status=503)
+    server.calls.clear()
+    try:
+        await api.create_game_order("pubgm", "60 UC", "123")
+    except Exception:
+        pass
+    check("order creation is sent once", server.calls["games/order"] == 1)
+
+    api = make_api(**{"games/order": 0.2})
+    server.inject("games/order", delay=0.5, lost_response=True)
+    try:
+        await api.create_game_order("pubgm", "60 UC", "123", remark="ref-1")
+        check("timed out order creation has an unknown outcome", False)
+    except G2BulkOutcomeUnknown:
+        orders = await api.get_orders()
+        check(
+            "timed out order creation has an unknown outcome",
+            any(order["remark"] == "ref-1" for order in orders),
+        )
+
+    server.inject("games/order", status=502)
+    try:
+        await api.create_game_order("pubgm", "60 UC", "123")
+        check("5xx on order creation has an unknown outcome", False)
+    except G2BulkOutcomeUnknown:
+        check("5xx on order creation has an unknown outcome", True)
+
+    server.inject("games/order", status=429)
+    try:
+        await api.create_game_order("pubgm", "60 UC", "123")
+    except G2BulkOutcomeUnknown:
+        check("429 on order creation is a definite failure", False)
+    except Exception:
+        check("429 on order creation is a definite failure", True)
+
+    server.inject("games/checkPlayerId", status=400)
+    server.calls.clear()
+    try:
+        await api.check_player_id("pubgm", "123")
+    except Exception:
+        pass
+    check("4xx is not retried", server.calls["games/checkPlayerId"] == 1)
+
+
+async def test_circuit_breaker(server: FakeG2Bulk):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.5)
+    api = make_api(breaker)
+    api.max_retries = 0
+
+    # The catalogue cache's clients use the module level breaker
+    original_breaker = g2bulk_api.circuit_breaker
+    g2bulk_api.circuit_breaker = breaker
+    cache = CatalogueCache(ttl=0)
+    try:
+        warm = await cache.get_catalogue("pubgm")
+
+        server.inject("getMe", status=500, times=3)
+        for _ in range(3):
+            try:
+                await api.get_me()
+            except Exception:
+                pass
+        check("breaker opens after consecutive failures", breaker.state == breaker.OPEN)
+
+        server.calls.clear()
+        started = time.monotonic()
+        try:
+            await api.get_games()
+            check("open breaker fails fast", False)
+        except G2BulkUnavailable:
+            check(
+                "open breaker fails fast",
+                server.calls["games"] == 0 and time.monotonic() - started < 0.05,
+            )
+
+        served = await cache.get_catalogue("pubgm")
+        check("cached catalogue is served while open", served.version == warm.version)
+
+        await asyncio.sleep(0.6)
+        balance = await api.get_me()
+        check(
+            "probe after reset timeout closes the breaker",
+            "balance" in balance and breaker.state == breaker.CLOSED,
+        )
+    finally:
+        g2bulk_api.circuit_breaker = original_breaker
+
+
+async def test_hedging(server: FakeG2Bulk):
+    api = make_api()
+
+    server.inject("games/catalogue", delay=1)
+    started = time.monotonic()
+    await api.get_game_catalogue("pubgm")
+    unhedged = time.monotonic() - started
+
+    api.hedge_delay = 0.1
+    server.inject("games/catalogue", delay=1)
+    server.calls.clear()
+    started = time.monotonic()
+    await api.get_game_catalogue("pubgm")
+    hedged = time.monotonic() - started
+
+    print(f"Slow catalogue call: {unhedged:.2f}s unhedged, {hedged:.2f}s hedged")
+    check(
+        "hedged read cuts tail latency",
+        hedged < 0.5 and server.calls["games/catalogue"] == 2,
+    )
+
+
+async def main():
+    server = FakeG2Bulk()
+    base_url = await server.start()
+    G2BulkAPI.BASE_URL = base_url
+    try:
+        await test_timeouts_and_retries(server)
+        await test_orders_are_not_retried(server)
+        await test_circuit_breaker(server)
+        await test_hedging(server)
+    finally:
+        await server.stop()
+    print(f"\nFailures: {check.failures}")
+
+
+asyncio.run(main())
@@ -0,0 +1,169 @@
+"""Query budget of rendering orders.
+
+Seeds orders of every kind against a throwaway database and counts the SQL
+statements it takes to load and render them the way the handlers do: an
+order view with stringify() and its user's stringify() must take the one
+query loading the order with its render preset (models.*_ORDER_RENDER),
+and an orders list the same number of queries whatever its length.
+
+    python test/order_rendering_query_budget.py
+"""
+
+import os
+import sys
+import tempfile
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "query_budget.sqlite3")
+
+import models
+from models.DB import engine
+from admin.orders_settings.keyboards import build_orders_list_keyboard
+
+ORDERS = 30  # Orders of each kind, each of its own user
+LANG = models.Language.ENGLISH
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def seed():
+    with models.session_scope() as s:
+        for i in range(1, ORDERS + 1):
+            s.add(models.User(user_id=i, name=f"User{i}", username=f"user{i}"))
+            method = models.PaymentMethod(
+                name=f"Method{i}", type=models.PaymentMethodType.BANK_TRANSFER
+            )
+            address = models.PaymentMethodAddress(
+                payment_method=method, label=f"Label{i}", address=f"Address{i}"
+            )
+            game = models.Game(name=f"Game{i}", code=f"game_{i}", is_active=True)
+            item = models.Item(
+                game=game,
+                name=f"Item{i}",
+                item_type=models.ItemType.GAME_ITEM,
+                price=10,
+                stock_quantity=1,
+                is_active=True,
+            )
+            api_game = models.ApiGame(api_game_code=f"api_{i}", api_game_name=f"Api{i}")
+            s.add_all([method, address, game, item, api_game])
+            s.add(
+                models.ChargingBalanceOrder(
+                    user_id=i, payment_method_address=address, amount=1000
+                )
+            )
+            s.add(models.PurchaseOrder(user_id=i, item=item, game_account_id="1"))
+            s.add(
+                models.ApiPurchaseOrder(
+                    user_id=i,
+                    api_order_id=i,
+                    api_game_code=f"api_{i}",
+                    denomination_name="60 UC",
+                    player_id="12345678",
+                    price_usd=1,
+                    price_sudan=1000,
+                )
+            )
+
+
+def render(order) -> str:
+    return order.stringify(LANG) + order.user.stringify(LANG)
+
+
+def check_view(counter: QueryCounter, model, preset):
+    with counter, models.session_scope() as s:
+        order = s.get(model, ORDERS, options=preset)
+        render(order)
+    # The commit closing the scope isn't a statement
+    check(f"{model.__name__} view takes 1 query", counter.count == 1)
+
+    with counter, models.session_scope() as s:
+        render(s.get(model, ORDERS))
+    check(f"{model.__name__} view lazy loads without its preset", counter.count > 1)
+
+
+def check_list(counter: QueryCounter, model, options: list):
+    counts = []
+    for limit in (1, ORDERS):
+        with counter, models.session_scope() as s:
+            orders = s.query(model).options(*options).limit(limit).all()
+            for order in orders:
+                render(order)
+        counts.append(counter.count)
+    check(
+        f"{model.__name__} list of {ORDERS} takes the queries of a list of 1",
+        counts[0] == counts[1] == 1,
+    )
+
+
+def check_list_keyboard(counter: QueryCounter, model, option):
+    counts = []
+    for limit in (1, ORDERS):
+        with counter, models.session_scope() as s:
+            orders = s.query(model).options(option).limit(limit).all()
+            build_orders_list_keyboard(
+                orders=orders,
+                lang=LANG,
+                page=0,
+                total_pages=1,
+                callback_prefix="view_",
+                back_callback="back",
+            )
+        counts.append(counter.count)
+    check(f"{model.__name__} list keyboard takes 1 query", counts[0] == counts[1] == 1)
+
+
+def main():
+    models.init_db()
+    seed()
+    counter = QueryCounter()
+
+    check_view(counter, models.ChargingBalanceOrder, models.CHARGING_ORDER_RENDER)
+    check_view(counter, models.PurchaseOrder, models.PURCHASE_ORDER_RENDER)
+    check_view(counter, models.ApiPurchaseOrder, models.API_PURCHASE_ORDER_RENDER)
+
+    check_list(counter, models.ChargingBalanceOrder, models.CHARGING_ORDER_RENDER)
+    check_list(counter, models.PurchaseOrder, models.PURCHASE_ORDER_RENDER)
+    check_list(counter, models.ApiPurchaseOrder, models.API_PURCHASE_ORDER_RENDER)
+
+    # The list handlers only join what the buttons show
+    check_list_keyboard(counter, models.PurchaseOrder, joinedload(models.PurchaseOrder.item))
+    check_list_keyboard(
+        counter, models.ApiPurchaseOrder, joinedload(models.ApiPurchaseOrder.api_game)
+    )
+
+    print(f"\n{check.failures} failures")
+    sys.exit(1 if check.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
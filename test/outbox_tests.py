@@ -0,0 +1,297 @@
+"""Outbox dispatcher.
+
+Runs OutboxDispatcher against a throwaway database with _send replaced by a
+stub that records the messages and raises the errors it is given per chat,
+and checks the state each row is left in.
+
+    python test/outbox_tests.py
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "outbox.sqlite3")
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from services.outbox import (
+    DIGEST_SEPARATOR,
+    MAX_MESSAGE_LENGTH,
+    OutboxDispatcher,
+    enqueue,
+)
+import models
+
+CHANNEL_ID = -1001
+
+
+class StubDispatcher(OutboxDispatcher):
+    def __init__(self, **kwargs):
+        kwargs.setdefault("chat_interval", 0)
+        kwargs.setdefault("poll_interval", 0.05)
+        kwargs.setdefault("rate_limit", 1000)
+        kwargs.setdefault("digest_chats", {CHANNEL_ID})
+        super().__init__(**kwargs)
+        self.sent = []
+        self.errors = {}
+
+    async def _send(self, chat_id: int, text: str, media: str, media_kind: str):
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+def add_messages(chat_id: int, texts: list) -> list:
+    with models.session_scope() as s:
+        for text in texts:
+            enqueue(s, chat_id, text)
+    with models.session_scope() as s:
+        return [
+            message.id
+            for message in s.query(models.OutboxMessage)
+            .filter(models.OutboxMessage.chat_id == chat_id)
+            .order_by(models.OutboxMessage.id)
+        ]
+
+
+def chat_messages(chat_id: int) -> list:
+    with models.session_scope() as s:
+        messages = (
+            s.query(models.OutboxMessage)
+            .filter(models.OutboxMessage.chat_id == chat_id)
+            .order_by(models.OutboxMessage.id)
+            .all()
+        )
+        s.expunge_all()
+        return messages
+
+
+async def run(dispatcher: StubDispatcher, done, timeout: float = 3):
+    """Run the dispatcher until done() holds or the timeout passes"""
+    await dispatcher.start(None)
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not done() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+        # Give anything that shouldn't be sent the chance to be
+        await asyncio.sleep(0.2)
+    finally:
+        await dispatcher.stop()
+
+
+async def test_chat_order():
+    chat_id = 101
+    texts = [f"message {i}" for i in range(5)]
+    add_messages(chat_id, texts)
+    dispatcher = StubDispatcher(workers=4)
+    await run(dispatcher, lambda: len(dispatcher.sent) == len(texts))
+    check(
+        "messages of a chat are sent in order",
+        [text for _, text in dispatcher.sent] == texts,
+    )
+    check(
+        "sent messages are marked sent",
+        all(
+            message.status == models.OutboxMessageStatus.SENT
+            and message.attempts == 1
+            and message.sent_at
+            for message in chat_messages(chat_id)
+        ),
+    )
+
+
+async def test_retry_after():
+    held, other = 201, 202
+    add_messages(held, ["held 1", "held 2"])
+    add_messages(other, ["other 1", "other 2"])
+    dispatcher = StubDispatcher(workers=1)
+    dispatcher.errors[held] = [RetryAfter(60)]
+    await run(dispatcher, lambda: len(dispatcher.sent) == 2)
+
+    check(
+        "RetryAfter doesn't hold back the other chats",
+        [text for _, text in dispatcher.sent] == ["other 1", "other 2"],
+    )
+    first, second = chat_messages(held)
+    check(
+        "message that got RetryAfter waits for its retry",
+        first.status == models.OutboxMessageStatus.PENDING
+        and first.attempts == 1
+        and (first.next_attempt_at - datetime.now()).total_seconds() > 50,
+    )
+    check(
+        "message after it is held back",
+        second.status == models.OutboxMessageStatus.PENDING and second.attempts == 0,
+    )
+
+
+async def test_backlog_doesnt_starve():
+    channel, dm = -1002, 501
+    batch_size = 10
+    add_messages(channel, [f"post {i}" for i in range(batch_size + 5)])
+    dispatcher = StubDispatcher(
+        workers=1, batch_size=batch_size, digest_chats={channel}, digest_window=0
+    )
+    dispatcher.errors[channel] = [RetryAfter(60)]
+    await dispatcher.start(None)
+    try:
+        while dispatcher.errors[channel]:
+            await asyncio.sleep(0.05)
+        add_messages(dm, ["direct message"])
+        dispatcher.wake()
+        deadline = asyncio.get_running_loop().time() + 3
+        while not dispatcher.sent and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        await dispatcher.stop()
+    check(
+        "a chat held back with more than batch_size pending doesn't starve a DM",
+        dispatcher.sent == [(dm, "direct message")]
+        and chat_messages(dm)[0].status == models.OutboxMessageStatus.SENT,
+    )
+
+
+async def test_failed():
+    blocked, missing = 301, 302
+    add_messages(blocked, ["blocked 1", "blocked 2"])
+    add_messages(missing, ["missing 1"])
+    dispatcher = StubDispatcher()
+    dispatcher.errors[blocked] = [Forbidden("Forbidden: bot was blocked by the user")]
+    dispatcher.errors[missing] = [BadRequest("Chat not found")]
+    await run(dispatcher, lambda: len(dispatcher.sent) == 1)
+
+    first, second = chat_messages(blocked)
+    check(
+        "Forbidden marks the message failed",
+        first.status == models.OutboxMessageStatus.FAILED
+        and "blocked" in first.last_error,
+    )
+    check(
+        "a failed message doesn't hold back the next one",
+        second.status == models.OutboxMessageStatus.SENT,
+    )
+    check(
+        "BadRequest marks the message failed",
+        chat_messages(missing)[0].status == models.OutboxMessageStatus.FAILED,
+    )
+
+
+async def test_max_attempts():
+    chat_id = 401
+    add_messages(chat_id, ["flaky"])
+    with models.session_scope() as s:
+        s.query(models.OutboxMessage).filter(
+            models.OutboxMessage.chat_id == chat_id
+        ).update({models.OutboxMessage.attempts: 1})
+    dispatcher = StubDispatcher(max_attempts=3)
+    dispatcher.errors[chat_id] = [NetworkError("Bad Gateway")] * 3
+
+    await run(dispatcher, lambda: len(dispatcher.errors[chat_id]) == 2)
+    message = chat_messages(chat_id)[0]
+    check(
+        "network error before the last attempt is retried",
+        message.status == models.OutboxMessageStatus.PENDING
+        and message.attempts == 2
+        and message.next_attempt_at > datetime.now(),
+    )
+
+    with models.session_scope() as s:
+        s.get(models.OutboxMessage, message.id).next_attempt_at = datetime.now()
+    await run(dispatcher, lambda: len(dispatcher.errors[chat_id]) == 1)
+    message = chat_messages(chat_id)[0]
+    check(
+        "network error on the last attempt fails the message",
+        message.status == models.OutboxMessageStatus.FAILED
+        and message.attempts == 3
+        and message.last_error == "Bad Gateway",
+    )
+
+
+def test_digest_ids():
+    dispatcher = StubDispatcher()
+    separator = len(DIGEST_SEPARATOR)
+    # Three posts that fill a message up to the last character
+    first = (MAX_MESSAGE_LENGTH - 2 * separator) // 3
+    last = MAX_MESSAGE_LENGTH - 2 * separator - 2 * first
+
+    def rows(*lengths):
+        return [
+            (i, CHANNEL_ID, None, None, None, length)
+            for i, length in enumerate(lengths, start=1)
+        ]
+
+    check(
+        "posts that fill exactly 4096 characters share a digest",
+        dispatcher._digest_ids(rows(first, first, last, 1)) == [1, 2, 3],
+    )
+    check(
+        "a post one character over 4096 starts the next digest",
+        dispatcher._digest_ids(rows(first, first, last + 1)) == [1, 2],
+    )
+    check(
+        "a single post longer than 4096 is still sent",
+        dispatcher._digest_ids(rows(MAX_MESSAGE_LENGTH + 1, 1)) == [1],
+    )
+    check(
+        "a post with media ends the digest",
+        dispatcher._digest_ids(
+            rows(10, 10) + [(3, CHANNEL_ID, None, None, "file-id", 10)]
+        )
+        == [1, 2],
+    )
+
+
+async def test_digest():
+    first = (MAX_MESSAGE_LENGTH - 2 * len(DIGEST_SEPARATOR)) // 3
+    last = MAX_MESSAGE_LENGTH - 2 * len(DIGEST_SEPARATOR) - 2 * first
+    texts = ["a" * first, "b" * first, "c" * last, "d"]
+    add_messages(CHANNEL_ID, texts)
+    dispatcher = StubDispatcher(digest_window=0)
+    await run(dispatcher, lambda: len(dispatcher.sent) == 2)
+    check(
+        "archive posts are coalesced up to 4096 characters",
+        [text for _, text in dispatcher.sent]
+        == [DIGEST_SEPARATOR.join(texts[:3]), texts[3]],
+    )
+    check(
+        "coalesced posts are all marked sent",
+        all(
+            message.status == models.OutboxMessageStatus.SENT
+            for message in chat_messages(CHANNEL_ID)
+        ),
+    )
+
+
+async def main():
+    models.init_db()
+    await test_chat_order()
+    await test_retry_after()
+    await test_backlog_doesnt_starve()
+    await test_failed()
+    await test_max_attempts()
+    test_digest_ids()
+    await test_digest()
+
+    print(f"\n{check.failures} failures")
+    sys.exit(1 if check.failures else 0)
+
+
+asyncio.run(main())
@@ -0,0 +1,141 @@
+"""Rendering cache of RenderingBot.
+
+Drives RenderingBot with the Bot API replaced by a stub that records the
+calls and raises the errors it is given, and checks which edits reach
+Telegram after the cache went stale.
+
+    python test/rendering_tests.py
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+from telegram import Update
+from telegram.error import BadRequest, TimedOut
+from common.rendering import RenderingBot, remember_callback_message, render_stats
+
+CHAT_ID = 1000
+
+
+class StubBot(RenderingBot):
+    def __init__(self):
+        super().__init__(token="1:stub")
+        with self._unfrozen():
+            self.calls = []
+            self.errors = []
+
+    async def _timed_post(self, endpoint: str, data: dict, **kwargs):
+        self.calls.append((endpoint, data.get("text")))
+        if self.errors:
+            raise self.errors.pop(0)
+        return True
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+def callback_update(bot: RenderingBot, message_id: int, text: str) -> Update:
+    return Update.de_json(
+        {
+            "update_id": message_id,
+            "callback_query": {
+                "id": str(message_id),
+                "from": {"id": CHAT_ID, "is_bot": False, "first_name": "User"},
+                "chat_instance": "1",
+                "data": "button",
+                "message": {
+                    "message_id": message_id,
+                    "date": 0,
+                    "chat": {"id": CHAT_ID, "type": "private"},
+                    "text": text,
+                },
+            },
+        },
+        bot,
+    )
+
+
+async def edit(bot: StubBot, message_id: int, text: str) -> bool:
+    """Edit a message and tell whether the edit was sent to Telegram"""
+    calls = len(bot.calls)
+    await bot.edit_message_text(text, chat_id=CHAT_ID, message_id=message_id)
+    return len(bot.calls) > calls
+
+
+async def test_skips_and_not_modified():
+    bot = StubBot()
+    check("first edit is sent", await edit(bot, 1, "one"))
+    check("edit to the rendered content is skipped", not await edit(bot, 1, "one"))
+
+    skipped = render_stats["not_modified_edits"]
+    bot.errors.append(BadRequest("Message is not modified"))
+    check("not modified edit is absorbed", await edit(bot, 1, "two"))
+    check(
+        "not modified edit keeps the rendered content",
+        render_stats["not_modified_edits"] == skipped + 1
+        and not await edit(bot, 1, "two"),
+    )
+
+
+async def test_callback_message_replaces_stale_content():
+    bot = StubBot()
+    await edit(bot, 2, "one")
+    # The message was edited by another worker process meanwhile
+    update = callback_update(bot, 2, "two")
+    await remember_callback_message(update, SimpleNamespace(bot=bot))
+    check("callback message replaces the rendered content", await edit(bot, 2, "one"))
+    check("edit to the callback message's content is skipped", not await edit(bot, 2, "one"))
+
+
+async def test_failed_edit_forgets_content():
+    bot = StubBot()
+    await edit(bot, 3, "one")
+    # Telegram may have applied the edit before the request timed out
+    bot.errors.append(TimedOut())
+    try:
+        await edit(bot, 3, "two")
+        check("timed out edit raises", False)
+    except TimedOut:
+        check("timed out edit raises", True)
+    check("edit after a timed out edit is sent", await edit(bot, 3, "one"))
+
+    bot.errors.append(BadRequest("Message to edit not found"))
+    try:
+        await edit(bot, 3, "two")
+    except BadRequest:
+        pass
+    check("edit after a rejected edit is sent", await edit(bot, 3, "one"))
+
+    bot.errors.append(TimedOut())
+    try:
+        await bot.delete_message(CHAT_ID, 3)
+    except TimedOut:
+        pass
+    check("edit after a timed out delete is sent", await edit(bot, 3, "one"))
+
+
+async def main():
+    await test_skips_and_not_modified()
+    await test_callback_message_replaces_stale_content()
+    await test_failed_edit_forgets_content()
+
+    print(f"\n{check.failures} failures")
+    sys.exit(1 if check.failures else 0)
+
+
+asyncio.run(main())
@@ -0,0 +1,153 @@
+"""Replay recorded updates against fake Telegram and G2Bulk servers.
+
+Feeds update logs written with UPDATE_LOG_PATH (or e2e_load_test.py's
+--record) to the real application at their original pace, or --speed times
+faster, 0 for as fast as it takes them. The database is the throwaway one
+e2e_load_test.py seeds, flows pointing at rows it doesn't have end early.
+The owner is id 1 in the logs and in the replay, other admins are plain
+users.
+
+Reports each handler's latency and SQL statements per update, and saves
+the report with --output to compare the next run against with --compare:
+
+    python test/replay_updates.py updates.log --speed 10 --output before.json
+    python test/replay_updates.py updates.log --speed 10 --compare before.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Points the bot at the fakes and a throwaway directory
+from e2e_load_test import INVOKED_FROM, start_bot, stop_bot
+from common.instrumentation import metrics
+
+
+def read_logs(paths: list) -> list:
+    """(time, update) of every line of the logs, in time order, the logs of
+    the workers of the sharded mode are merged"""
+    entries = []
+    for path in paths:
+        with open(os.path.join(INVOKED_FROM, path), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.append((entry["t"], entry["update"]))
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
+
+def handler_report() -> dict:
+    report = {}
+    for name, latency in metrics.handler_latency.items():
+        queries = metrics.handler_queries[name]
+        report[name] = {
+            "count": latency.count,
+            "mean_ms": latency.mean * 1000,
+            "p50_ms": latency.quantile(0.5) * 1000,
+            "p95_ms": latency.quantile(0.95) * 1000,
+            "p99_ms": latency.quantile(0.99) * 1000,
+            "mean_queries": queries.mean,
+            "max_queries": queries.max,
+            "errors": metrics.handler_errors[name],
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(
+        f"{'handler':<40}{'count':>7}{'mean ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'queries':>9}{'max q':>7}{'errors':>8}"
+    )
+    for name, row in sorted(report.items(), key=lambda item: -item[1]["count"]):
+        print(
+            f"{name:<40}{row['count']:>7}{row['mean_ms']:>9.1f}{row['p95_ms']:>9.0f}"
+            f"{row['p99_ms']:>9.0f}{row['mean_queries']:>9.1f}{row['max_queries']:>7.0f}"
+            f"{row['errors']:>8}"
+        )
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "new" if after else ""
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+def print_comparison(baseline: dict, report: dict):
+    print(f"{'handler':<40}{'mean ms':>25}{'p95 ms':>14}{'queries':>23}")
+    for name in sorted(set(baseline) | set(report)):
+        before = baseline.get(name)
+        after = report.get(name)
+        if not before or not after:
+            print(f"{name:<40}{'only before' if before else 'only after':>25}")
+            continue
+        print(
+            f"{name:<40}"
+            f"{before['mean_ms']:>9.1f}{after['mean_ms']:>9.1f}"
+            f"{change(before['mean_ms'], after['mean_ms']):>7}"
+            f"{before['p95_ms']:>7.0f}{after['p95_ms']:>7.0f}"
+            f"{before['mean_queries']:>8.1f}{after['mean_queries']:>8.1f}"
+            f"{change(before['mean_queries'], after['mean_queries']):>7}"
+        )
+
+
+async def main(args):
+    entries = read_logs(args.logs)
+    if not entries:
+        print("No updates to replay")
+        sys.exit(1)
+    api, g2bulk, app, _ = await start_bot(args.bot_latency, args.g2bulk_latency)
+
+    first = entries[0][0]
+    started = time.monotonic()
+    for t, update in entries:
+        if args.speed:
+            delay = (t - first) / args.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        api.push_update(update)
+    try:
+        await api.wait_idle(timeout=args.timeout)
+    except asyncio.TimeoutError:
+        print(f"The bot was still busy {args.timeout}s after the last update")
+    elapsed = time.monotonic() - started
+
+    await stop_bot(api, g2bulk, app)
+
+    report = handler_report()
+    print(
+        f"\nReplayed {len(entries)} updates spanning {entries[-1][0] - first:.1f}s "
+        f"in {elapsed:.1f}s\n"
+    )
+    print_report(report)
+    if args.output:
+        with open(os.path.join(INVOKED_FROM, args.output), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(os.path.join(INVOKED_FROM, args.compare), encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared to {args.compare} (before, after, change):\n")
+        print_comparison(baseline, report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded updates")
+    parser.add_argument("logs", nargs="+", help="update logs to replay")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="pace factor, 0 replays without waiting"
+    )
+    parser.add_argument("--bot-latency", type=float, default=0.05)
+    parser.add_argument("--g2bulk-latency", type=float, default=0.1)
+    parser.add_argument(
+        "--timeout", type=float, default=120, help="seconds to wait for the bot to finish"
+    )
+    parser.add_argument("--output", help="save the report as JSON")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare to")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,171 @@
+"""Hot-item contention benchmark for the store's stock reservation.
+
+Buyers in parallel threads race for the last units of one item, first with a
+read-check-write purchase, then with reserve_item()'s conditional decrement,
+and report the units sold beyond the stock and the purchases per second.
+Then checks that refunds give units back only for orders that reserved one.
+Runs against a throwaway database:
+
+    python test/stock_contention_benchmark.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "stock_benchmark.sqlite3")
+
+import models
+from user.user_calls.store_catalogue import reserve_item
+
+BUYERS = 32  # Concurrent buyer threads
+ATTEMPTS = 20  # Purchase attempts per buyer
+STOCK = 100  # Units of the hot item
+PRICE = 10
+THINK_TIME = 0.001  # Seconds between the naive purchase's read and write
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+def setup() -> int:
+    with models.session_scope() as s:
+        s.query(models.PurchaseOrder).delete()
+        s.query(models.Item).delete()
+        s.query(models.Game).delete()
+        s.query(models.User).delete()
+        game = models.Game(name="Hot Game", code="hot_game", is_active=True)
+        s.add(game)
+        s.flush()
+        item = models.Item(
+            game_id=game.id,
+            name="Hot Item",
+            item_type=models.ItemType.GAME_ITEM,
+            price=PRICE,
+            stock_quantity=STOCK,
+            is_active=True,
+        )
+        s.add(item)
+        for buyer in range(1, BUYERS + 1):
+            s.add(models.User(user_id=buyer, name=f"Buyer{buyer}", balance=PRICE * ATTEMPTS))
+        s.flush()
+        return item.id
+
+
+def naive_purchase(buyer: int, item_id: int) -> bool:
+    with models.session_scope() as s:
+        item = s.get(models.Item, item_id)
+        user = s.get(models.User, buyer)
+        if item.stock_quantity <= 0 or user.balance < item.price:
+            return False
+        time.sleep(THINK_TIME)
+        item.stock_quantity -= 1
+        user.balance -= item.price
+        s.add(models.PurchaseOrder(user_id=buyer, item_id=item_id, game_account_id="1"))
+    return True
+
+
+def atomic_purchase(buyer: int, item_id: int) -> bool:
+    with models.session_scope() as s:
+        if not reserve_item(s, item_id) or not models.User.charge_balance(
+            s, buyer, PRICE
+        ):
+            s.rollback()
+            return False
+        time.sleep(THINK_TIME)
+        s.add(
+            models.PurchaseOrder(
+                user_id=buyer, item_id=item_id, game_account_id="1", stock_reserved=True
+            )
+        )
+    return True
+
+
+def refunded_stock(reserved: bool) -> int:
+    """Stock change of refunding an order, reserved or placed before stock was"""
+    from admin.orders_settings.handlers import apply_order_status
+
+    with models.session_scope() as s:
+        item = s.query(models.Item).one()
+        order = models.PurchaseOrder(
+            user_id=1, item_id=item.id, game_account_id="1", stock_reserved=reserved
+        )
+        s.add(order)
+        s.flush()
+        stock = item.stock_quantity
+        apply_order_status(
+            s,
+            "purchase",
+            order,
+            s.get(models.User, 1),
+            models.PurchaseOrderStatus.REFUNDED,
+            models.Language.ENGLISH,
+        )
+        s.expire(item)
+        return item.stock_quantity - stock
+
+
+def run(purchase) -> dict:
+    item_id = setup()
+
+    def buyer_thread(buyer: int):
+        for _ in range(ATTEMPTS):
+            purchase(buyer, item_id)
+
+    threads = [
+        threading.Thread(target=buyer_thread, args=(buyer,))
+        for buyer in range(1, BUYERS + 1)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with models.session_scope() as s:
+        orders = s.query(models.PurchaseOrder).count()
+        stock = s.get(models.Item, item_id).stock_quantity
+    result = {
+        "orders": orders,
+        "stock": stock,
+        "oversold": max(0, orders - STOCK),
+        "lost_updates": orders - (STOCK - stock),
+        "per_second": BUYERS * ATTEMPTS / elapsed,
+    }
+    print(
+        f"{purchase.__name__}: {orders} orders for {STOCK} units, stock left {stock}, "
+        f"oversold {result['oversold']}, lost stock updates {result['lost_updates']}, "
+        f"{result['per_second']:.0f} attempts/s"
+    )
+    return result
+
+
+def main():
+    models.init_db()
+    naive = run(naive_purchase)
+    atomic = run(atomic_purchase)
+    check("naive purchase loses stock updates", naive["lost_updates"] > 0 or naive["oversold"] > 0)
+    check("atomic reservation never oversells", atomic["orders"] == STOCK and atomic["oversold"] == 0)
+    check("atomic reservation keeps stock and orders in step", atomic["lost_updates"] == 0 and atomic["stock"] == 0)
+    check("refunding a reserved order gives its unit back", refunded_stock(True) == 1)
+    check("refunding an order that never reserved leaves the stock", refunded_stock(False) == 0)
+    print(f"\n{check.failures} failure(s)")
+    sys.exit(1 if check.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Unconfirmed API orders.
+
+Places an order against the fake G2Bulk with its response lost, and checks
+that the poller finds the order kept pending for it by its remark, leaves
+a recent order that isn't there pending, and fails and refunds an old one.
+Also checks that no database connection is held while the poller and the
+callback reconciliation wait on G2Bulk.
+
+    python test/unconfirmed_api_orders_tests.py
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+os.environ.setdefault("G2BULK_API_KEY", "test-key")
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "unconfirmed_orders.sqlite3")
+
+from fake_g2bulk_server import FakeG2Bulk
+from services.g2bulk_api import G2BulkAPI, G2BulkOutcomeUnknown
+from Config import Config
+from models.DB import engine
+import models
+import jobs
+
+USER_ID = 1000
+PRICE = 2500
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+def add_unconfirmed_order(s, remark: str, age: float = 0):
+    """The row create_api_order keeps for an order with an unknown outcome"""
+    s.add(
+        models.ApiPurchaseOrder(
+            user_id=USER_ID,
+            api_order_id=None,
+            api_game_code="pubgm",
+            denomination_name="60 UC",
+            player_id="123",
+            price_usd=0.99,
+            price_sudan=PRICE,
+            status=models.ApiPurchaseOrderStatus.PENDING,
+            remark=remark,
+            created_at=datetime.now() - timedelta(seconds=age),
+        )
+    )
+
+
+async def main():
+    server = FakeG2Bulk()
+    G2BulkAPI.BASE_URL = await server.start()
+    models.init_db()
+    try:
+        api = G2BulkAPI()
+        api.TIMEOUTS = {**G2BulkAPI.TIMEOUTS, "games/order": 0.2}
+        server.inject("games/order", delay=0.5, lost_response=True)
+        try:
+            await api.create_game_order("pubgm", "60 UC", "123", remark="ref-placed")
+            check("lost order response has an unknown outcome", False)
+        except G2BulkOutcomeUnknown:
+            check("lost order response has an unknown outcome", True)
+
+        timeout = Config.G2BULK_UNCONFIRMED_ORDER_TIMEOUT
+        with models.session_scope() as s:
+            s.add(models.User(user_id=USER_ID, name="User", balance=0))
+            s.add(models.ApiGame(api_game_code="pubgm", api_game_name="PUBG Mobile"))
+            add_unconfirmed_order(s, "ref-placed", age=timeout * 2)
+            add_unconfirmed_order(s, "ref-recent")
+            add_unconfirmed_order(s, "ref-lost", age=timeout * 2)
+
+        await jobs.poll_api_orders_status(None)
+
+        with models.session_scope() as s:
+            orders = {
+                order.remark: order for order in s.query(models.ApiPurchaseOrder).all()
+            }
+            placed_id = next(iter(server.orders))
+            check(
+                "placed order is found by its remark",
+                orders["ref-placed"].api_order_id == placed_id
+                and orders["ref-placed"].status == models.ApiPurchaseOrderStatus.PENDING,
+            )
+            check(
+                "recent order missing upstream stays pending",
+                orders["ref-recent"].api_order_id is None
+                and orders["ref-recent"].status == models.ApiPurchaseOrderStatus.PENDING,
+            )
+            check(
+                "old order missing upstream is failed",
+                orders["ref-lost"].status == models.ApiPurchaseOrderStatus.FAILED,
+            )
+            check(
+                "failed order is refunded once",
+                s.get(models.User, USER_ID).balance == PRICE,
+            )
+
+        # Without the orders list nothing can be told about them
+        server.inject("games/orders", status=503, times=Config.G2BULK_MAX_RETRIES + 1)
+        with models.session_scope() as s:
+            add_unconfirmed_order(s, "ref-unknown", age=timeout * 2)
+        await jobs.poll_api_orders_status(None)
+        with models.session_scope() as s:
+            order = (
+                s.query(models.ApiPurchaseOrder)
+                .filter(models.ApiPurchaseOrder.remark == "ref-unknown")
+                .one()
+            )
+            check(
+                "unconfirmed order stays pending while the orders list fails",
+                order.status == models.ApiPurchaseOrderStatus.PENDING,
+            )
+
+        # Held connections are sampled while the API answers slowly
+        async def held_connections(job) -> int:
+            task = asyncio.ensure_future(job)
+            held = 0
+            while not task.done():
+                held = max(held, engine.pool.checkedout())
+                await asyncio.sleep(0.01)
+            await task
+            return held
+
+        server.orders[placed_id]["status"] = "COMPLETED"
+        server.latency = 0.3
+        held = await held_connections(jobs.poll_api_orders_status(None))
+        check("poller holds no connection while calling the API", held == 0)
+
+        # Back to a non-terminal status for the callback to complete it again
+        with models.session_scope() as s:
+            order = s.get(models.ApiPurchaseOrder, orders["ref-placed"].id)
+            order.status = models.ApiPurchaseOrderStatus.PROCESSING
+        held = await held_connections(jobs.reconcile_api_order(placed_id))
+        with models.session_scope() as s:
+            order = s.get(models.ApiPurchaseOrder, orders["ref-placed"].id)
+            check(
+                "callback reconciliation holds no connection while calling the API",
+                held == 0 and order.status == models.ApiPurchaseOrderStatus.COMPLETED,
+            )
+    finally:
+        await server.stop()
+
+    print(f"\n{check.failures} failures")
+    sys.exit(1 if check.failures else 0)
+
+
+asyncio.run(main())
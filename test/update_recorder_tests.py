@@ -0,0 +1,111 @@
+"""Anonymization of the update log.
+
+Records the owner setting another user's balance against the fakes of
+test/e2e_load_test.py and checks that the user's real id shows up nowhere
+in the log: not in the text the owner typed, the callback data pressed or
+the buttons of the recorded messages. The pseudonym takes its place.
+
+    python test/update_recorder_tests.py
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Add the project root directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Points the bot at the fakes and a throwaway directory
+from e2e_load_test import OWNER_ID, Actor, StepFailed, start_bot, stop_bot, to_chat
+from collections import defaultdict
+from services.update_recorder import update_recorder
+import models
+
+USER_ID = 5550123
+AMOUNT = "7500"
+
+
+def check(name: str, condition: bool):
+    print(f"{'PASS' if condition else 'FAIL'}: {name}")
+    if not condition:
+        check.failures += 1
+
+
+check.failures = 0
+
+
+async def balance_flow(api) -> bool:
+    latencies = defaultdict(list)
+    user = Actor(api, USER_ID, latencies)
+    owner = Actor(api, OWNER_ID, latencies)
+    try:
+        await user.send("start", "/start", to_chat(USER_ID, "instant_purchase"))
+        await owner.send("admin", "/admin", to_chat(OWNER_ID, "manage_users_settings"))
+        await owner.press(
+            "manage_users", "manage_users_settings", to_chat(OWNER_ID, "edit_user_balance")
+        )
+        await owner.press(
+            "edit_balance", "edit_user_balance", to_chat(OWNER_ID, "back_to_manage_users")
+        )
+        await owner.send(
+            "user_id", str(USER_ID), to_chat(OWNER_ID, f"balance_action_set_{USER_ID}")
+        )
+        await owner.press(
+            "set_balance", f"balance_action_set_{USER_ID}", to_chat(OWNER_ID)
+        )
+        await owner.send("amount", AMOUNT, to_chat(OWNER_ID))
+        return True
+    except (StepFailed, asyncio.TimeoutError) as e:
+        print(f"Balance flow failed at {e}")
+        return False
+
+
+async def main():
+    log_path = os.path.join(tempfile.mkdtemp(), "updates.log")
+    api, g2bulk, app, _ = await start_bot(0, 0, record=log_path)
+    try:
+        completed = await balance_flow(api)
+        await api.wait_idle()
+    finally:
+        await stop_bot(api, g2bulk, app)
+    update_recorder.stop()
+
+    with models.session_scope() as s:
+        balance = s.get(models.User, USER_ID).balance
+    check("balance flow completed", completed and str(int(balance)) == AMOUNT)
+
+    with open(log_path, encoding="utf-8") as f:
+        log = f.read()
+    updates = [json.loads(line)["update"] for line in log.splitlines()]
+    pseudonym = str(update_recorder.pseudonym(USER_ID))
+    check("every update was recorded", len(updates) == 7)
+    check("the user's id appears nowhere in the log", str(USER_ID) not in log)
+    check(
+        "the typed user id is the user's pseudonym",
+        any(update.get("message", {}).get("text") == pseudonym for update in updates),
+    )
+    check(
+        "the pressed callback data carries the pseudonym",
+        any(
+            update.get("callback_query", {}).get("data")
+            == f"balance_action_set_{pseudonym}"
+            for update in updates
+        ),
+    )
+    check(
+        "the buttons of recorded messages carry the pseudonym",
+        f'"callback_data":"balance_action_zero_{pseudonym}"' in log,
+    )
+    check(
+        "the amount is kept",
+        any(update.get("message", {}).get("text") == AMOUNT for update in updates),
+    )
+
+    print(f"\n{check.failures} failures")
+    sys.exit(1 if check.failures else 0)
+
+
+asyncio.run(main())
@@ -13,7 +13,11 @@ from common.common import escape_html, format_float, get_exchange_rate
 from common.decorators import is_user_banned
 from custom_filters import PrivateChat
 from start import start_command, admin_command
-from services.g2bulk_api import G2BulkAPI
+from services.g2bulk_api import G2BulkAPI, G2BulkOutcomeUnknown, MemoizedG2BulkAPI
+from services.catalogue_cache import catalogue_cache
+from services.upstream_balance import upstream_balance
+from services.player_id_cache import player_id_cache
+from services.webhook_server import g2bulk_callback_url
 from user.api_purchase.keyboards import (
     build_game_keyboard,
     build_denomination_keyboard,
@@ -22,7 +26,9 @@ from user.api_purchase.keyboards import (
     build_search_results_keyboard,
     filter_active_games,
 )
+import asyncio
 import models
+import uuid
 
 # Conversation states for instant purchase
 (
@@ -32,6 +38,14 @@ import models
     INSTANT_PURCHASE_SERVER_ID,
 ) = range(4)
 
+# Keys that used to hold full API lists, dropped from user_data on entry
+LEGACY_STATE_KEYS = (
+    "api_all_games",
+    "api_catalogues",
+    "api_search_results",
+    "api_selected_denom",
+)
+
 
 @is_user_banned
 async def instant_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -39,8 +53,7 @@ async def instant_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if PrivateChat().filter(update):
         lang = get_lang(update.effective_user.id)
         try:
-            api = G2BulkAPI()
-            api_games = await api.get_games()
+            api_games = (await catalogue_cache.get_games()).games
 
             if not api_games:
                 await update.callback_query.answer(
@@ -61,8 +74,8 @@ async def instant_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return ConversationHandler.END
 
-            # Store filtered games in context for pagination
-            context.user_data["api_all_games"] = games
+            for key in LEGACY_STATE_KEYS:
+                context.user_data.pop(key, None)
             context.user_data["api_games_page"] = 0
 
             search_hint = TEXTS[lang].get(
@@ -101,12 +114,13 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
 
             try:
                 page = int(page_str)
-                search_results = context.user_data.get("api_search_results", [])
+                search_results = await resolve_search_results(context)
 
                 if not search_results:
                     await update.callback_query.answer(
                         text=TEXTS[lang].get(
-                            "api_error", "Error connecting to service"
+                            "search_expired",
+                            "Search results expired, please search again ❗️",
                         ),
                         show_alert=True,
                     )
@@ -133,7 +147,7 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
                     ),
                 )
                 return INSTANT_PURCHASE_GAME
-            except (ValueError, IndexError):
+            except Exception:
                 await update.callback_query.answer(
                     text=TEXTS[lang].get("api_error", "Error connecting to service"),
                     show_alert=True,
@@ -150,15 +164,8 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
 
             try:
                 page = int(page_str)
-                games = context.user_data.get("api_all_games", [])
-
-                if not games:
-                    # Reload games if not in context
-                    api = G2BulkAPI()
-                    api_games = await api.get_games()
-                    # Filter to only show active filtered games
-                    games = filter_active_games(api_games)
-                    context.user_data["api_all_games"] = games
+                # Filter to only show active filtered games
+                games = filter_active_games((await catalogue_cache.get_games()).games)
 
                 total_pages = (len(games) + 6 - 1) // 6  # GAMES_PER_PAGE = 6
                 page = max(0, min(page, total_pages - 1))  # Clamp page number
@@ -177,7 +184,7 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
                     reply_markup=build_game_keyboard(games, lang, page=page),
                 )
                 return INSTANT_PURCHASE_GAME
-            except (ValueError, IndexError):
+            except Exception:
                 await update.callback_query.answer(
                     text=TEXTS[lang].get("api_error", "Error connecting to service"),
                     show_alert=True,
@@ -213,12 +220,10 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
             return INSTANT_PURCHASE_GAME
 
         try:
-            api = G2BulkAPI()
-
             # Get game info and catalogue
-            catalogue_data = await api.get_game_catalogue(game_code)
-            game_info = catalogue_data.get("game", {})
-            catalogues = catalogue_data.get("catalogues", [])
+            cached = await catalogue_cache.get_catalogue(game_code)
+            game_info = cached.game
+            catalogues = cached.catalogues
 
             if not catalogues:
                 await update.callback_query.answer(
@@ -248,7 +253,7 @@ async def get_instant_purchase_game(update: Update, context: ContextTypes.DEFAUL
 
             # Store game info in context
             context.user_data["api_game_name"] = display_name
-            context.user_data["api_catalogues"] = catalogues
+            context.user_data["api_catalogue_version"] = cached.version
             context.user_data["api_denoms_page"] = 0
 
             await update.callback_query.edit_message_text(
@@ -304,6 +309,19 @@ def search_games(games: list, query: str, lang: models.Language = None) -> list:
     return results
 
 
+async def resolve_search_results(context: ContextTypes.DEFAULT_TYPE) -> list:
+    """Resolve the stored search query hash against the shared catalogue cache"""
+    search_hash = context.user_data.get("api_search_hash")
+    if not search_hash:
+        return []
+    cached = await catalogue_cache.get_games()
+    game_codes = catalogue_cache.get_search(cached.version, search_hash)
+    if game_codes is None:
+        return []
+    games = {game.get("code"): game for game in cached.games}
+    return [games[code] for code in game_codes if code in games]
+
+
 @is_user_banned
 async def handle_game_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text message for game search"""
@@ -311,20 +329,15 @@ async def handle_game_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
         lang = get_lang(update.effective_user.id)
         search_query = update.message.text.strip()
 
-        # Get games from context or reload
-        games = context.user_data.get("api_all_games", [])
-        if not games:
-            try:
-                api = G2BulkAPI()
-                api_games = await api.get_games()
-                # Filter to only show active filtered games
-                games = filter_active_games(api_games)
-                context.user_data["api_all_games"] = games
-            except Exception:
-                await update.message.reply_text(
-                    text=TEXTS[lang].get("api_error", "Error connecting to service"),
-                )
-                return INSTANT_PURCHASE_GAME
+        try:
+            cached_games = await catalogue_cache.get_games()
+        except Exception:
+            await update.message.reply_text(
+                text=TEXTS[lang].get("api_error", "Error connecting to service"),
+            )
+            return INSTANT_PURCHASE_GAME
+        # Filter to only show active filtered games
+        games = filter_active_games(cached_games.games)
 
         # Search for games (already filtered)
         search_results = search_games(games, search_query, lang)
@@ -367,12 +380,10 @@ async def handle_game_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
             context.user_data["api_game_code"] = game_code
 
             try:
-                api = G2BulkAPI()
-
                 # Get game info and catalogue
-                catalogue_data = await api.get_game_catalogue(game_code)
-                game_info = catalogue_data.get("game", {})
-                catalogues = catalogue_data.get("catalogues", [])
+                cached = await catalogue_cache.get_catalogue(game_code)
+                game_info = cached.game
+                catalogues = cached.catalogues
 
                 if not catalogues:
                     await update.message.reply_text(
@@ -384,7 +395,7 @@ async def handle_game_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
                 # Store game info in context
                 context.user_data["api_game_name"] = game_info.get("name", game_code)
-                context.user_data["api_catalogues"] = catalogues
+                context.user_data["api_catalogue_version"] = cached.version
                 context.user_data["api_denoms_page"] = 0
 
                 await update.message.reply_text(
@@ -400,7 +411,11 @@ async def handle_game_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
         else:
             # Multiple results - show keyboard with pagination
             results_count = len(search_results)
-            context.user_data["api_search_results"] = search_results
+            context.user_data["api_search_hash"] = catalogue_cache.store_search(
+                cached_games.version,
+                search_query,
+                [game.get("code") for game in search_results],
+            )
             context.user_data["api_search_page"] = 0
 
             if lang == models.Language.ARABIC:
@@ -426,16 +441,11 @@ async def back_to_api_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Go back to games list (first page)"""
     if PrivateChat().filter(update):
         lang = get_lang(update.effective_user.id)
-        games = context.user_data.get("api_all_games", [])
-
-        if not games:
-            # Reload games if not in context
-            try:
-                api = G2BulkAPI()
-                games = await api.get_games()
-                context.user_data["api_all_games"] = games
-            except Exception:
-                return await instant_purchase(update, context)
+        try:
+            # Filter to only show active filtered games
+            games = filter_active_games((await catalogue_cache.get_games()).games)
+        except Exception:
+            return await instant_purchase(update, context)
 
         context.user_data["api_games_page"] = 0
 
@@ -470,7 +480,10 @@ async def get_instant_purchase_denomination(
 
             try:
                 page = int(page_str)
-                catalogues = context.user_data.get("api_catalogues", [])
+                cached = await catalogue_cache.get_catalogue(
+                    context.user_data.get("api_game_code")
+                )
+                catalogues = cached.catalogues
 
                 if not catalogues:
                     await update.callback_query.answer(
@@ -488,6 +501,8 @@ async def get_instant_purchase_denomination(
                 ) // DENOMINATIONS_PER_PAGE
                 page = max(0, min(page, total_pages - 1))  # Clamp page number
                 context.user_data["api_denoms_page"] = page
+                # The rendered buttons now point into this version
+                context.user_data["api_catalogue_version"] = cached.version
 
                 await update.callback_query.edit_message_text(
                     text=TEXTS[lang].get("select_denomination", "Select denomination:"),
@@ -496,7 +511,7 @@ async def get_instant_purchase_denomination(
                     ),
                 )
                 return INSTANT_PURCHASE_DENOMINATION
-            except (ValueError, IndexError):
+            except Exception:
                 await update.callback_query.answer(
                     text=TEXTS[lang].get("api_error", "Error connecting to service"),
                     show_alert=True,
@@ -506,29 +521,32 @@ async def get_instant_purchase_denomination(
         # Handle denomination selection
         if not update.callback_query.data.startswith("back"):
             denom_index = int(update.callback_query.data.replace("api_denom_", ""))
-            catalogues = context.user_data.get("api_catalogues", [])
-
-            if denom_index >= len(catalogues):
-                await update.callback_query.answer(
-                    text=TEXTS[lang].get("api_error", "Error connecting to service"),
-                    show_alert=True,
-                )
-                return INSTANT_PURCHASE_DENOMINATION
-
-            selected_denom = catalogues[denom_index]
-            context.user_data["api_selected_denom"] = selected_denom
+            context.user_data["api_denom_index"] = denom_index
         else:
-            selected_denom = context.user_data.get("api_selected_denom")
+            denom_index = context.user_data.get("api_denom_index")
 
-        if not selected_denom:
+        if denom_index is None:
             return INSTANT_PURCHASE_DENOMINATION
 
         try:
-            api = G2BulkAPI()
+            api = MemoizedG2BulkAPI()
             game_code = context.user_data.get("api_game_code")
 
+            # Prefetch everything this step needs concurrently, the upstream
+            # balance is tracked locally and only fetched here if it's stale
+            selected_denom, servers, api_balance_usd = await asyncio.gather(
+                catalogue_cache.resolve_denomination(
+                    game_code,
+                    context.user_data.get("api_catalogue_version"),
+                    denom_index,
+                ),
+                api.get_game_servers(game_code),
+                upstream_balance.get(api),
+            )
+            if not selected_denom:
+                return await reprompt_stale_denomination(update, context, lang)
+
             # Check if server is required
-            servers = await api.get_game_servers(game_code)
             context.user_data["api_requires_server"] = servers is not None
             context.user_data["api_servers"] = servers
 
@@ -561,9 +579,6 @@ async def get_instant_purchase_denomination(
                 return INSTANT_PURCHASE_DENOMINATION
 
             # Check API balance (API uses USD)
-            user_info = await api.get_me()
-            api_balance_usd = float(user_info.get("balance", 0))
-
             if api_balance_usd < denom_price_usd:
                 await update.callback_query.answer(
                     text=TEXTS[lang].get(
@@ -574,11 +589,6 @@ async def get_instant_purchase_denomination(
                 )
                 return INSTANT_PURCHASE_DENOMINATION
 
-            # Check if server is required
-            servers = await api.get_game_servers(game_code)
-            context.user_data["api_requires_server"] = servers is not None
-            context.user_data["api_servers"] = servers
-
             # Show product details and ask for player ID
             game_name = context.user_data.get("api_game_name", game_code)
             denom_name = selected_denom.get("name", "")
@@ -619,6 +629,35 @@ async def get_instant_purchase_denomination(
 back_to_api_denom = get_instant_purchase_game
 
 
+async def reprompt_stale_denomination(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, lang: models.Language
+):
+    """Show the current denominations again after the referenced catalogue changed"""
+    cached = await catalogue_cache.get_catalogue(context.user_data.get("api_game_code"))
+    context.user_data["api_catalogue_version"] = cached.version
+    context.user_data["api_denoms_page"] = 0
+    context.user_data.pop("api_denom_index", None)
+
+    changed_text = TEXTS[lang].get(
+        "catalogue_changed",
+        "Prices have been updated, please select the denomination again ❗️",
+    )
+    select_text = TEXTS[lang].get("select_denomination", "Select denomination:")
+    keyboard = build_denomination_keyboard(cached.catalogues, lang, page=0)
+    if update.callback_query:
+        await update.callback_query.answer(text=changed_text, show_alert=True)
+        await update.callback_query.edit_message_text(
+            text=select_text,
+            reply_markup=keyboard,
+        )
+    else:
+        await update.message.reply_text(
+            text=f"{changed_text}\n\n{select_text}",
+            reply_markup=keyboard,
+        )
+    return INSTANT_PURCHASE_DENOMINATION
+
+
 @is_user_banned
 async def get_instant_purchase_player_id(
     update: Update, context: ContextTypes.DEFAULT_TYPE
@@ -644,16 +683,14 @@ async def get_instant_purchase_player_id(
                 # Need server ID first
                 servers = context.user_data.get("api_servers", {})
                 if servers:
-                    await validation_msg.delete()
-                    await update.message.reply_text(
+                    await validation_msg.edit_text(
                         text=TEXTS[lang].get("enter_server_id", "Enter Server ID:"),
                         reply_markup=build_server_keyboard(servers, lang),
                     )
                     return INSTANT_PURCHASE_SERVER_ID
                 else:
                     # No servers available, proceed without server
-                    await validation_msg.delete()
-                    await update.message.reply_text(
+                    await validation_msg.edit_text(
                         text=TEXTS[lang].get(
                             "server_not_required", "This game does not require a server"
                         ),
@@ -663,7 +700,9 @@ async def get_instant_purchase_player_id(
             else:
                 # Validate player ID without server
                 try:
-                    check_result = await api.check_player_id(game_code, player_id)
+                    check_result = await player_id_cache.check_player_id(
+                        game_code, player_id, api=api
+                    )
                     if check_result.get("valid") == "valid":
                         player_name = check_result.get("name", "N/A")
                         await validation_msg.edit_text(
@@ -734,8 +773,8 @@ async def get_instant_purchase_server_id(
             )
 
             try:
-                check_result = await api.check_player_id(
-                    game_code, player_id, server_id
+                check_result = await player_id_cache.check_player_id(
+                    game_code, player_id, server_id, api=api
                 )
                 if check_result.get("valid") == "valid":
                     player_name = check_result.get("name", "N/A")
@@ -791,10 +830,18 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
             api = G2BulkAPI()
             game_code = context.user_data.get("api_game_code")
             game_name = context.user_data.get("api_game_name", game_code)
-            selected_denom = context.user_data.get("api_selected_denom", {})
             player_id = context.user_data.get("api_player_id")
             server_id = context.user_data.get("api_server_id")
 
+            # Never charge a price the user didn't see
+            selected_denom = await catalogue_cache.resolve_denomination(
+                game_code,
+                context.user_data.get("api_catalogue_version"),
+                context.user_data.get("api_denom_index", -1),
+            )
+            if not selected_denom:
+                return await reprompt_stale_denomination(update, context, lang)
+
             denom_name = selected_denom.get("name", "")
             denom_price_usd = float(selected_denom.get("amount", 0))
 
@@ -809,6 +856,13 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 text=TEXTS[lang].get("order_processing", "Processing order..."),
             )
 
+            # The reference makes the remark find the order again in the API's
+            # orders list if the response to its creation is lost
+            remark = (
+                f"Order from Telegram Bot - User ID: {update.effective_user.id}"
+                f" - Ref: {uuid.uuid4().hex[:12]}"
+            )
+
             # Create order
             try:
                 order_data = await api.create_game_order(
@@ -816,9 +870,17 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     catalogue_name=denom_name,
                     player_id=player_id,
                     server_id=server_id,
-                    remark=f"Order from Telegram Bot - User ID: {update.effective_user.id}",
+                    remark=remark,
+                    callback_url=g2bulk_callback_url(),
                 )
+            except G2BulkOutcomeUnknown:
+                # The order may have been placed and billed, keep it pending
+                # without an API order ID until the poller finds it by remark
+                upstream_balance.invalidate()
+                order_data = None
             except Exception as e:
+                # The tracked upstream balance may be off, fetch it on next use
+                upstream_balance.invalidate()
                 # Handle API errors (e.g., product out of stock, invalid data, etc.)
                 error_message = str(e)
                 if (
@@ -840,7 +902,35 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
                 return ConversationHandler.END
 
-            if order_data.get("success"):
+            if order_data is None:
+                with models.session_scope() as s:
+                    user = s.get(models.User, update.effective_user.id)
+                    if user:
+                        from decimal import Decimal
+
+                        user.balance -= Decimal(str(denom_price_sudan))
+                        s.add(
+                            models.ApiPurchaseOrder(
+                                user_id=update.effective_user.id,
+                                api_order_id=None,
+                                api_game_code=game_code,
+                                denomination_name=denom_name,
+                                player_id=player_id,
+                                server_id=server_id,
+                                price_usd=denom_price_usd,
+                                price_sudan=denom_price_sudan,
+                                status=models.ApiPurchaseOrderStatus.PENDING,
+                                remark=remark,
+                            )
+                        )
+                await processing_msg.edit_text(
+                    text=TEXTS[lang].get(
+                        "order_outcome_unknown",
+                        "Your order was sent but its confirmation didn't arrive ⏳",
+                    ),
+                )
+            elif order_data.get("success"):
+                upstream_balance.debit(denom_price_usd)
                 order_info = order_data.get("order", {})
                 api_order_id = order_info.get("order_id")
                 api_message = order_data.get("message", "")
@@ -871,7 +961,7 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         price_sudan=denom_price_sudan,
                         status=models.ApiPurchaseOrderStatus.PENDING,
                         api_message=api_message,
-                        remark=f"Order from Telegram Bot - User ID: {update.effective_user.id}",
+                        remark=remark,
                     )
                     s.add(api_order)
                     s.commit()  # Commit to save balance deduction
@@ -912,6 +1002,7 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     text=order_text,
                 )
             else:
+                upstream_balance.invalidate()
                 error_msg = order_data.get(
                     "message",
                     TEXTS[lang].get("api_error", "Error connecting to service"),
@@ -938,8 +1029,8 @@ async def create_api_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Clean up user_data
             context.user_data.pop("api_game_code", None)
             context.user_data.pop("api_game_name", None)
-            context.user_data.pop("api_catalogues", None)
-            context.user_data.pop("api_selected_denom", None)
+            context.user_data.pop("api_catalogue_version", None)
+            context.user_data.pop("api_denom_index", None)
             context.user_data.pop("api_player_id", None)
             context.user_data.pop("api_server_id", None)
             context.user_data.pop("api_requires_server", None)
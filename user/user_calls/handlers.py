@@ -10,7 +10,6 @@ from common.keyboards import (
     build_user_keyboard,
     build_back_to_home_page_button,
     build_back_button,
-    build_keyboard,
 )
 from common.lang_dicts import TEXTS, get_lang
 from common.back_to_home_page import back_to_user_home_page_handler
@@ -18,6 +17,7 @@ from common.common import escape_html, format_float
 from common.decorators import is_user_banned
 from custom_filters import PrivateChat
 from start import start_command, admin_command
+from user.user_calls.store_catalogue import reserve_item, store_catalogue
 from Config import Config
 import models
 
@@ -29,29 +29,31 @@ PURCHASE_ORDER_GAME, PURCHASE_ORDER_ITEM, PURCHASE_ORDER_ACCOUNT_ID = range(3)
 async def purchase_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if PrivateChat().filter(update):
         lang = get_lang(update.effective_user.id)
-        with models.session_scope() as s:
-            games = s.query(models.Game).filter(models.Game.is_active == True).all()
-
-            if not games:
-                await update.callback_query.answer(
-                    text=TEXTS[lang]["no_active_games"],
-                    show_alert=True,
-                )
-                return ConversationHandler.END
-
-            game_keyboard = build_keyboard(
-                columns=1,
-                texts=[game.name for game in games],
-                buttons_data=[str(game.id) for game in games],
+        data = update.callback_query.data
+        if data == "store_games_page_info":
+            await update.callback_query.answer()
+            return PURCHASE_ORDER_GAME
+        if data.startswith("store_games_page_"):
+            context.user_data["purchase_order_games_page"] = int(
+                data.replace("store_games_page_", "")
             )
-            game_keyboard.append(
-                build_back_to_home_page_button(lang=lang, is_admin=False)[0]
+        elif not data.startswith("back"):
+            context.user_data["purchase_order_games_page"] = 0
+
+        snapshot = store_catalogue.get()
+        if not snapshot.games:
+            await update.callback_query.answer(
+                text=TEXTS[lang]["no_active_games"],
+                show_alert=True,
             )
+            return ConversationHandler.END
 
-            await update.callback_query.edit_message_text(
-                text=TEXTS[lang]["select_game"],
-                reply_markup=InlineKeyboardMarkup(game_keyboard),
-            )
+        await update.callback_query.edit_message_text(
+            text=TEXTS[lang]["select_game"],
+            reply_markup=snapshot.games_keyboard(
+                lang, context.user_data.get("purchase_order_games_page", 0)
+            ),
+        )
         return PURCHASE_ORDER_GAME
 
 
@@ -59,41 +61,34 @@ async def purchase_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def get_purchase_order_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if PrivateChat().filter(update):
         lang = get_lang(update.effective_user.id)
-        if not update.callback_query.data.startswith("back"):
-            game_id = int(update.callback_query.data)
-            context.user_data["purchase_order_game_id"] = game_id
-
-        with models.session_scope() as s:
-            game_id = context.user_data.get("purchase_order_game_id")
-            items = (
-                s.query(models.Item)
-                .filter(models.Item.game_id == game_id, models.Item.is_active == True)
-                .all()
-            )
-
-            if not items:
-                await update.callback_query.answer(
-                    text=TEXTS[lang]["no_items_for_game"],
-                    show_alert=True,
-                )
-                return PURCHASE_ORDER_GAME
-
-            item_keyboard = build_keyboard(
-                columns=1,
-                texts=[item.name for item in items],
-                buttons_data=[str(item.id) for item in items],
-            )
-            item_keyboard.append(
-                build_back_button("back_to_purchase_order_game", lang=lang)
+        data = update.callback_query.data
+        if data == "store_items_page_info":
+            await update.callback_query.answer()
+            return PURCHASE_ORDER_ITEM
+        if data.startswith("store_items_page_"):
+            context.user_data["purchase_order_items_page"] = int(
+                data.replace("store_items_page_", "")
             )
-            item_keyboard.append(
-                build_back_to_home_page_button(lang=lang, is_admin=False)[0]
+        elif not data.startswith("back"):
+            context.user_data["purchase_order_game_id"] = int(data)
+            context.user_data["purchase_order_items_page"] = 0
+
+        snapshot = store_catalogue.get()
+        game_id = context.user_data.get("purchase_order_game_id")
+        game = snapshot.games_by_id.get(game_id)
+        if not game or not game.items:
+            await update.callback_query.answer(
+                text=TEXTS[lang]["no_items_for_game"],
+                show_alert=True,
             )
+            return PURCHASE_ORDER_GAME
 
-            await update.callback_query.edit_message_text(
-                text=TEXTS[lang]["select_item"],
-                reply_markup=InlineKeyboardMarkup(item_keyboard),
-            )
+        await update.callback_query.edit_message_text(
+            text=TEXTS[lang]["select_item"],
+            reply_markup=snapshot.items_keyboard(
+                lang, game_id, context.user_data.get("purchase_order_items_page", 0)
+            ),
+        )
         return PURCHASE_ORDER_ITEM
 
 
@@ -110,17 +105,17 @@ async def get_purchase_order_item(update: Update, context: ContextTypes.DEFAULT_
         else:
             item_id = context.user_data["purchase_order_item_id"]
 
+        item = store_catalogue.get().items.get(item_id)
+        if not item:
+            await update.callback_query.answer(
+                text=TEXTS[lang]["item_not_found"],
+                show_alert=True,
+            )
+            return
+
         with models.session_scope() as s:
-            item = s.get(models.Item, item_id)
             user = s.get(models.User, update.effective_user.id)
 
-            if not item or not item.is_active:
-                await update.callback_query.answer(
-                    text=TEXTS[lang]["item_not_found"],
-                    show_alert=True,
-                )
-                return
-
             # Check if user has enough balance
             if user.balance < item.price:
                 from common.common import format_float
@@ -162,20 +157,39 @@ async def get_purchase_order_account_id(
             item = s.get(models.Item, item_id)
             user = s.get(models.User, update.effective_user.id)
 
+            # Stock and balance are taken with conditional updates in one
+            # transaction, concurrent purchases can't oversell or overdraw
+            error_text = None
+            if not item or not reserve_item(s, item_id):
+                error_text = TEXTS[lang]["product_out_of_stock"]
+            elif not models.User.charge_balance(s, user.user_id, item.price):
+                error_text = TEXTS[lang]["insufficient_balance"].format(
+                    balance=format_float(user.balance),
+                    price=format_float(item.price),
+                )
+            if error_text:
+                s.rollback()
+                context.user_data.pop("purchase_order_game_id", None)
+                context.user_data.pop("purchase_order_item_id", None)
+                await update.message.reply_text(text=error_text)
+                await update.message.reply_text(
+                    text=TEXTS[lang]["home_page"],
+                    reply_markup=build_user_keyboard(lang),
+                )
+                return ConversationHandler.END
+
             # Create purchase order
             new_order = models.PurchaseOrder(
                 user_id=update.effective_user.id,
                 item_id=item_id,
                 game_account_id=game_account_id,
                 status=models.PurchaseOrderStatus.PENDING,
+                stock_reserved=True,
             )
             s.add(new_order)
             s.flush()  # To get the order ID
             order_id = new_order.id
-
-            # Deduct balance
-            user.balance -= item.price
-            s.commit()  # Commit to save balance deduction
+            s.commit()  # Commit the order with the stock and balance deduction
 
             # Build success message with full order details
             
@@ -241,13 +255,9 @@ async def get_purchase_order_account_id(
                             admin_ids.append(perm.admin_id)
 
                     # Get order with relationships for complete details using eager loading
-                    from sqlalchemy.orm import joinedload
                     order = (
                         s.query(models.PurchaseOrder)
-                        .options(
-                            joinedload(models.PurchaseOrder.item).joinedload(models.Item.game),
-                            joinedload(models.PurchaseOrder.user)
-                        )
+                        .options(*models.PURCHASE_ORDER_RENDER)
                         .filter(models.PurchaseOrder.id == order_id)
                         .first()
                     )
@@ -264,21 +274,9 @@ async def get_purchase_order_account_id(
                             if not admin_user:
                                 continue
                             lang = admin_user.lang
-                            
-                            # Re-query order with relationships for this admin's session
-                            from sqlalchemy.orm import joinedload
-                            order = (
-                                s.query(models.PurchaseOrder)
-                                .options(
-                                    joinedload(models.PurchaseOrder.item).joinedload(models.Item.game),
-                                    joinedload(models.PurchaseOrder.user)
-                                )
-                                .filter(models.PurchaseOrder.id == order_id)
-                                .first()
-                            )
-                            if not order:
-                                continue
-                            
+
+                            # The order loaded above with its relationships, still
+                            # readable as sessions don't expire on commit
                             # Build complete order details message for this admin's language
                             text = order.stringify(lang)
                             text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -333,12 +331,20 @@ purchase_order_handler = ConversationHandler(
                 get_purchase_order_game,
                 r"^[0-9]+$",
             ),
+            CallbackQueryHandler(
+                purchase_order,
+                r"^store_games_page_",
+            ),
         ],
         PURCHASE_ORDER_ITEM: [
             CallbackQueryHandler(
                 get_purchase_order_item,
                 r"^[0-9]+$",
             ),
+            CallbackQueryHandler(
+                get_purchase_order_game,
+                r"^store_items_page_",
+            ),
         ],
         PURCHASE_ORDER_ACCOUNT_ID: [
             MessageHandler(
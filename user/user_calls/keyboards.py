@@ -1,7 +1,15 @@
-from telegram import InlineKeyboardButton
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from common.keyboards import (
+    build_back_to_home_page_button,
+    build_back_button,
+    build_keyboard,
+)
 from common.lang_dicts import BUTTONS
 import models
 
+GAMES_PER_PAGE = 8  # Number of store games per page
+ITEMS_PER_PAGE = 8  # Number of store items per page
+
 
 def build_purchase_order_keyboard(lang: models.Language):
     keyboard = [
@@ -14,3 +22,75 @@ def build_purchase_order_keyboard(lang: models.Language):
     ]
     return keyboard
 
+
+def page_count(total: int, per_page: int) -> int:
+    return max(1, (total + per_page - 1) // per_page)
+
+
+def build_pagination_row(
+    lang: models.Language, page: int, total_pages: int, prefix: str
+) -> list:
+    """◀️ / page indicator / ▶️ row, empty when everything fits in one page"""
+    if total_pages <= 1:
+        return []
+    pagination_row = []
+    if page > 0:
+        pagination_row.append(
+            InlineKeyboardButton(
+                text="◀️ " + BUTTONS[lang].get("back_button", "Back"),
+                callback_data=f"{prefix}_{page - 1}",
+            )
+        )
+    pagination_row.append(
+        InlineKeyboardButton(
+            text=f"{page + 1}/{total_pages}",
+            callback_data=f"{prefix}_info",
+        )
+    )
+    if page < total_pages - 1:
+        pagination_row.append(
+            InlineKeyboardButton(
+                text=BUTTONS[lang].get("next_button", "Next") + " ▶️",
+                callback_data=f"{prefix}_{page + 1}",
+            )
+        )
+    return pagination_row
+
+
+def build_store_games_keyboard(
+    games: list, lang: models.Language, page: int = 0
+) -> InlineKeyboardMarkup:
+    """Keyboard of one page of the store's games"""
+    page_games = games[page * GAMES_PER_PAGE : (page + 1) * GAMES_PER_PAGE]
+    game_keyboard = build_keyboard(
+        columns=1,
+        texts=[game.name for game in page_games],
+        buttons_data=[str(game.id) for game in page_games],
+    )
+    pagination_row = build_pagination_row(
+        lang, page, page_count(len(games), GAMES_PER_PAGE), "store_games_page"
+    )
+    if pagination_row:
+        game_keyboard.append(pagination_row)
+    game_keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=False)[0])
+    return InlineKeyboardMarkup(game_keyboard)
+
+
+def build_store_items_keyboard(
+    items: list, lang: models.Language, page: int = 0
+) -> InlineKeyboardMarkup:
+    """Keyboard of one page of a store game's items"""
+    page_items = items[page * ITEMS_PER_PAGE : (page + 1) * ITEMS_PER_PAGE]
+    item_keyboard = build_keyboard(
+        columns=1,
+        texts=[item.name for item in page_items],
+        buttons_data=[str(item.id) for item in page_items],
+    )
+    pagination_row = build_pagination_row(
+        lang, page, page_count(len(items), ITEMS_PER_PAGE), "store_items_page"
+    )
+    if pagination_row:
+        item_keyboard.append(pagination_row)
+    item_keyboard.append(build_back_button("back_to_purchase_order_game", lang=lang))
+    item_keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=False)[0])
+    return InlineKeyboardMarkup(item_keyboard)
@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import chain
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+from sqlalchemy import event
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardMarkup
+from user.user_calls.keyboards import (
+    GAMES_PER_PAGE,
+    ITEMS_PER_PAGE,
+    build_store_games_keyboard,
+    build_store_items_keyboard,
+    page_count,
+)
+import models
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Replaced on every catalogue write so the other worker processes rebuild too
+MARKER_PATH = "data/store_catalogue.version"
+
+
+@dataclass(frozen=True)
+class StoreItem:
+    id: int
+    game_id: int
+    name: str
+    price: Decimal
+    stock_quantity: Optional[int]
+
+
+@dataclass(frozen=True)
+class StoreGame:
+    id: int
+    name: str
+    items: Tuple[StoreItem, ...]
+
+
+@dataclass(frozen=True)
+class StoreSnapshot:
+    """Immutable view of the active games and items of the manual store, with
+    their keyboards rendered for every language and page"""
+
+    games: Tuple[StoreGame, ...]
+    games_by_id: Mapping[int, StoreGame]
+    items: Mapping[int, StoreItem]
+    # (lang, page) -> games keyboard, (lang, game_id, page) -> items keyboard
+    keyboards: Mapping[tuple, InlineKeyboardMarkup]
+
+    def games_page(self, page: int) -> int:
+        return max(0, min(page, page_count(len(self.games), GAMES_PER_PAGE) - 1))
+
+    def items_page(self, game_id: int, page: int) -> int:
+        items = self.games_by_id[game_id].items
+        return max(0, min(page, page_count(len(items), ITEMS_PER_PAGE) - 1))
+
+    def games_keyboard(self, lang: models.Language, page: int) -> InlineKeyboardMarkup:
+        return self.keyboards[(lang, self.games_page(page))]
+
+    def items_keyboard(
+        self, lang: models.Language, game_id: int, page: int
+    ) -> InlineKeyboardMarkup:
+        return self.keyboards[(lang, game_id, self.items_page(game_id, page))]
+
+
+def load_snapshot(s: Session) -> StoreSnapshot:
+    db_games = (
+        s.query(models.Game)
+        .filter(models.Game.is_active == True)
+        .order_by(models.Game.id)
+        .all()
+    )
+    db_items = (
+        s.query(models.Item)
+        .filter(models.Item.is_active == True)
+        .order_by(models.Item.id)
+        .all()
+    )
+    items_by_game = {game.id: [] for game in db_games}
+    items = {}
+    for item in db_items:
+        # Items of inactive games can't be reached, sold out ones aren't listed
+        if item.game_id not in items_by_game or item.stock_quantity == 0:
+            continue
+        store_item = StoreItem(
+            id=item.id,
+            game_id=item.game_id,
+            name=item.name,
+            price=item.price,
+            stock_quantity=item.stock_quantity,
+        )
+        items[item.id] = store_item
+        items_by_game[item.game_id].append(store_item)
+    games = [
+        StoreGame(id=game.id, name=game.name, items=tuple(items_by_game[game.id]))
+        for game in db_games
+    ]
+
+    keyboards = {}
+    for lang in models.Language:
+        for page in range(page_count(len(games), GAMES_PER_PAGE)):
+            keyboards[(lang, page)] = build_store_games_keyboard(games, lang, page)
+        for game in games:
+            for page in range(page_count(len(game.items), ITEMS_PER_PAGE)):
+                keyboards[(lang, game.id, page)] = build_store_items_keyboard(
+                    list(game.items), lang, page
+                )
+
+    return StoreSnapshot(
+        games=tuple(games),
+        games_by_id=MappingProxyType({game.id: game for game in games}),
+        items=MappingProxyType(items),
+        keyboards=MappingProxyType(keyboards),
+    )
+
+
+class StoreCatalogue:
+    """Process-wide snapshot of the manual store for user browsing.
+
+    Built from the database the first time it's needed and after each
+    committed write to games or items, by any process (see MARKER_PATH).
+    The snapshot is swapped in as a whole, readers never see a partial one.
+    """
+
+    def __init__(self, marker_path: str = MARKER_PATH):
+        self.marker_path = marker_path
+        self._snapshot: Optional[StoreSnapshot] = None
+        self._marker = None
+
+    def _read_marker(self):
+        try:
+            stat = os.stat(self.marker_path)
+            return stat.st_ino, stat.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self) -> StoreSnapshot:
+        marker = self._read_marker()
+        if self._snapshot is None or marker != self._marker:
+            with models.session_scope() as s:
+                snapshot = load_snapshot(s)
+            self._snapshot, self._marker = snapshot, marker
+            logger.info(
+                f"Store catalogue rebuilt: {len(snapshot.games)} games, "
+                f"{len(snapshot.items)} items"
+            )
+        return self._snapshot
+
+    def invalidate(self):
+        """Make every process rebuild its snapshot on next use"""
+        directory = os.path.dirname(self.marker_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A new file, so the marker changes even within the mtime resolution,
+        # named per thread as concurrent purchases can sell items out together
+        tmp_path = f"{self.marker_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(os.getpid()))
+        os.replace(tmp_path, self.marker_path)
+        self._snapshot = None
+
+
+store_catalogue = StoreCatalogue()
+
+
+def mark_changed(s: Session):
+    """Rebuild the snapshot when s commits, for writes the session events
+    don't see (bulk UPDATE statements)"""
+    s.info["store_catalogue_changed"] = True
+
+
+def reserve_item(s: Session, item_id: int) -> bool:
+    """Take one unit of an active item's stock in s's transaction.
+
+    A single conditional UPDATE, so concurrent purchases can't oversell.
+    Unlimited items (NULL stock) always succeed.
+    """
+    row = s.execute(
+        sa.update(models.Item)
+        .where(
+            models.Item.id == item_id,
+            models.Item.is_active == True,
+            sa.or_(
+                models.Item.stock_quantity.is_(None),
+                models.Item.stock_quantity > 0,
+            ),
+        )
+        .values(stock_quantity=models.Item.stock_quantity - 1)
+        .returning(models.Item.stock_quantity)
+    ).first()
+    if row is None:
+        return False
+    if row[0] == 0:
+        mark_changed(s)
+    return True
+
+
+def release_item(s: Session, item_id: int):
+    """Give one unit back to a limited item's stock in s's transaction"""
+    row = s.execute(
+        sa.update(models.Item)
+        .where(
+            models.Item.id == item_id,
+            models.Item.stock_quantity.is_not(None),
+        )
+        .values(stock_quantity=models.Item.stock_quantity + 1)
+        .returning(models.Item.stock_quantity)
+    ).first()
+    if row is not None and row[0] == 1:
+        mark_changed(s)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalogue_writes(session: Session, flush_context):
+    if any(
+        isinstance(obj, (models.Game, models.Item))
+        for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info["store_catalogue_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session):
+    if session.info.pop("store_catalogue_changed", False):
+        store_catalogue.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_writes(session: Session):
+    session.info.pop("store_catalogue_changed", None)
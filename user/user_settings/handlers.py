@@ -6,6 +6,7 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
+from sqlalchemy.orm import joinedload
 from user.user_settings.keyboards import (
     build_settings_keyboard,
     build_profile_keyboard,
@@ -22,6 +23,7 @@ from common.keyboards import (
 from common.lang_dicts import TEXTS, get_lang
 from common.back_to_home_page import back_to_user_home_page_handler
 from common.common import escape_html, format_float
+from common.media import get_message_media, send_media_message, show_media_message
 from common.decorators import is_user_banned
 from custom_filters import PrivateChat
 from Config import Config
@@ -306,18 +308,15 @@ async def get_charge_balance_proof(update: Update, context: ContextTypes.DEFAULT
         addr_id = context.user_data.get("charge_balance_addr_id")
         amount = context.user_data.get("charge_balance_amount")
 
-        # Get file ID from photo or document
-        payment_proof = None
-        if update.message.photo:
-            payment_proof = update.message.photo[-1].file_id
-        elif update.message.document:
-            payment_proof = update.message.document.file_id
-        else:
+        # Get file ID, unique file ID and kind from photo or document
+        proof = get_message_media(update.message)
+        if not proof:
             # Payment proof is mandatory
             await update.message.reply_text(
                 text=TEXTS[lang]["upload_payment_proof"],
             )
             return CHARGE_BALANCE_PROOF
+        payment_proof, payment_proof_unique_id, payment_proof_kind = proof
 
         with models.session_scope() as s:
             user = s.get(models.User, update.effective_user.id)
@@ -329,6 +328,8 @@ async def get_charge_balance_proof(update: Update, context: ContextTypes.DEFAULT
                 amount=amount,
                 status=models.ChargingOrderStatus.PENDING,
                 payment_proof=payment_proof,
+                payment_proof_kind=payment_proof_kind,
+                payment_proof_unique_id=payment_proof_unique_id,
             )
             s.add(new_order)
             s.flush()
@@ -416,16 +417,9 @@ async def get_charge_balance_proof(update: Update, context: ContextTypes.DEFAULT
                         admin_ids.append(perm.admin_id)
 
                 # Get order with relationships for complete details using eager loading
-                from sqlalchemy.orm import joinedload
-
                 order = (
                     s.query(models.ChargingBalanceOrder)
-                    .options(
-                        joinedload(
-                            models.ChargingBalanceOrder.payment_method_address
-                        ).joinedload(models.PaymentMethodAddress.payment_method),
-                        joinedload(models.ChargingBalanceOrder.user),
-                    )
+                    .options(*models.CHARGING_ORDER_RENDER)
                     .filter(models.ChargingBalanceOrder.id == order_id)
                     .first()
                 )
@@ -443,25 +437,8 @@ async def get_charge_balance_proof(update: Update, context: ContextTypes.DEFAULT
                             continue
                         lang = admin_user.lang
 
-                        # Re-query order with relationships for this admin's session
-                        from sqlalchemy.orm import joinedload
-
-                        order = (
-                            s.query(models.ChargingBalanceOrder)
-                            .options(
-                                joinedload(
-                                    models.ChargingBalanceOrder.payment_method_address
-                                ).joinedload(
-                                    models.PaymentMethodAddress.payment_method
-                                ),
-                                joinedload(models.ChargingBalanceOrder.user),
-                            )
-                            .filter(models.ChargingBalanceOrder.id == order_id)
-                            .first()
-                        )
-                        if not order:
-                            continue
-
+                        # The order loaded above with its relationships, still
+                        # readable as sessions don't expire on commit
                         # Build complete order details message for this admin's language
                         text = order.stringify(lang)
                         text += f"\n\n<b>{TEXTS[lang].get('user', 'User')}:</b>"
@@ -476,39 +453,15 @@ async def get_charge_balance_proof(update: Update, context: ContextTypes.DEFAULT
                             lang, order_id, "charging"
                         )
 
-                    # If payment proof exists, send as photo with caption
-                    message = None
-                    if payment_proof:
-                        try:
-                            message = await context.bot.send_photo(
-                                chat_id=admin_id,
-                                photo=payment_proof,
-                                caption=text,
-                                reply_markup=InlineKeyboardMarkup(actions_keyboard),
-                            )
-                        except:
-                            # If photo fails, try as document
-                            try:
-                                message = await context.bot.send_document(
-                                    chat_id=admin_id,
-                                    document=payment_proof,
-                                    caption=text,
-                                    reply_markup=InlineKeyboardMarkup(actions_keyboard),
-                                )
-                            except:
-                                # If both fail, send as text message
-                                message = await context.bot.send_message(
-                                    chat_id=admin_id,
-                                    text=text,
-                                    reply_markup=InlineKeyboardMarkup(actions_keyboard),
-                                )
-                    else:
-                        # No payment proof, send as text message
-                        message = await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=text,
-                            reply_markup=InlineKeyboardMarkup(actions_keyboard),
-                        )
+                    # Send with the payment proof as a photo or document, as uploaded
+                    message = await send_media_message(
+                        context.bot,
+                        admin_id,
+                        text,
+                        media=payment_proof,
+                        media_kind=payment_proof_kind,
+                        reply_markup=InlineKeyboardMarkup(actions_keyboard),
+                    )
                     
                     # Store message ID in database
                     if message:
@@ -588,18 +541,11 @@ async def my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard = build_order_type_keyboard(lang)
         keyboard.append(build_back_button("back_to_user_profile", lang=lang))
         keyboard.append(build_back_to_home_page_button(lang=lang, is_admin=False)[0])
-        try:
-            await update.callback_query.edit_message_text(
-                text=TEXTS[lang]["select_order_type"],
-                reply_markup=InlineKeyboardMarkup(keyboard),
-            )
-        except:
-            await update.callback_query.delete_message()
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=TEXTS[lang]["select_order_type"],
-                reply_markup=InlineKeyboardMarkup(keyboard),
-            )
+        await show_media_message(
+            update.callback_query,
+            TEXTS[lang]["select_order_type"],
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        )
 
 
 my_orders_handler = CallbackQueryHandler(
@@ -654,33 +600,8 @@ async def show_charging_balance_orders(
 
             text = f"<b>{TEXTS[lang]['charging_balance_orders']}</b>\n\n{TEXTS[lang].get('select_order', 'Select an order to view:')}"
 
-            # Check if current message has a photo (need to replace with text when going back)
-            current_message = update.callback_query.message
-            has_photo = (
-                current_message.photo is not None and len(current_message.photo) > 0
-            )
-
-            if has_photo:
-                # Current message has photo, need to replace with text
-                try:
-                    await update.callback_query.message.delete()
-                    await context.bot.send_message(
-                        chat_id=update.effective_chat.id,
-                        text=text,
-                        reply_markup=keyboard,
-                    )
-                except:
-                    # If delete fails, try editing caption (will fail but we try)
-                    await update.callback_query.edit_message_text(
-                        text=text,
-                        reply_markup=keyboard,
-                    )
-            else:
-                # No photo, just edit text
-                await update.callback_query.edit_message_text(
-                    text=text,
-                    reply_markup=keyboard,
-                )
+            # Coming back from a payment proof replaces the media message
+            await show_media_message(update.callback_query, text, reply_markup=keyboard)
 
 
 @is_user_banned
@@ -711,6 +632,7 @@ async def show_purchase_orders(
 
             orders = (
                 s.query(models.PurchaseOrder)
+                .options(joinedload(models.PurchaseOrder.item))
                 .filter(models.PurchaseOrder.user_id == update.effective_user.id)
                 .order_by(models.PurchaseOrder.created_at.desc())
                 .offset(offset)
@@ -743,7 +665,9 @@ async def view_charging_balance_order(
         order_id = int(update.callback_query.data.replace("view_charge_order_", ""))
 
         with models.session_scope() as s:
-            order = s.get(models.ChargingBalanceOrder, order_id)
+            order = s.get(
+                models.ChargingBalanceOrder, order_id, options=models.CHARGING_ORDER_RENDER
+            )
             if not order or order.user_id != update.effective_user.id:
                 await update.callback_query.answer(
                     text=TEXTS[lang]["order_not_found"],
@@ -760,101 +684,15 @@ async def view_charging_balance_order(
             ]
             keyboard = InlineKeyboardMarkup(back_buttons)
 
-            # If payment proof exists, use photo-caption style
-            if order.payment_proof:
-                # Check if current message has a photo
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Message already has photo, edit caption
-                    try:
-                        await update.callback_query.edit_message_caption(
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If edit fails, delete and send new photo with caption
-                        try:
-                            await update.callback_query.message.delete()
-                            await context.bot.send_photo(
-                                chat_id=update.effective_chat.id,
-                                photo=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # If photo fails, try document
-                            try:
-                                await context.bot.send_document(
-                                    chat_id=update.effective_chat.id,
-                                    document=order.payment_proof,
-                                    caption=text,
-                                    reply_markup=keyboard,
-                                )
-                            except:
-                                # Fallback to text message
-                                await context.bot.send_message(
-                                    chat_id=update.effective_chat.id,
-                                    text=text,
-                                    reply_markup=keyboard,
-                                )
-                else:
-                    # Message doesn't have photo, need to replace with photo
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_photo(
-                            chat_id=update.effective_chat.id,
-                            photo=order.payment_proof,
-                            caption=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If photo fails, try document
-                        try:
-                            await context.bot.send_document(
-                                chat_id=update.effective_chat.id,
-                                document=order.payment_proof,
-                                caption=text,
-                                reply_markup=keyboard,
-                            )
-                        except:
-                            # Fallback to text message
-                            await update.callback_query.edit_message_text(
-                                text=text,
-                                reply_markup=keyboard,
-                            )
-            else:
-                # No payment proof, use text message
-                # Check if current message has photo (need to replace with text)
-                current_message = update.callback_query.message
-                has_photo = (
-                    current_message.photo is not None and len(current_message.photo) > 0
-                )
-
-                if has_photo:
-                    # Current message has photo but order doesn't have proof, replace with text
-                    try:
-                        await update.callback_query.message.delete()
-                        await context.bot.send_message(
-                            chat_id=update.effective_chat.id,
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                    except:
-                        # If delete fails, try editing caption (will fail but we try)
-                        await update.callback_query.edit_message_text(
-                            text=text,
-                            reply_markup=keyboard,
-                        )
-                else:
-                    # No photo, just edit text
-                    await update.callback_query.edit_message_text(
-                        text=text,
-                        reply_markup=keyboard,
-                    )
+            # Payment proof is shown with the send/edit method of its kind
+            await show_media_message(
+                update.callback_query,
+                text,
+                media=order.payment_proof,
+                media_kind=order.payment_proof_kind,
+                media_unique_id=order.payment_proof_unique_id,
+                reply_markup=keyboard,
+            )
 
 
 @is_user_banned
@@ -864,7 +702,9 @@ async def view_purchase_order(update: Update, context: ContextTypes.DEFAULT_TYPE
         order_id = int(update.callback_query.data.replace("view_purchase_order_", ""))
 
         with models.session_scope() as s:
-            order = s.get(models.PurchaseOrder, order_id)
+            order = s.get(
+                models.PurchaseOrder, order_id, options=models.PURCHASE_ORDER_RENDER
+            )
             if not order or order.user_id != update.effective_user.id:
                 await update.callback_query.answer(
                     text=TEXTS[lang]["order_not_found"],
@@ -1001,6 +841,7 @@ async def show_api_purchase_orders(
 
             orders = (
                 s.query(models.ApiPurchaseOrder)
+                .options(joinedload(models.ApiPurchaseOrder.api_game))
                 .filter(models.ApiPurchaseOrder.user_id == update.effective_user.id)
                 .order_by(models.ApiPurchaseOrder.created_at.desc())
                 .offset(offset)
@@ -1033,7 +874,9 @@ async def view_api_purchase_order(update: Update, context: ContextTypes.DEFAULT_
         )
 
         with models.session_scope() as s:
-            order = s.get(models.ApiPurchaseOrder, order_id)
+            order = s.get(
+                models.ApiPurchaseOrder, order_id, options=models.API_PURCHASE_ORDER_RENDER
+            )
             if not order or order.user_id != update.effective_user.id:
                 await update.callback_query.answer(
                     text=TEXTS[lang]["order_not_found"],